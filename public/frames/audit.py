@@ -0,0 +1,234 @@
+"""
+Integrity audit of the frames on disk for the glasses downloader.
+
+`glasses_downloader.py audit` checks every <shape>/*.jpg without decoding any
+pixels, on a thread pool (--concurrency):
+- the file is SHA-256 hashed through a read-only memory map, so hashing runs
+  outside the GIL without copying the file into Python
+- the JPEG markers are walked up to the frame header for the dimensions and
+  component count, and the file must end with an EOI marker, so truncated
+  writes are caught
+- frames must be FRAME_SIZE x FRAME_SIZE RGB
+
+The results are compared with what was recorded when the frames were written:
+the SHA-256 in the manifest (modified files, finished frames whose file is
+gone, files no finished frame accounts for) and the size in the perceptual-hash
+index (stale entries). Frames written before file hashes were recorded are
+reported as unrecorded; --record-hashes stores their current hash as the
+baseline once they pass the file checks. Leftover .part files from interrupted
+writes are listed too.
+
+File problems, modified and missing frames are errors (exit status 1);
+everything else is a warning.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from image_processing import FRAME_SIZE
+from manifest import RunManifest
+from shard_merge import HASH_INDEX_NAME, MANIFEST_NAME
+
+# Start-of-frame markers (baseline, progressive, lossless...); C4, C8 and CC are not frame headers
+SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# Markers without a length field
+STANDALONE_MARKERS = {0x01, 0xD8} | set(range(0xD0, 0xD8))
+
+# Problems that mean a broken or wrong asset; the rest are warnings
+ERRORS = ('unreadable', 'not a JPEG', 'corrupt header', 'truncated', 'wrong size', 'not RGB',
+          'modified', 'missing')
+
+
+class AuditProblem(Exception):
+    """Raised when a file fails a header check"""
+
+
+def read_jpeg_header(buffer) -> Tuple[int, int, int]:
+    """Walk the JPEG markers up to the frame header and return (width, height, components)"""
+    if buffer[:2] != b'\xff\xd8':
+        raise AuditProblem('not a JPEG')
+    offset = 2
+    end = len(buffer)
+    while offset + 4 <= end:
+        if buffer[offset] != 0xFF:
+            raise AuditProblem('corrupt header')
+        marker = buffer[offset + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            offset += 1
+            continue
+        if marker in STANDALONE_MARKERS:
+            offset += 2
+            continue
+        if marker in (0xD9, 0xDA):
+            # End of image or start of scan before any frame header
+            raise AuditProblem('corrupt header')
+        length = int.from_bytes(buffer[offset + 2:offset + 4], 'big')
+        if marker in SOF_MARKERS:
+            if offset + 10 > end:
+                break
+            height = int.from_bytes(buffer[offset + 5:offset + 7], 'big')
+            width = int.from_bytes(buffer[offset + 7:offset + 9], 'big')
+            return width, height, buffer[offset + 9]
+        offset += 2 + length
+    raise AuditProblem('truncated')
+
+
+class FileCheck:
+    """Header, size and hash of one frame file, with anything wrong with it"""
+
+    def __init__(self, relpath: str):
+        self.relpath = relpath
+        self.size = 0
+        self.sha256: Optional[str] = None
+        self.width = 0
+        self.height = 0
+        self.problems: List[str] = []
+
+
+def check_frame_file(base_path: str, relpath: str, frame_size: int = FRAME_SIZE) -> FileCheck:
+    """Hash a frame through a memory map and validate its JPEG header and end marker"""
+    check = FileCheck(relpath)
+    try:
+        with open(os.path.join(base_path, relpath), 'rb') as f:
+            check.size = os.fstat(f.fileno()).st_size
+            if check.size == 0:
+                check.problems.append('truncated')
+                return check
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                check.sha256 = hashlib.sha256(buffer).hexdigest()
+                try:
+                    check.width, check.height, components = read_jpeg_header(buffer)
+                except AuditProblem as e:
+                    check.problems.append(str(e))
+                    return check
+                if buffer[-2:] != b'\xff\xd9':
+                    check.problems.append('truncated')
+    except (OSError, ValueError):
+        check.problems.append('unreadable')
+        return check
+
+    if (check.width, check.height) != (frame_size, frame_size):
+        check.problems.append('wrong size')
+    if components != 3:
+        check.problems.append('not RGB')
+    return check
+
+
+class FrameAuditor:
+    """Check every frame file in parallel and compare it with the manifest and hash index"""
+
+    def __init__(self, base_path: str, state_dir: str, face_shapes: Iterable[str],
+                 workers: Optional[int] = None, frame_size: int = FRAME_SIZE):
+        self.base_path = base_path
+        self.state_dir = state_dir
+        self.face_shapes = list(face_shapes)
+        self.workers = workers or min(32, (os.cpu_count() or 1) * 4)
+        self.frame_size = frame_size
+
+    def _scan_shape(self, face_shape: str) -> Tuple[List[str], List[str]]:
+        """Frame files and leftover partial writes in one face shape directory"""
+        frames, partials = [], []
+        shape_path = os.path.join(self.base_path, face_shape)
+        if not os.path.isdir(shape_path):
+            return frames, partials
+        with os.scandir(shape_path) as entries:
+            for entry in entries:
+                name = entry.name.lower()
+                if name.endswith('.jpg') and entry.is_file():
+                    frames.append(f"{face_shape}/{entry.name}")
+                elif name.endswith('.jpg.part'):
+                    partials.append(f"{face_shape}/{entry.name}")
+        return frames, partials
+
+    def _load_index_sizes(self) -> Dict[str, Optional[int]]:
+        path = os.path.join(self.state_dir, HASH_INDEX_NAME)
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entries = json.load(f).get('entries', {})
+        except (OSError, ValueError):
+            return {}
+        return {relpath: entry.get('size') for relpath, entry in entries.items()}
+
+    def run(self, record_hashes: bool = False) -> Dict:
+        """Audit all frames and return {'files', 'bytes', 'elapsed', 'problems': {kind: [relpaths]}}"""
+        started = time.perf_counter()
+        problems: Dict[str, List[str]] = defaultdict(list)
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='glasses-audit') as executor:
+            relpaths: List[str] = []
+            for frames, partials in executor.map(self._scan_shape, self.face_shapes):
+                relpaths.extend(frames)
+                problems['partial write'].extend(partials)
+            checks = list(executor.map(
+                lambda relpath: check_frame_file(self.base_path, relpath, self.frame_size), relpaths
+            ))
+
+        # Without a manifest nothing was recorded; do not create one just to audit
+        manifest_path = os.path.join(self.state_dir, MANIFEST_NAME)
+        manifest = RunManifest(manifest_path) if os.path.exists(manifest_path) else None
+        try:
+            shapes = set(self.face_shapes)
+            recorded = {relpath: output_hash for relpath, output_hash in manifest.output_hashes().items()
+                        if relpath.split('/', 1)[0] in shapes} if manifest else {}
+            index_sizes = self._load_index_sizes()
+            baseline = {}
+            for check in checks:
+                for problem in check.problems:
+                    problems[problem].append(check.relpath)
+                if check.relpath not in recorded:
+                    problems['untracked'].append(check.relpath)
+                elif recorded[check.relpath] is None:
+                    if record_hashes and not check.problems:
+                        baseline[check.relpath] = check.sha256
+                    else:
+                        problems['unrecorded'].append(check.relpath)
+                elif check.sha256 is not None and recorded[check.relpath] != check.sha256:
+                    problems['modified'].append(check.relpath)
+                if index_sizes.get(check.relpath) != check.size:
+                    problems['index stale'].append(check.relpath)
+
+            on_disk = {check.relpath for check in checks}
+            problems['missing'].extend(sorted(relpath for relpath in recorded if relpath not in on_disk))
+            if baseline:
+                manifest.record_output_hashes(baseline)
+        finally:
+            if manifest is not None:
+                manifest.close()
+
+        return {
+            'files': len(checks),
+            'bytes': sum(check.size for check in checks),
+            'elapsed': time.perf_counter() - started,
+            'recorded': len(baseline),
+            'problems': {kind: sorted(relpaths) for kind, relpaths in problems.items() if relpaths},
+        }
+
+
+def audit_failed(report: Dict) -> bool:
+    return any(kind in ERRORS for kind in report['problems'])
+
+
+def print_audit_report(report: Dict, limit: int = 20):
+    for kind, relpaths in sorted(report['problems'].items()):
+        icon = '❌' if kind in ERRORS else '⚠️ '
+        print(f"{icon} {kind}: {len(relpaths)} files")
+        for relpath in relpaths[:limit]:
+            print(f"     {relpath}")
+        if len(relpaths) > limit:
+            print(f"     ... and {len(relpaths) - limit} more")
+    if report['recorded']:
+        print(f"📝 Recorded baseline hashes for {report['recorded']} frames")
+    elapsed = max(report['elapsed'], 1e-9)
+    status = '❌ Audit found errors' if audit_failed(report) else '✅ Audit passed'
+    print(f"{status}: {report['files']} files, {report['bytes'] / 1024 / 1024:.1f} MB in "
+          f"{report['elapsed']:.2f}s ({report['files'] / elapsed:.0f} files/s, "
+          f"{report['bytes'] / 1024 / 1024 / elapsed:.0f} MB/s)")
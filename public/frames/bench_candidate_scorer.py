@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark the compiled candidate scorer against the original keyword scans.
+
+Synthetic search results are built from filler words with the scorer's own
+keywords mixed in at --keyword-rate, and a mix of preferred and unknown hosts. Every result is scored by
+score_result_legacy one at a time and by CandidateScorer.score_batch in
+batches, and the script reports time per result, speedup and how often the
+two agree (on the exact score and on suitability).
+
+Usage:
+    python3 bench_candidate_scorer.py
+    python3 bench_candidate_scorer.py --results 50000 --batch-size 100 --keyword-rate 0.2
+"""
+
+import argparse
+import random
+import time
+from typing import Dict, List
+
+from candidate_scorer import NEGATIVE_KEYWORDS, POSITIVE_KEYWORDS, CandidateScorer, score_result_legacy
+
+FILLER_WORDS = (
+    'gold', 'black', 'round', 'acetate', 'metal', 'classic', 'vintage', 'buy',
+    'online', 'free', 'shipping', 'men', 'women', 'unisex', 'lens', 'light',
+    'photo', 'image', 'stock', 'royalty', 'high', 'resolution', 'new', 'sale'
+)
+
+HOSTS = (
+    'www.shutterstock.com', 'www.istockphoto.com', 'media.gettyimages.com',
+    'www.alamy.com', 'www.dreamstime.com', 'www.warbyparker.com',
+    'www.zennioptical.com', 'www.eyebuydirect.com', 'www.lenscrafters.com',
+    'www.oakley.com', 'www.persol.com', 'www.pinterest.com', 'www.amazon.co.uk',
+    'i.ebayimg.com', 'commons.wikimedia.org', 'www.flickr.com', 'example.blogspot.com'
+)
+
+
+def make_text(rng: random.Random, words: int, keyword_rate: float) -> str:
+    keywords = POSITIVE_KEYWORDS + NEGATIVE_KEYWORDS
+    return ' '.join(
+        rng.choice(keywords) if rng.random() < keyword_rate else rng.choice(FILLER_WORDS)
+        for _ in range(words)
+    ).capitalize()
+
+
+def make_results(count: int, seed: int, keyword_rate: float) -> List[Dict]:
+    rng = random.Random(seed)
+    return [
+        {
+            'title': make_text(rng, rng.randint(4, 10), keyword_rate),
+            'snippet': make_text(rng, rng.randint(10, 30), keyword_rate),
+            'displayLink': rng.choice(HOSTS),
+            'url': f"https://img.example.com/{index}.jpg"
+        }
+        for index in range(count)
+    ]
+
+
+def best_time(function, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark candidate scoring')
+    parser.add_argument('--results', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=10, help='results per score_batch call (10 = one API page)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--keyword-rate', type=float, default=0.05, help='share of words that are keywords')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    results = make_results(args.results, args.seed, args.keyword_rate)
+    batches = [results[i:i + args.batch_size] for i in range(0, len(results), args.batch_size)]
+
+    compile_start = time.perf_counter()
+    scorer = CandidateScorer()
+    compile_time = time.perf_counter() - compile_start
+
+    def run_legacy():
+        return [score_result_legacy(result) for result in results]
+
+    def run_compiled():
+        return [score for batch in batches for score in scorer.score_batch(batch)]
+
+    legacy_time = best_time(run_legacy, args.repeat)
+    compiled_time = best_time(run_compiled, args.repeat)
+
+    legacy_scores = run_legacy()
+    compiled_scores = run_compiled()
+    same_score = sum(1 for a, b in zip(legacy_scores, compiled_scores) if a == b)
+    same_suitable = sum(1 for a, b in zip(legacy_scores, compiled_scores) if (a > 0) == (b > 0))
+
+    per_result = 1e6 / len(results)
+    print(f"⏱️  {len(results)} results, batches of {args.batch_size}, best of {args.repeat}")
+    print(f"   compile:  {compile_time * 1000:.2f} ms (once per downloader)")
+    print(f"   legacy:   {legacy_time * per_result:.2f} µs/result")
+    print(f"   compiled: {compiled_time * per_result:.2f} µs/result")
+    print(f"\n📊 Speedup {legacy_time / compiled_time:.2f}x, "
+          f"same score {same_score / len(results):.2%}, same suitability {same_suitable / len(results):.2%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark of GoogleImagesGlassesDownloader against a local fake
+Custom Search API and image host (see fake_search_server.py).
+
+For every catalog size and engine the downloader runs in a fresh subprocess,
+so peak RSS and CPU time belong to that run alone, against a synthetic
+catalog of N frames spread over the six face shapes. Each run reports:
+- frames/sec over the whole run
+- p50/p99 per-frame latency (start_frame to finish_frame)
+- peak RSS of the downloader process (and of its render pool, if any)
+- CPU and wall time per stage: search, fetch, render and write; the pipeline
+  engine renders in a process pool, so its render CPU is the pool's total
+
+Results are written as a JSON baseline; --compare prints the change against
+an earlier baseline for the same scenarios.
+
+Usage:
+    python3 bench_downloader.py
+    python3 bench_downloader.py --sizes 36 360 2160 --engines async pipeline --latency-ms 30
+    python3 bench_downloader.py --output after.json --compare before.json
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+from fake_search_server import IMAGE_FORMATS, FakeSearchServer, parse_size
+
+FACE_SHAPES = ['oval', 'round', 'square', 'heart', 'diamond', 'triangle']
+STAGES = ('search', 'fetch', 'render', 'write')
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.downloader', 'bench')
+
+
+def synthetic_catalog(frames: int) -> Dict[str, Dict[str, List[str]]]:
+    """A search_queries-shaped catalog of frames spread evenly over the face shapes"""
+    catalog = {face_shape: {} for face_shape in FACE_SHAPES}
+    for index in range(frames):
+        face_shape = FACE_SHAPES[index % len(FACE_SHAPES)]
+        catalog[face_shape][f"bench-{index:05d}"] = [
+            f"bench frame {index} eyeglasses product photography",
+            f"bench frame {index} glasses white background",
+        ]
+    return catalog
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class StageTimer:
+    """Accumulates per-stage CPU (thread time) and wall time around downloader methods"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.cpu = {stage: 0.0 for stage in STAGES}
+        self.wall = {stage: 0.0 for stage in STAGES}
+        self.calls = {stage: 0 for stage in STAGES}
+
+    def wrap(self, stage: str, function):
+        def timed(*args, **kwargs):
+            # Only the outermost stage on a thread is timed (fetch_image may call fetch_image_body)
+            if getattr(self.local, 'active', False):
+                return function(*args, **kwargs)
+            self.local.active = True
+            cpu_start = time.thread_time()
+            wall_start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                cpu = time.thread_time() - cpu_start
+                wall = time.perf_counter() - wall_start
+                self.local.active = False
+                with self.lock:
+                    self.cpu[stage] += cpu
+                    self.wall[stage] += wall
+                    self.calls[stage] += 1
+        return timed
+
+
+def run_worker(config: Dict) -> Dict:
+    """Run one scenario in this process and return its measurements"""
+    from glasses_downloader import GoogleImagesGlassesDownloader
+
+    os.environ.setdefault('GOOGLE_API_KEY', 'bench')
+    os.environ.setdefault('GOOGLE_CSE_ID', 'bench')
+    base_path = tempfile.mkdtemp(prefix='frames-bench-')
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            downloader = GoogleImagesGlassesDownloader(
+                base_path, concurrency=config['concurrency'], search_rate=0,
+                use_cache=False, search_endpoint=config['endpoint'],
+                resize_mode=config['resize_mode'], fetch_mode=config['fetch_mode'],
+                hedge=config['hedge'], hedge_delay=config['hedge_delay'], daily_quota=0
+            )
+        downloader.search_queries = synthetic_catalog(config['frames'])
+
+        timer = StageTimer()
+        # The query planner holds its own reference to search_google_images
+        downloader.query_planner.search = timer.wrap('search', downloader.search_google_images)
+        downloader.fetch_image = timer.wrap('fetch', downloader.fetch_image)
+        downloader.fetch_image_body = timer.wrap('fetch', downloader.fetch_image_body)
+        downloader.render_image = timer.wrap('render', downloader.render_image)
+        downloader.commit_frame = timer.wrap('write', downloader.commit_frame)
+
+        started_at: Dict[str, float] = {}
+        latencies: List[float] = []
+        latency_lock = threading.Lock()
+        start_frame = downloader.start_frame
+        finish_frame = downloader.finish_frame
+
+        def timed_start_frame(face_shape, frame_type, index, total):
+            started = start_frame(face_shape, frame_type, index, total)
+            if started:
+                with latency_lock:
+                    started_at[f"{face_shape}/{frame_type}"] = time.perf_counter()
+            return started
+
+        def timed_finish_frame(face_shape, frame_type, image_url, success):
+            result = finish_frame(face_shape, frame_type, image_url, success)
+            with latency_lock:
+                started = started_at.pop(f"{face_shape}/{frame_type}", None)
+                if started is not None:
+                    latencies.append(time.perf_counter() - started)
+            return result
+
+        downloader.start_frame = timed_start_frame
+        downloader.finish_frame = timed_finish_frame
+
+        usage_before = resource.getrusage(resource.RUSAGE_SELF)
+        children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        wall_start = time.perf_counter()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            downloader.download_all_images(engine=config['engine'])
+        elapsed = time.perf_counter() - wall_start
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+        children_cpu = (children.ru_utime - children_before.ru_utime) + (children.ru_stime - children_before.ru_stime)
+        stage_cpu = dict(timer.cpu)
+        if config['engine'] == 'pipeline':
+            stage_cpu['render'] = children_cpu
+
+        written = len(downloader.written_relpaths)
+        return {
+            'frames': config['frames'],
+            'engine': config['engine'],
+            'written': written,
+            'elapsed_seconds': elapsed,
+            'frames_per_second': written / elapsed if elapsed else 0.0,
+            'latency_p50_ms': percentile(latencies, 50) * 1000,
+            'latency_p99_ms': percentile(latencies, 99) * 1000,
+            'peak_rss_mb': usage.ru_maxrss / 1024,
+            'peak_children_rss_mb': children.ru_maxrss / 1024,
+            'cpu_seconds': (usage.ru_utime - usage_before.ru_utime) + (usage.ru_stime - usage_before.ru_stime),
+            'children_cpu_seconds': children_cpu,
+            'stage_cpu_seconds': stage_cpu,
+            'stage_wall_seconds': dict(timer.wall),
+            'stage_calls': dict(timer.calls),
+            'search_api_calls': downloader.api_calls,
+        }
+    finally:
+        shutil.rmtree(base_path, ignore_errors=True)
+
+
+def run_scenario(config: Dict) -> Optional[Dict]:
+    """Run one scenario in a fresh interpreter and parse its JSON result"""
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--worker', json.dumps(config)],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        print(f"❌ {config['engine']} x {config['frames']} failed:\n{completed.stderr[-2000:]}")
+        return None
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def scenario_key(run: Dict) -> str:
+    return f"{run['engine']}/{run['frames']}"
+
+
+def print_results(runs: List[Dict]):
+    print(f"\n{'engine':9} {'frames':>6} {'written':>7} {'fps':>7} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'rss MB':>7} {'cpu s':>6}  stage cpu s (search/fetch/render/write)")
+    for run in runs:
+        stage_cpu = '/'.join(f"{run['stage_cpu_seconds'][stage]:.2f}" for stage in STAGES)
+        print(f"{run['engine']:9} {run['frames']:6d} {run['written']:7d} {run['frames_per_second']:7.2f} "
+              f"{run['latency_p50_ms']:8.1f} {run['latency_p99_ms']:8.1f} {run['peak_rss_mb']:7.1f} "
+              f"{run['cpu_seconds'] + run['children_cpu_seconds']:6.2f}  {stage_cpu}")
+
+
+def print_comparison(runs: List[Dict], baseline: Dict):
+    previous = {scenario_key(run): run for run in baseline.get('runs', [])}
+    print(f"\n📊 Compared with {baseline.get('label', 'baseline')} ({baseline.get('created', '?')})")
+    for run in runs:
+        before = previous.get(scenario_key(run))
+        if not before:
+            print(f"   {scenario_key(run):16} (no baseline)")
+            continue
+        changes = []
+        for field, name in (('frames_per_second', 'fps'), ('latency_p50_ms', 'p50'),
+                            ('latency_p99_ms', 'p99'), ('peak_rss_mb', 'rss')):
+            if before[field]:
+                changes.append(f"{name} {(run[field] - before[field]) / before[field]:+.1%}")
+        print(f"   {scenario_key(run):16} " + ', '.join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end downloader benchmark against a local fake API')
+    parser.add_argument('--sizes', nargs='+', type=int, default=[36, 360, 2160], help='catalog sizes (frames)')
+    parser.add_argument('--engines', nargs='+', choices=['serial', 'async', 'pipeline'], default=['async', 'pipeline'])
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--image-size', type=parse_size, default=(1200, 900))
+    parser.add_argument('--image-format', choices=sorted(IMAGE_FORMATS), default='jpeg')
+    parser.add_argument('--latency-ms', type=float, default=20.0, help='added latency per image request')
+    parser.add_argument('--search-latency-ms', type=float, default=50.0, help='added latency per search request')
+    parser.add_argument('--error-rate', type=float, default=0.05, help='share of image URLs that fail')
+    parser.add_argument('--resize-mode', choices=['fast', 'legacy'], default='fast')
+    parser.add_argument('--fetch-mode', choices=['streaming', 'buffered'], default='streaming')
+    parser.add_argument('--hedge', type=int, default=1, help='hedged candidates per frame (1 = off)')
+    parser.add_argument('--hedge-delay', type=float, default=0.5)
+    parser.add_argument('--label', default=None, help='name stored in the baseline (default: timestamp)')
+    parser.add_argument('--output', default=None, help='baseline JSON path (default: .downloader/bench/<label>.json)')
+    parser.add_argument('--compare', default=None, help='earlier baseline JSON to compare against')
+    parser.add_argument('--worker', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(json.loads(args.worker))))
+        return
+
+    label = args.label or time.strftime('%Y%m%d-%H%M%S')
+    output = args.output or os.path.join(DEFAULT_OUTPUT_DIR, f"{label}.json")
+    server = FakeSearchServer(image_size=args.image_size, image_format=args.image_format,
+                              latency_ms=args.latency_ms, error_rate=args.error_rate,
+                              search_latency_ms=args.search_latency_ms).start()
+    print(f"🧪 Fake search API at {server.search_endpoint}")
+
+    runs = []
+    try:
+        for frames in args.sizes:
+            for engine in args.engines:
+                print(f"⏱️  {engine} engine, {frames} frames...")
+                result = run_scenario({
+                    'frames': frames, 'engine': engine, 'concurrency': args.concurrency,
+                    'endpoint': server.search_endpoint, 'resize_mode': args.resize_mode,
+                    'fetch_mode': args.fetch_mode, 'hedge': args.hedge, 'hedge_delay': args.hedge_delay,
+                })
+                if result:
+                    runs.append(result)
+    finally:
+        server.stop()
+
+    print_results(runs)
+    baseline = {
+        'label': label,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'settings': {
+            'concurrency': args.concurrency,
+            'image_size': list(args.image_size),
+            'image_format': args.image_format,
+            'latency_ms': args.latency_ms,
+            'search_latency_ms': args.search_latency_ms,
+            'error_rate': args.error_rate,
+            'resize_mode': args.resize_mode,
+            'fetch_mode': args.fetch_mode,
+            'hedge': args.hedge,
+            'hedge_delay': args.hedge_delay,
+        },
+        'runs': runs,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, indent=2)
+    print(f"\n💾 Baseline written to {output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            print_comparison(runs, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark the fast decode/resize path against the original pipeline.
+
+Sources are synthesized by upscaling the existing <shape>/*.jpg frames to
+camera-like resolutions and re-encoding them as JPEG. Each source is run
+through both pipelines (decode -> resize -> encode) and the script reports
+time per image, speedup, and pixel-level parity of the 800x800 outputs
+(mean and max absolute difference per channel, PSNR).
+
+Usage:
+    python3 bench_image_processing.py
+    python3 bench_image_processing.py --sizes 1600x1200 4000x3000 --repeat 5
+"""
+
+import argparse
+import glob
+import io
+import math
+import os
+import time
+from typing import List, Tuple
+
+from PIL import Image, ImageChops, ImageStat
+
+from image_processing import (
+    DEFAULT_ENCODER_OPTIONS, open_for_processing, prepare_frame, prepare_frame_legacy
+)
+
+
+def load_sources(base_path: str, sizes: List[Tuple[int, int]], limit: int) -> List[Tuple[str, bytes]]:
+    """Upscale existing frames to the requested sizes and encode them as JPEG sources"""
+    sources = []
+    frames = sorted(glob.glob(os.path.join(base_path, '*', '*.jpg')))[:limit]
+    for path in frames:
+        with Image.open(path) as frame:
+            frame = frame.convert('RGB')
+            for width, height in sizes:
+                buffer = io.BytesIO()
+                frame.resize((width, height), Image.Resampling.BICUBIC).save(buffer, 'JPEG', quality=92)
+                sources.append((f"{os.path.basename(path)}@{width}x{height}", buffer.getvalue()))
+    return sources
+
+
+def run_legacy(data: bytes) -> Tuple[Image.Image, bytes]:
+    image = Image.open(io.BytesIO(data))
+    final_image = prepare_frame_legacy(image)
+    output = io.BytesIO()
+    final_image.save(output, 'JPEG', **DEFAULT_ENCODER_OPTIONS)
+    return final_image, output.getvalue()
+
+
+def run_fast(data: bytes) -> Tuple[Image.Image, bytes]:
+    image = open_for_processing(io.BytesIO(data), fast=True)
+    final_image = prepare_frame(image)
+    output = io.BytesIO()
+    final_image.save(output, 'JPEG', **DEFAULT_ENCODER_OPTIONS)
+    return final_image, output.getvalue()
+
+
+def best_time(function, data: bytes, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(data)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def parity(a: Image.Image, b: Image.Image) -> Tuple[float, int, float]:
+    """Mean absolute difference, max absolute difference and PSNR between two images"""
+    diff = ImageChops.difference(a, b)
+    stat = ImageStat.Stat(diff)
+    mean_abs = sum(stat.mean) / len(stat.mean)
+    max_abs = max(high for _, high in stat.extrema)
+    mse = sum(value / stat.count[0] for value in stat.sum2) / len(stat.sum2)
+    psnr = float('inf') if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+    return mean_abs, max_abs, psnr
+
+
+def parse_size(value: str) -> Tuple[int, int]:
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark frame decode/resize paths')
+    parser.add_argument('--base-path', default=os.path.dirname(os.path.abspath(__file__)))
+    parser.add_argument('--sizes', nargs='+', type=parse_size,
+                        default=[(1200, 900), (3000, 2000), (6000, 4000)])
+    parser.add_argument('--limit', type=int, default=6, help='number of frames used as sources')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    sources = load_sources(args.base_path, args.sizes, args.limit)
+    print(f"⏱️  Benchmarking {len(sources)} sources, best of {args.repeat}")
+    print(f"{'source':40} {'legacy ms':>10} {'fast ms':>8} {'speedup':>8} {'mean':>6} {'max':>4} {'psnr':>6}")
+
+    totals = {'legacy': 0.0, 'fast': 0.0}
+    worst_psnr = float('inf')
+    for name, data in sources:
+        legacy_time = best_time(run_legacy, data, args.repeat)
+        fast_time = best_time(run_fast, data, args.repeat)
+        mean_abs, max_abs, psnr = parity(run_legacy(data)[0], run_fast(data)[0])
+        totals['legacy'] += legacy_time
+        totals['fast'] += fast_time
+        worst_psnr = min(worst_psnr, psnr)
+        print(f"{name:40} {legacy_time * 1000:10.1f} {fast_time * 1000:8.1f} "
+              f"{legacy_time / fast_time:7.2f}x {mean_abs:6.2f} {max_abs:4d} {psnr:6.1f}")
+
+    print(f"\n📊 Total: legacy {totals['legacy']:.2f}s, fast {totals['fast']:.2f}s, "
+          f"speedup {totals['legacy'] / totals['fast']:.2f}x, worst PSNR {worst_psnr:.1f} dB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Frame catalog files and deterministic sharding.
+
+A catalog maps face shapes to frame types to the search queries used for them,
+the same shape as GoogleImagesGlassesDownloader.search_queries:
+
+    {
+      "oval": {
+        "aviator-gold3": ["gold aviator eyeglasses product photography", ...],
+        ...
+      },
+      ...
+    }
+
+--catalog loads one from a JSON file instead of the built-in catalog, and
+--export-catalog writes the catalog in use to a file as a starting point.
+
+--shard i/N keeps only the (face_shape, frame_type) work items whose stable
+hash falls in shard i (0 <= i < N). The hash depends only on the item itself,
+not on catalog order or size, so N processes or machines given the same N
+take disjoint slices without coordinating, and adding frames to the catalog
+does not move existing frames between shards.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, List, Tuple
+
+Catalog = Dict[str, Dict[str, List[str]]]
+
+
+def is_path_component(name: str) -> bool:
+    """True for a name that stays a single entry inside its directory when joined to a path"""
+    return (bool(name) and name not in ('.', '..') and name.strip() == name
+            and not any(char in name for char in ('/', '\\', '\0')))
+
+
+def validate_catalog(data) -> Catalog:
+    """Check a decoded catalog and return it, raising ValueError on the first problem"""
+    if not isinstance(data, dict) or not data:
+        raise ValueError("catalog must be a non-empty object of face shapes")
+    for face_shape, frames in data.items():
+        if not is_path_component(face_shape):
+            raise ValueError(f"face shape '{face_shape}' must be a plain directory name")
+        if not isinstance(frames, dict) or not frames:
+            raise ValueError(f"face shape '{face_shape}' must map frame types to query lists")
+        for frame_type, queries in frames.items():
+            if not is_path_component(frame_type):
+                raise ValueError(f"frame type '{face_shape}/{frame_type}' must be a plain file name")
+            if (not isinstance(queries, list) or not queries
+                    or not all(isinstance(query, str) and query.strip() for query in queries)):
+                raise ValueError(f"'{face_shape}/{frame_type}' needs a non-empty list of query strings")
+    return data
+
+
+def load_catalog(path: str) -> Catalog:
+    with open(path, 'r', encoding='utf-8') as f:
+        try:
+            data = json.load(f)
+        except ValueError as e:
+            raise ValueError(f"{path} is not valid JSON: {e}") from None
+    return validate_catalog(data)
+
+
+def save_catalog(catalog: Catalog, path: str):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(catalog, f, indent=2)
+        f.write('\n')
+    os.replace(tmp_path, path)
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """argparse type for 'i/N' with 0 <= i < N"""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"shard must look like i/N, got '{value}'") from None
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard index must be in 0..{count - 1}, got '{value}'")
+    return index, count
+
+
+def shard_of(face_shape: str, frame_type: str, count: int) -> int:
+    """Stable shard number of a work item (independent of PYTHONHASHSEED and catalog order)"""
+    digest = hashlib.sha1(f"{face_shape}/{frame_type}".encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % count
+
+
+def shard_frames(frames: Iterable[Tuple[str, str]], shard: Tuple[int, int]) -> List[Tuple[str, str]]:
+    index, count = shard
+    return [(face_shape, frame_type) for face_shape, frame_type in frames
+            if shard_of(face_shape, frame_type, count) == index]
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Responsive derivative generation for frame images.
+
+For every public/frames/<shape>/*.jpg this writes WebP (and AVIF, when the
+installed Pillow can encode it) copies at several widths into
+<shape>/derived/, plus a tiny base64 WebP placeholder (LQIP) for Next.js
+blurDataURL. Everything is described in derivatives.json:
+
+    {
+      "oval/aviator-gold.jpg": {
+        "source_hash": "<sha256>",
+        "width": 800, "height": 800,
+        "lqip": "data:image/webp;base64,...",
+        "variants": [{"format": "webp", "width": 400, "path": "oval/derived/aviator-gold-400.webp", "bytes": 9182}, ...]
+      }
+    }
+
+Runs are incremental: a source is only re-rendered when its content hash,
+the width or format set changes, or one of its outputs is missing; variants
+the new set no longer produces are deleted. Rendering runs in a process pool.
+
+Usage:
+    python3 derivatives.py
+    python3 derivatives.py --widths 150 400 800 --formats webp avif --workers 4
+"""
+
+import argparse
+import base64
+import hashlib
+import io
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from PIL import Image, features
+
+DEFAULT_WIDTHS = (150, 400, 800)
+DEFAULT_FORMATS = ('webp', 'avif')
+DERIVED_DIR = 'derived'
+MANIFEST_NAME = 'derivatives.json'
+LQIP_WIDTH = 16
+
+FORMAT_OPTIONS = {
+    'webp': {'quality': 80, 'method': 6},
+    'avif': {'quality': 60},
+}
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def supported_formats(formats: Iterable[str]) -> List[str]:
+    """Drop formats the installed Pillow cannot encode"""
+    available = []
+    for image_format in formats:
+        if image_format == 'avif' and not features.check('avif'):
+            print("⚠️  AVIF encoding not available in this Pillow build, skipping AVIF")
+            continue
+        available.append(image_format)
+    return available
+
+
+def render_derivatives(base_path: str, relpath: str, source_hash: str,
+                       widths: List[int], formats: List[str]) -> Dict:
+    """Render all variants and the placeholder for one source (runs in a worker process)"""
+    face_shape, filename = relpath.split('/', 1)
+    stem = os.path.splitext(filename)[0]
+    derived_dir = os.path.join(base_path, face_shape, DERIVED_DIR)
+    os.makedirs(derived_dir, exist_ok=True)
+
+    with Image.open(os.path.join(base_path, relpath)) as source:
+        source = source.convert('RGB')
+        variants = []
+        for width in sorted(set(min(w, source.width) for w in widths)):
+            height = round(source.height * width / source.width)
+            resized = source if width == source.width else source.resize(
+                (width, height), Image.Resampling.LANCZOS, reducing_gap=2.0
+            )
+            for image_format in formats:
+                output_relpath = f"{face_shape}/{DERIVED_DIR}/{stem}-{width}.{image_format}"
+                output_path = os.path.join(base_path, output_relpath)
+                resized.save(output_path, image_format.upper(), **FORMAT_OPTIONS.get(image_format, {}))
+                variants.append({
+                    'format': image_format,
+                    'width': width,
+                    'height': height,
+                    'path': output_relpath,
+                    'bytes': os.path.getsize(output_path)
+                })
+
+        lqip = source.copy()
+        lqip.thumbnail((LQIP_WIDTH, LQIP_WIDTH), Image.Resampling.BOX)
+        buffer = io.BytesIO()
+        lqip.save(buffer, 'WEBP', quality=30)
+
+        return {
+            'source_hash': source_hash,
+            'width': source.width,
+            'height': source.height,
+            'bytes': os.path.getsize(os.path.join(base_path, relpath)),
+            'lqip': 'data:image/webp;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii'),
+            'variants': variants
+        }
+
+
+class DerivativeGenerator:
+    """Incrementally builds responsive derivatives and their JSON manifest"""
+
+    def __init__(self, base_path: str, face_shapes: Iterable[str],
+                 widths: Iterable[int] = DEFAULT_WIDTHS, formats: Iterable[str] = DEFAULT_FORMATS,
+                 workers: Optional[int] = None):
+        self.base_path = base_path
+        self.face_shapes = list(face_shapes)
+        self.widths = list(widths)
+        self.formats = supported_formats(formats)
+        self.workers = workers
+        self.manifest_path = os.path.join(base_path, MANIFEST_NAME)
+        self.manifest: Dict[str, Dict] = {}
+        self.lock = threading.Lock()
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+
+    def source_relpaths(self) -> List[str]:
+        relpaths = []
+        for face_shape in self.face_shapes:
+            shape_path = os.path.join(self.base_path, face_shape)
+            if os.path.isdir(shape_path):
+                relpaths.extend(
+                    f"{face_shape}/{filename}" for filename in sorted(os.listdir(shape_path))
+                    if filename.lower().endswith('.jpg')
+                )
+        return relpaths
+
+    def is_current(self, relpath: str, source_hash: str) -> bool:
+        entry = self.manifest.get(relpath)
+        if not entry or entry.get('source_hash') != source_hash:
+            return False
+        expected = {(v['format'], v['width']) for v in entry.get('variants', [])}
+        wanted_widths = {min(w, entry['width']) for w in self.widths}
+        if expected != {(f, w) for f in self.formats for w in wanted_widths}:
+            return False
+        return all(os.path.exists(os.path.join(self.base_path, v['path'])) for v in entry['variants'])
+
+    def build(self, relpaths: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """Render stale sources in a process pool and rewrite the manifest"""
+        relpaths = list(relpaths) if relpaths is not None else self.source_relpaths()
+        hashes = {relpath: file_sha256(os.path.join(self.base_path, relpath)) for relpath in relpaths}
+        stale = [relpath for relpath in relpaths if not self.is_current(relpath, hashes[relpath])]
+
+        if stale:
+            print(f"🖼️  Rendering derivatives for {len(stale)}/{len(relpaths)} frames...")
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                futures = {
+                    relpath: executor.submit(render_derivatives, self.base_path, relpath,
+                                             hashes[relpath], self.widths, self.formats)
+                    for relpath in stale
+                }
+                for relpath, future in futures.items():
+                    try:
+                        entry = future.result()
+                    except Exception as e:
+                        print(f"❌ Derivatives failed for {relpath}: {e}")
+                        continue
+                    with self.lock:
+                        previous = self.manifest.get(relpath)
+                        self.manifest[relpath] = entry
+                    if previous:
+                        # Variants the new width/format set no longer produces would stay behind
+                        current = {variant['path'] for variant in entry['variants']}
+                        self.remove_outputs(v for v in previous.get('variants', []) if v['path'] not in current)
+
+        self.prune()
+        self.save()
+        return {'sources': len(relpaths), 'rendered': len(stale)}
+
+    def prune(self):
+        """Drop manifest entries (and their outputs) whose source image no longer exists"""
+        with self.lock:
+            for relpath in list(self.manifest):
+                if os.path.exists(os.path.join(self.base_path, relpath)):
+                    continue
+                self.remove_outputs(self.manifest[relpath].get('variants', []))
+                del self.manifest[relpath]
+
+    def remove_outputs(self, variants: Iterable[Dict]):
+        for variant in variants:
+            output_path = os.path.join(self.base_path, variant['path'])
+            if os.path.exists(output_path):
+                os.remove(output_path)
+
+    def save(self):
+        with self.lock:
+            payload = json.dumps(self.manifest, indent=2, sort_keys=True)
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        os.replace(tmp_path, self.manifest_path)
+
+    def print_report(self):
+        source_bytes = sum(entry.get('bytes', 0) for entry in self.manifest.values())
+        print(f"📦 {len(self.manifest)} frames, {source_bytes / 1024:.0f} KB of JPEG sources")
+        for image_format in self.formats:
+            for width in sorted({v['width'] for e in self.manifest.values() for v in e['variants']}):
+                total = sum(v['bytes'] for e in self.manifest.values() for v in e['variants']
+                            if v['format'] == image_format and v['width'] == width)
+                print(f"   {image_format} {width}w: {total / 1024:.0f} KB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate responsive WebP/AVIF frame derivatives')
+    parser.add_argument('--base-path', default=os.path.dirname(os.path.abspath(__file__)))
+    parser.add_argument('--face-shapes', nargs='+',
+                        default=['oval', 'round', 'square', 'heart', 'diamond', 'triangle'])
+    parser.add_argument('--widths', nargs='+', type=int, default=list(DEFAULT_WIDTHS))
+    parser.add_argument('--formats', nargs='+', choices=['webp', 'avif'], default=list(DEFAULT_FORMATS))
+    parser.add_argument('--workers', type=int, default=None, help='process pool size (default: CPU count)')
+    args = parser.parse_args()
+
+    generator = DerivativeGenerator(args.base_path, args.face_shapes, args.widths, args.formats, args.workers)
+    result = generator.build()
+    print(f"✅ Derivatives up to date ({result['rendered']} rendered, {result['sources']} sources)")
+    generator.print_report()
+
+
+if __name__ == '__main__':
+    main()
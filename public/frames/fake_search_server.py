@@ -0,0 +1,266 @@
+"""
+Local stand-in for the Custom Search API and the image hosts it points to.
+
+FakeSearchServer answers /customsearch/v1 with the same response shape
+search_google_images reads (items with link, title, snippet, displayLink,
+mime and image) and serves the linked images from /img/<id>.<ext>. Results
+are deterministic: the same query and start always return the same items,
+and each item id always renders the same synthetic product shot (a few
+outlined shapes on white, so perceptual hashes differ between ids).
+
+Image size, format, per-request latency and error rate are configurable.
+Which image URLs fail is decided by their id, so repeated runs fail the same
+URLs and benchmark baselines stay comparable.
+Images carry an ETag and Last-Modified, answer If-None-Match with 304 and
+support HEAD; touch(image_id) swaps in a new version, for testing refresh.
+
+Used by bench_downloader.py; can also be run on its own for manual testing:
+    python3 fake_search_server.py --port 8765 --latency-ms 50
+and pointed at with GoogleImagesGlassesDownloader(search_endpoint=...).
+"""
+
+import argparse
+import email.utils
+import hashlib
+import io
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from PIL import Image, ImageDraw
+
+SEARCH_PATH = '/customsearch/v1'
+IMAGE_PATH = '/img/'
+PAGE_SIZE = 10
+MAX_RESULTS = 100
+
+IMAGE_FORMATS = {
+    'jpeg': ('jpg', 'image/jpeg'),
+    'png': ('png', 'image/png'),
+    'webp': ('webp', 'image/webp'),
+}
+
+RESULT_HOSTS = ('www.zennioptical.com', 'www.shutterstock.com', 'www.example-optics.com')
+
+
+def stable_fraction(value: str) -> float:
+    """Deterministic value in [0, 1) for a string"""
+    return int(hashlib.sha1(value.encode('utf-8')).hexdigest()[:8], 16) / 0x100000000
+
+
+def synthetic_image(image_id: str, size: Tuple[int, int], image_format: str) -> bytes:
+    """Render a product-shot-like image: outlined shapes in a wide band on a white background"""
+    rng = random.Random(image_id)
+    width, height = size
+    image = Image.new('RGB', size, 'white')
+    draw = ImageDraw.Draw(image)
+    # Keep the shapes in the middle of the height so the foreground is glasses-shaped
+    band_top, band_height = height // 4, height // 2
+    for _ in range(6):
+        shape_width = rng.randint(width // 20 + 1, width // 3 + 1)
+        shape_height = rng.randint(band_height // 10 + 1, band_height // 2 + 1)
+        x0 = rng.randint(0, max(1, width - shape_width))
+        y0 = band_top + rng.randint(0, max(1, band_height - shape_height))
+        color = tuple(rng.randint(0, 160) for _ in range(3))
+        outline = max(2, min(width, height) // 60)
+        box = [x0, y0, x0 + shape_width, y0 + shape_height]
+        if rng.random() < 0.5:
+            draw.ellipse(box, outline=color, width=outline)
+        else:
+            draw.rectangle(box, outline=color, width=outline)
+
+    buffer = io.BytesIO()
+    image.save(buffer, image_format.upper(), **({'quality': 90} if image_format != 'png' else {}))
+    return buffer.getvalue()
+
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer that ignores clients hanging up mid-request"""
+
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+
+class FakeSearchServer:
+    """Threaded HTTP server serving fake search results and synthetic images"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0,
+                 image_size: Tuple[int, int] = (1200, 900), image_format: str = 'jpeg',
+                 latency_ms: float = 0.0, error_rate: float = 0.0, search_latency_ms: float = 0.0):
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"Unknown image format: {image_format}")
+        self.image_size = image_size
+        self.image_format = image_format
+        self.latency = latency_ms / 1000
+        self.search_latency = search_latency_ms / 1000
+        self.error_rate = error_rate
+        self.images: Dict[str, bytes] = {}
+        # Bumped by touch() to simulate an upstream image being replaced
+        self.versions: Dict[str, int] = {}
+        self.last_modified = email.utils.formatdate(time.time(), usegmt=True)
+        self.lock = threading.Lock()
+        self.counters = {'searches': 0, 'images': 0, 'errors': 0, 'not_modified': 0}
+        self.httpd = QuietHTTPServer((host, port), self._handler_class())
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def search_endpoint(self) -> str:
+        return self.base_url + SEARCH_PATH
+
+    def start(self) -> 'FakeSearchServer':
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='fake-search-server', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _count(self, name: str):
+        with self.lock:
+            self.counters[name] += 1
+
+    def search_items(self, query: str, num: int, start: int) -> list:
+        extension, mime = IMAGE_FORMATS[self.image_format]
+        query_id = hashlib.sha1(query.encode('utf-8')).hexdigest()[:12]
+        items = []
+        for rank in range(start, min(start + num, MAX_RESULTS + 1)):
+            image_id = f"{query_id}-{rank}"
+            items.append({
+                'link': f"{self.base_url}{IMAGE_PATH}{image_id}.{extension}",
+                'title': f"{query} eyeglasses frames product",
+                'snippet': 'Eyewear product photo isolated on white background',
+                'displayLink': RESULT_HOSTS[rank % len(RESULT_HOSTS)],
+                'mime': mime,
+                'image': {'width': self.image_size[0], 'height': self.image_size[1]},
+            })
+        return items
+
+    def image_bytes(self, image_id: str) -> bytes:
+        with self.lock:
+            data = self.images.get(image_id)
+            version = self.versions.get(image_id, 0)
+        if data is None:
+            seed = f"{image_id}/v{version}" if version else image_id
+            data = synthetic_image(seed, self.image_size, self.image_format)
+            with self.lock:
+                self.images[image_id] = data
+        return data
+
+    def touch(self, image_id: str):
+        """Replace an image with a new version (new bytes, ETag and Last-Modified)"""
+        with self.lock:
+            self.versions[image_id] = self.versions.get(image_id, 0) + 1
+            self.images.pop(image_id, None)
+
+    def image_validators(self, image_id: str, data: bytes) -> Tuple[str, str]:
+        """ETag and Last-Modified of an image; touched images look modified now"""
+        etag = '"' + hashlib.sha1(data).hexdigest()[:16] + '"'
+        with self.lock:
+            touched = self.versions.get(image_id, 0) > 0
+        return etag, email.utils.formatdate(time.time(), usegmt=True) if touched else self.last_modified
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, content_type: str, body: bytes, headers: Optional[Dict] = None,
+                      include_body: bool = True):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                if include_body:
+                    self.wfile.write(body)
+
+            def do_GET(self, include_body: bool = True):
+                url = urlparse(self.path)
+                if url.path == SEARCH_PATH:
+                    self._search(parse_qs(url.query))
+                elif url.path.startswith(IMAGE_PATH):
+                    self._image(url.path[len(IMAGE_PATH):].rsplit('.', 1)[0], include_body)
+                else:
+                    self._send(404, 'text/plain', b'not found')
+
+            def do_HEAD(self):
+                self.do_GET(include_body=False)
+
+            def _search(self, params: Dict):
+                server._count('searches')
+                if server.search_latency:
+                    time.sleep(server.search_latency)
+                query = params.get('q', [''])[0]
+                num = min(int(params.get('num', [PAGE_SIZE])[0]), PAGE_SIZE)
+                start = int(params.get('start', ['1'])[0])
+                items = server.search_items(query, num, start)
+                body = json.dumps({'kind': 'customsearch#search', 'items': items}).encode('utf-8')
+                self._send(200, 'application/json; charset=UTF-8', body)
+
+            def _image(self, image_id: str, include_body: bool = True):
+                server._count('images')
+                if server.latency:
+                    time.sleep(server.latency)
+                if stable_fraction(image_id) < server.error_rate:
+                    server._count('errors')
+                    self._send(500 if stable_fraction(image_id + '/status') < 0.5 else 404,
+                               'text/plain', b'error', include_body=include_body)
+                    return
+                data = server.image_bytes(image_id)
+                etag, last_modified = server.image_validators(image_id, data)
+                validators = {'ETag': etag, 'Last-Modified': last_modified}
+                if self.headers.get('If-None-Match') == etag:
+                    server._count('not_modified')
+                    self._send(304, IMAGE_FORMATS[server.image_format][1], b'', validators)
+                    return
+                self._send(200, IMAGE_FORMATS[server.image_format][1], data, validators, include_body)
+
+        return Handler
+
+
+def parse_size(value: str) -> Tuple[int, int]:
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve fake Custom Search results and synthetic images')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--image-size', type=parse_size, default=(1200, 900))
+    parser.add_argument('--image-format', choices=sorted(IMAGE_FORMATS), default='jpeg')
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = FakeSearchServer(port=args.port, image_size=args.image_size, image_format=args.image_format,
+                              latency_ms=args.latency_ms, error_rate=args.error_rate)
+    print(f"🧪 Fake search endpoint: {server.search_endpoint}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -6,9 +6,10 @@ This script downloads high-quality glasses images from Google Images using the C
 specifically filtering for Creative Commons licensed images to ensure proper usage rights.
 
 Requirements:
-- Python 3.6+
+- Python 3.7+
 - requests library (pip install requests)
 - Pillow library (pip install pillow)
+- NumPy (pip install numpy)
 
 Setup:
 1. Create a Google Custom Search Engine at: https://cse.google.com/cse/
@@ -22,28 +23,314 @@ Environment Variables:
 
 Usage:
     python3 glasses_downloader.py
+    python3 glasses_downloader.py --engine async --concurrency 8 --search-rate 1.0
+
+Engines:
+- serial: one frame at a time (default)
+- async: frames processed concurrently under a global concurrency limit
+- pipeline: search -> fetch -> render -> write stages connected by bounded
+  queues, with decode/encode on a process pool (--render-workers) and
+  per-stage queue depth and throughput reports (see pipeline.py)
+Both engines pace Custom Search API calls with a token bucket (--search-rate
+queries per second, --search-burst queries of burst capacity).
+
+Search cache:
+Search results are cached in .downloader/search_cache.sqlite (TTL --cache-ttl
+hours, at most --cache-size entries, least recently used evicted first).
+--cache-only replays the whole pipeline from the cache with no API calls;
+--no-cache always queries the API.
+
+Search quota:
+Every request sent to the search endpoint, retries included, is counted per
+API key per UTC day in .downloader/quota.sqlite, which also holds the running
+frames' reservations, so all shards share one budget (see quota.py). Missing frames are scheduled first, then
+retries of failed ones, cheapest (cached) first; a frame only starts if its
+worst case fits in what is left of --daily-quota: --search-budget calls, or
+fewer when its queries have fewer uncached pages (fully cached frames need no
+quota at all). Frames that do not fit are deferred, and the next run picks them
+up first.
+--daily-quota 0 turns tracking off.
+
+Duplicate detection:
+Images are compared with a perceptual hash (see phash_index.py), so re-encoded
+or resized copies of the same product shot are rejected. The index is stored in
+.downloader/phash_index.json and seeded from the existing <shape>/*.jpg files
+at startup; --dedup-distance sets how many of the 256 hash bits may differ.
+
+Fetching:
+By default images are streamed (--fetch-mode streaming): content type, length
+and dimensions are checked before the body is fully read, and bodies are
+spooled to a buffer holding at most --fetch-memory-mb per worker in memory;
+the pipeline engine hands larger bodies to its render processes as temporary
+files rather than reading them back into memory.
+--fetch-mode buffered reads the whole response first.
+All requests go through a host-aware session (see http_session.py): pooled
+connections and an adaptive concurrency limit per host, retries of 429/5xx
+responses, timeouts and connection errors with jittered exponential backoff
+(--max-retries) that honor Retry-After, and a circuit breaker that skips a host
+for --host-cooldown seconds after --host-failures consecutive failures.
+--connect-timeout and --read-timeout replace the old flat 30s timeout.
+
+Image processing:
+--resize-mode fast (default) decodes JPEGs near the 800x800 target with
+Image.draft and skips redundant copies; --resize-mode legacy runs the original
+full-resolution pipeline. --jpeg-quality, --no-optimize and --progressive set
+the JPEG encoder options. See bench_image_processing.py for speed and parity.
+Before resizing, each candidate must look like a product shot: a mostly white
+border and a glasses-shaped foreground big enough to fill a frame. The source
+is cropped to that foreground so padding does not shrink the product (see
+product_check.py); --no-product-check turns this off.
+--target-ssim [SSIM] encodes each frame at the lowest JPEG quality between
+--min-quality and --jpeg-quality whose SSIM against the 800x800 master still
+meets the target (default 0.985), instead of always at --jpeg-quality; the run
+reports the bytes saved per face shape. `reencode` does the same for frames
+already on disk, on a process pool (--render-workers), see quality_search.py.
+
+Search planning:
+Each frame's queries are run lazily until --candidates-per-frame suitable
+candidates are collected, paging further only when needed, and never more than
+--search-budget searches per frame (see query_planner.py). Candidates are
+ranked by score and tried in order, up to --candidates-per-frame per frame;
+unsuitable results are kept as the fallback pool instead of searching again.
+Results are scored in batches by a keyword/domain scorer compiled once (see
+candidate_scorer.py and bench_candidate_scorer.py).
+With --hedge K (serial and async engines), up to K candidates are fetched at
+once: another starts after --hedge-delay seconds without a usable result or as
+soon as one fails, the first image that passes validation and dedup is kept,
+and the rest are cancelled (see hedged_fetch.py).
+
+Derivatives:
+--derivatives renders responsive WebP/AVIF copies and blur placeholders for
+the frames written by the run (see derivatives.py, which can also be run on
+its own over every <shape>/*.jpg).
+
+Sprites:
+--sprites packs each face shape's frames into one WebP/JPEG grid atlas and
+describes the tile positions in sprites.json (see sprites.py); only atlases
+whose frames changed are re-rendered.
+
+Benchmarking:
+bench_downloader.py runs the downloader end to end against a local fake Custom
+Search API and image host (fake_search_server.py, via search_endpoint) and
+stores frames/sec, latency percentiles, peak RSS and per-stage CPU as JSON
+baselines.
+
+Metrics:
+--metrics-log writes a JSON-lines event log of per-stage timings (search, plan,
+fetch, decode, check, resize, hash, encode, write, frame) and counters (API calls,
+cache hits, bytes fetched, rejects by reason, dedup hits); --metrics-prom
+writes the totals as a Prometheus text file when the run ends (see metrics.py).
+Without either option the instrumentation is a no-op.
+
+Profiling:
+--profile wraps every timed stage, the render step and each pipeline stage in
+cProfile and tracemalloc spans and samples the stacks of busy threads. Each
+run writes per-stage .pstats files, stacks.collapsed (flamegraph-ready),
+allocations.txt and report.txt (stage and per-frame allocation peaks, the
+slowest --profile-top frames) to .downloader/profiles/<timestamp>/ or
+--profile-dir (see profiling.py). Off by default, with no extra cost.
+
+Catalogs and sharding:
+--catalog loads the face shapes, frame types and queries from a JSON file
+(--export-catalog writes the built-in one as a template). --shard i/N takes
+only the work items whose stable hash falls in shard i, so N processes or
+machines can split a catalog without coordinating; each shard keeps its state
+in .downloader/shards/<i>-of-<N>/, and `glasses_downloader.py merge` folds the
+shard manifests and duplicate indexes back into .downloader/ (see catalog.py
+and shard_merge.py).
+
+Refreshing:
+`glasses_downloader.py refresh` revalidates existing frames instead of skipping
+them: each frame's source URL, ETag, Last-Modified and SHA-256 are kept in the
+manifest, conditional requests run in parallel (--concurrency), and only frames
+whose source actually changed are fetched in full and re-encoded. No search
+calls are made. --refresh-method head tries HEAD first (see refresh.py).
+
+Ingesting:
+`glasses_downloader.py ingest --source DUMP --mapping MAP.json` renders a local
+directory, tar (or '-' for a tar stream on stdin) or zip of supplier photos into
+frames without searching: MAP assigns member paths or glob patterns to
+<shape>/<frame type>, members are read straight from the archive, rendered on
+a process pool (--render-workers) with the same checks, resize and encoding
+as downloads, and committed with the usual dedup and manifest records. The
+run reports images/sec and rejects by reason (see ingest.py).
+
+Auditing:
+`glasses_downloader.py audit` checks every frame file on a thread pool without
+decoding it: memory-mapped SHA-256, JPEG header dimensions and end marker, and
+drift against the file hashes in the manifest and the duplicate index. It exits
+with status 1 on errors; --record-hashes baselines frames written before file
+hashes were kept (see audit.py).
+
+Resuming:
+Every frame, candidate URL, attempt, failure and output is recorded in
+.downloader/manifest.sqlite, so an interrupted run resumes with all dedup
+knowledge intact and never re-fetches URLs that already failed permanently.
 """
 
+import argparse
+import hashlib
 import os
 import requests
+import shutil
+import tempfile
+import threading
 import time
 import io
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
-from typing import Dict, List, Optional, Set
-import hashlib
+from typing import Dict, List, Optional, Set, Tuple, Union
 import json
 
+from candidate_scorer import CandidateScorer
+from catalog import load_catalog, parse_shard, save_catalog, shard_frames
+from image_processing import (DEFAULT_ENCODER_OPTIONS, FRAME_SIZE, ImageRejected, RenderedFrame,
+                              open_for_processing, render_frame)
+from manifest import FRAME_DONE, FRAME_FAILED, URL_BAD, URL_DOWNLOADED, RunManifest
+from metrics import Metrics, reason_label
+from phash_index import PerceptualHashIndex, perceptual_hash
+from quality_search import DEFAULT_MIN_QUALITY, DEFAULT_TARGET_SSIM
+from query_planner import PAGE_SIZE, Candidate, QueryPlanner
+from quota import (DEFAULT_DAILY_LIMIT, is_daily_limit_response, PRIORITY_EXISTS, PRIORITY_MISSING, PRIORITY_RETRY,
+                   QuotaExhausted, QuotaLedger, QuotaScheduler, WorkItem)
+from hedged_fetch import HedgedDownload
+from http_session import HostAwareSession, HostUnavailable
+from rate_limit import TokenBucket
+from search_cache import SearchCache
+from shard_merge import find_shard_dirs, merge_shard_state, print_merge_report, shard_state_dir
+from streaming_fetch import ACCEPTED_CONTENT_TYPES, FetchRejected, fetch_image_streaming, source_validators
+
+SEARCH_API_URL = "https://www.googleapis.com/customsearch/v1"
+
+# Face shapes of the built-in catalog
+FACE_SHAPES = ['oval', 'round', 'square', 'heart', 'diamond', 'triangle']
+
+# Add headers to appear more like a browser
+IMAGE_REQUEST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'DNT': '1',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1'
+}
+
 class GoogleImagesGlassesDownloader:
-    def __init__(self, base_path: str):
+    def __init__(self, base_path: str, concurrency: int = 8,
+                 search_rate: float = 1.0, search_burst: int = 1,
+                 state_dir: Optional[str] = None, use_cache: bool = True,
+                 cache_ttl_hours: float = 168, cache_size: int = 5000,
+                 cache_only: bool = False, dedup_distance: int = 10,
+                 fetch_mode: str = 'streaming', fetch_memory_mb: float = 8,
+                 max_image_mb: float = 25, resize_mode: str = 'fast',
+                 encoder_options: Optional[Dict] = None, derivatives: bool = False, sprites: bool = False,
+                 search_budget: int = 3, candidates_per_frame: int = 3,
+                 search_endpoint: str = SEARCH_API_URL, metrics_log: Optional[str] = None,
+                 metrics_prom: Optional[str] = None, catalog: Optional[Dict[str, Dict[str, List[str]]]] = None,
+                 shard: Optional[Tuple[int, int]] = None, product_check: bool = True,
+                 max_retries: int = 3, host_failures: int = 5, host_cooldown: float = 60,
+                 connect_timeout: float = 5, read_timeout: float = 30,
+                 hedge: int = 1, hedge_delay: float = 0.5, daily_quota: int = DEFAULT_DAILY_LIMIT,
+                 profile: bool = False, profile_dir: Optional[str] = None, profile_top: int = 10):
         self.base_path = base_path
+        # Each shard keeps its own state so shards sharing base_path never collide
+        self.shard = shard
+        default_state_dir = os.path.join(base_path, '.downloader')
+        self.state_dir = state_dir or (shard_state_dir(default_state_dir, shard) if shard else default_state_dir)
         self.google_api_key = os.getenv('GOOGLE_API_KEY')
         self.google_cse_id = os.getenv('GOOGLE_CSE_ID')
-        self.session = requests.Session()
-        self.downloaded_urls: Set[str] = set()
-        self.downloaded_hashes: Set[str] = set()
+        self.search_endpoint = search_endpoint
+        self.concurrency = max(1, concurrency)
+        self.fetch_mode = fetch_mode
+        self.fetch_memory_limit = int(fetch_memory_mb * 1024 * 1024)
+        self.max_image_bytes = int(max_image_mb * 1024 * 1024)
+        self.resize_mode = resize_mode
+        self.product_check = product_check
+        self.encoder_options = encoder_options or {}
+        self.derivatives = derivatives
+        self.sprites = sprites
+        
+        # Optional per-stage cProfile/tracemalloc profiling; not even imported unless requested
+        profiler = None
+        if profile:
+            from profiling import StageProfiler
+            run_dir = os.path.join(profile_dir or os.path.join(self.state_dir, 'profiles'),
+                                   time.strftime('%Y%m%d-%H%M%S'))
+            profiler = StageProfiler(run_dir, top=profile_top)
+        
+        # Stage timers and counters; no-ops unless a metrics output or profiling is configured
+        self.metrics = Metrics(metrics_log, metrics_prom, profiler)
+        
+        # Frames written during this run, for post-download stages
+        self.written_relpaths: List[str] = []
+        # Face shape -> bytes written vs. the fixed quality, when encoding to a target SSIM
+        self.encode_savings: Dict[str, object] = {}
+        
+        # Per-host pooling, adaptive limits, retries with backoff and circuit breakers
+        self.session = HostAwareSession(
+            max_per_host=self.concurrency, max_retries=max_retries,
+            failure_threshold=host_failures, cooldown=host_cooldown, metrics=self.metrics
+        )
+        self.request_timeout = (connect_timeout, read_timeout)
+        
+        # Persistent manifest; downloaded and known-bad URLs survive restarts
+        self.manifest = RunManifest(os.path.join(self.state_dir, 'manifest.sqlite'))
+        self.downloaded_urls: Set[str] = self.manifest.urls_with_status(URL_DOWNLOADED)
+        self.bad_urls: Set[str] = self.manifest.urls_with_status(URL_BAD)
+        
+        # URLs picked by find_best_image but not yet downloaded; guarded by dedup_lock
+        self.reserved_urls: Set[str] = set()
+        self.dedup_lock = threading.Lock()
+        
+        # ETag/Last-Modified/hash of fetched sources until their frame is committed
+        self.source_info: Dict[str, Dict] = {}
+        
+        # Token bucket pacing the Custom Search API (replaces fixed sleeps)
+        self.search_limiter = TokenBucket(search_rate, search_burst)
+        self.api_calls = 0
+        
+        # Ranks candidates for each frame within a per-frame search budget
+        self.candidates_per_frame = max(1, candidates_per_frame)
+        self.scorer = CandidateScorer()
+        self.query_planner = QueryPlanner(
+            self.search_google_images, self.scorer.score_batch,
+            max_calls_per_frame=search_budget, target_candidates=self.candidates_per_frame
+        )
+        
+        # Daily search quota, shared by every shard of base_path; None when not calling the API
+        self.quota: Optional[QuotaLedger] = None
+        if daily_quota > 0 and self.google_api_key and not cache_only:
+            self.quota = QuotaLedger(os.path.join(state_dir or default_state_dir, 'quota.sqlite'),
+                                     self.google_api_key, daily_quota)
+        self.deferred_relpaths: List[str] = []
+        # Relpath -> quota reservation start_frame took for the frame until it is planned
+        self.quota_reservations: Dict[str, int] = {}
+        
+        # Hedged downloads race up to `hedge` ranked candidates per frame (1 = one at a time)
+        self.hedge = max(1, hedge)
+        self.hedge_delay = hedge_delay
+        self.hedged_download: Optional[HedgedDownload] = None
+        if self.hedge > 1:
+            executor = ThreadPoolExecutor(max_workers=self.concurrency * self.hedge,
+                                          thread_name_prefix='glasses-hedge')
+            self.hedged_download = HedgedDownload(self, executor, self.hedge, hedge_delay)
+        
+        # Persistent search cache; cache_only replays stored results without API calls
+        self.cache_only = cache_only
+        self.search_cache: Optional[SearchCache] = None
+        if use_cache or cache_only:
+            self.search_cache = SearchCache(
+                os.path.join(self.state_dir, 'search_cache.sqlite'),
+                ttl_seconds=cache_ttl_hours * 3600,
+                max_entries=cache_size
+            )
+            if cache_only and not self.google_cse_id:
+                # Cache keys include the engine id; replay the engine the cache was filled with
+                self.google_cse_id = self.search_cache.last_engine()
         
         # Face shapes to process
-        self.face_shapes = ['oval', 'round', 'square', 'heart', 'diamond', 'triangle']
+        self.face_shapes = list(FACE_SHAPES)
         
         # Enhanced search queries for Google Images with Creative Commons focus
         self.search_queries = {
@@ -241,8 +528,23 @@ class GoogleImagesGlassesDownloader:
             }
         }
         
+        # An external catalog replaces the built-in one
+        if catalog is not None:
+            self.search_queries = catalog
+            self.face_shapes = list(catalog)
+        
         # Create directories
         self.create_directories()
+        
+        # Perceptual-hash index of every frame already on disk
+        self.hash_index = PerceptualHashIndex(
+            os.path.join(self.state_dir, 'phash_index.json'),
+            max_distance=dedup_distance
+        )
+        hashed = self.hash_index.seed_from_directory(self.base_path, self.face_shapes)
+        if hashed:
+            print(f"🔎 Indexed {hashed} existing frame images for duplicate detection")
+            self.hash_index.save()
 
     def create_directories(self):
         """Create directories for each face shape"""
@@ -252,31 +554,39 @@ class GoogleImagesGlassesDownloader:
                 os.makedirs(face_shape_path)
                 print(f"Created directory: {face_shape_path}")
 
-    def search_google_images(self, query: str, num_results: int = 10) -> List[Dict]:
+    def search_google_images(self, query: str, num_results: int = 10, start: int = 1) -> List[Dict]:
         """Search Google Images using Custom Search API with Creative Commons filter"""
-        if not self.google_api_key or not self.google_cse_id:
+        if not self.cache_only and (not self.google_api_key or not self.google_cse_id):
             print("⚠️  Google API credentials not found")
             return []
         
-        url = "https://www.googleapis.com/customsearch/v1"
-        params = {
-            'key': self.google_api_key,
-            'cx': self.google_cse_id,
-            'q': query,
-            'searchType': 'image',
-            'num': min(num_results, 10),  # Max 10 per request
-            'imgSize': 'large',
-            'imgType': 'photo',
-            'safe': 'active',
-            'rights': 'cc_publicdomain,cc_attribute,cc_sharealike,cc_noncommercial,cc_nonderived',  # Creative Commons
-            'fileType': 'jpg,png',
-            'imgColorType': 'color'
-        }
+        url = self.search_endpoint
+        params = self.search_params(query, num_results, start)
+        
+        num_requested = params['num']
+        cache_key = None
+        if self.search_cache is not None:
+            cache_key = SearchCache.make_key(query, params)
+            cached = self.search_cache.get(cache_key, num_requested, allow_stale=self.cache_only)
+            self.metrics.incr('search_cache', result='miss' if cached is None else 'hit')
+            if cached is not None:
+                return cached
+            if self.cache_only:
+                print(f"⚠️  No cached results for: {query}")
+                return []
         
         try:
-            response = self.session.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
+            self.search_limiter.acquire()
+            with self.metrics.timer('search'):
+                # A daily-quota 429 is final: retrying would only spend more calls on a spent quota
+                response = self.session.get(url, params=params, timeout=self.request_timeout,
+                                            final_statuses=(429,), on_attempt=self.record_search_call)
+                if response.status_code == 429 and not is_daily_limit_response(response):
+                    # A per-minute rate limit: retry with the session's usual backoff
+                    response = self.session.get(url, params=params, timeout=self.request_timeout,
+                                                on_attempt=self.record_search_call)
+                response.raise_for_status()
+                data = response.json()
             
             # Extract image results
             items = data.get('items', [])
@@ -293,226 +603,606 @@ class GoogleImagesGlassesDownloader:
                 }
                 results.append(result)
             
+            if cache_key is not None:
+                self.search_cache.put(cache_key, query, num_requested, results, engine=params['cx'])
+            
             return results
             
         except requests.RequestException as e:
+            response = getattr(e, 'response', None)
+            if self.quota is not None and response is not None and is_daily_limit_response(response):
+                # Out of quota despite the ledger (e.g. calls made elsewhere): stop for today
+                self.quota.mark_exhausted()
+            status = response.status_code if response is not None else type(e).__name__
+            self.metrics.incr('search_errors', status=str(status))
             print(f"Error searching Google Images: {e}")
             return []
         except Exception as e:
             print(f"Error parsing Google Images response: {e}")
             return []
 
-    def calculate_image_hash(self, image_data: bytes) -> str:
-        """Calculate a hash of the image data to detect duplicates"""
-        return hashlib.md5(image_data).hexdigest()
+    def record_search_call(self):
+        """Count one request sent to the search endpoint, retries included; each is billed"""
+        with self.dedup_lock:
+            self.api_calls += 1
+        if self.quota is not None:
+            self.quota.record_call()
+        self.metrics.incr('api_calls')
+    
+    def search_params(self, query: str, num_results: int = 10, start: int = 1) -> Dict:
+        """Custom Search API params for an image query"""
+        params = {
+            'key': self.google_api_key,
+            'cx': self.google_cse_id,
+            'q': query,
+            'searchType': 'image',
+            'num': min(num_results, 10),  # Max 10 per request
+            'imgSize': 'large',
+            'imgType': 'photo',
+            'safe': 'active',
+            'rights': 'cc_publicdomain,cc_attribute,cc_sharealike,cc_noncommercial,cc_nonderived',  # Creative Commons
+            'fileType': 'jpg,png',
+            'imgColorType': 'color'
+        }
+        if start > 1:
+            params['start'] = start  # 1-based index of the first result, for paging
+        return params
+
+    def calculate_image_hash(self, image) -> str:
+        """Calculate a perceptual hash of an image (bytes or PIL image) to detect near-duplicates"""
+        return self.hash_index.format_hash(perceptual_hash(image, self.hash_index.hash_size))
+
+    def frame_relpath(self, filepath: str) -> str:
+        """Path of a frame file relative to base_path, as stored in the hash index and manifest"""
+        return os.path.relpath(filepath, self.base_path).replace(os.sep, '/')
+
+    @staticmethod
+    def split_relpath(relpath: str) -> Tuple[str, str]:
+        """Split 'oval/aviator-gold3.jpg' into ('oval', 'aviator-gold3')"""
+        face_shape, filename = relpath.split('/', 1)
+        return face_shape, os.path.splitext(filename)[0]
 
     def is_suitable_image(self, result: Dict) -> bool:
         """Enhanced filtering to determine if an image is suitable"""
-        title = result.get('title', '').lower()
-        snippet = result.get('snippet', '').lower()
-        display_link = result.get('displayLink', '').lower()
+        return self.score_image_result(result) > 0
+
+    def score_image_result(self, result: Dict) -> float:
+        """Score a search result: positive when suitable, negative when it shows people"""
+        return self.scorer.score(result)
+
+    def reserve_url(self, url: str) -> bool:
+        """Atomically reserve a candidate URL so concurrent frames never pick the same one"""
+        with self.dedup_lock:
+            if url in self.downloaded_urls or url in self.bad_urls or url in self.reserved_urls:
+                return False
+            self.reserved_urls.add(url)
+            return True
+
+    def release_url(self, url: str):
+        """Release a URL reservation once its download has finished or failed"""
+        with self.dedup_lock:
+            self.reserved_urls.discard(url)
+            self.source_info.pop(url, None)
+
+    def remember_source(self, url: str, source: Dict):
+        """Keep a fetched source's validators for the manifest entry written on commit"""
+        with self.dedup_lock:
+            self.source_info[url] = source
+
+    def claim_download(self, url: str, image_hash: str, relpath: str) -> bool:
+        """Atomically record a URL and image hash, refusing duplicates and near-duplicates"""
+        with self.dedup_lock:
+            if url in self.downloaded_urls or self.hash_index.find_duplicate(image_hash):
+                return False
+            self.downloaded_urls.add(url)
+            self.hash_index.add(image_hash, relpath)
+            return True
+
+    def unclaim_download(self, url: str, relpath: str):
+        """Roll back a claim when the image could not be written"""
+        with self.dedup_lock:
+            self.downloaded_urls.discard(url)
+            self.hash_index.remove(relpath)
+
+    def reject_url(self, url: str, relpath: str, reason: str, permanent: bool = True):
+        """Record a failed URL; permanently failing URLs are never fetched again"""
+        self.metrics.incr('rejects', reason=reason_label(reason))
+        if self.manifest.record_url_failure(url, relpath, reason, permanent):
+            with self.dedup_lock:
+                self.bad_urls.add(url)
+
+    def fetch_image(self, url: str, cancelled: Optional[threading.Event] = None) -> Image.Image:
+        """Fetch a URL and open it as an image, raising FetchRejected for unusable responses"""
+        if self.fetch_mode == 'streaming':
+            with self.metrics.timer('fetch'):
+                fetched = fetch_image_streaming(
+                    self.session, url, IMAGE_REQUEST_HEADERS, timeout=self.request_timeout,
+                    max_bytes=self.max_image_bytes, memory_limit=self.fetch_memory_limit,
+                    cancelled=cancelled
+                )
+            self.metrics.incr('bytes_fetched', fetched.byte_count)
+            self.remember_source(url, fetched.source)
+            try:
+                with self.metrics.timer('decode'):
+                    return open_for_processing(fetched.body, fast=self.resize_mode == 'fast',
+                                               product_check=self.product_check)
+            finally:
+                fetched.close()
         
-        # Combine all text for analysis
-        all_text = f"{title} {snippet}".lower()
+        # Buffered responses are always bytes
+        data = self.fetch_image_body(url)
+        with self.metrics.timer('decode'):
+            return open_for_processing(io.BytesIO(data), fast=self.resize_mode == 'fast',
+                                       product_check=self.product_check)
+
+    def fetch_image_body(self, url: str) -> Union[bytes, str]:
+        """Fetch a URL's encoded image body for a render process, raising FetchRejected for unusable responses
         
-        # Positive indicators (product shots, eyewear)
-        positive_keywords = [
-            'glasses', 'eyeglasses', 'eyewear', 'spectacles', 'frames',
-            'product', 'isolated', 'white background', 'studio'
-        ]
+        Streamed bodies larger than --fetch-memory-mb are not read into memory:
+        they are copied to a temporary file and its path is returned instead;
+        the caller deletes it once the render is done.
+        """
+        with self.metrics.timer('fetch'):
+            if self.fetch_mode == 'streaming':
+                fetched = fetch_image_streaming(
+                    self.session, url, IMAGE_REQUEST_HEADERS, timeout=self.request_timeout,
+                    max_bytes=self.max_image_bytes, memory_limit=self.fetch_memory_limit
+                )
+                try:
+                    if fetched.byte_count <= self.fetch_memory_limit:
+                        data = fetched.body.read()
+                    else:
+                        with tempfile.NamedTemporaryFile(prefix='glasses-', suffix='.body', delete=False) as f:
+                            shutil.copyfileobj(fetched.body, f)
+                        data = f.name
+                finally:
+                    fetched.close()
+                byte_count = fetched.byte_count
+                source = fetched.source
+            else:
+                response = self.session.get(url, timeout=self.request_timeout, headers=IMAGE_REQUEST_HEADERS)
+                response.raise_for_status()
+                
+                # Check if response is actually an image
+                content_type = response.headers.get('content-type', '').lower()
+                if not any(img_type in content_type for img_type in ACCEPTED_CONTENT_TYPES):
+                    raise FetchRejected(f"content-type {content_type}", f"Not an image file: {content_type}")
+                data = response.content
+                byte_count = len(data)
+                source = source_validators(response, hashlib.sha256(data).hexdigest())
         
-        # Negative indicators (people, lifestyle shots)
-        negative_keywords = [
-            'person wearing', 'man wearing', 'woman wearing', 'people',
-            'portrait', 'face', 'model', 'human', 'wearing glasses',
-            'lifestyle', 'fashion model', 'person with glasses'
-        ]
+        self.metrics.incr('bytes_fetched', byte_count)
+        self.remember_source(url, source)
+        return data
+
+    def render_image(self, image: Image.Image) -> RenderedFrame:
+        """Validate, resize, hash and encode a fetched image"""
+        with self.metrics.profile('render'):
+            rendered = render_frame(image, self.resize_mode, self.encoder_options, self.hash_index.hash_size,
+                                    self.product_check)
+        self.record_render_timings(rendered)
+        return rendered
+
+    def record_render_timings(self, rendered: RenderedFrame):
+        """Report the decode/check/resize/hash/encode timings measured where the frame was rendered"""
+        for step, seconds in rendered.timings.items():
+            self.metrics.observe(step, seconds)
+
+    def commit_frame(self, url: str, filepath: str, rendered: RenderedFrame) -> bool:
+        """Dedup-check a rendered frame and write it, recording the output in the manifest"""
+        relpath = self.frame_relpath(filepath)
         
-        # Preferred domains (stock photo sites, eyewear retailers)
-        preferred_domains = [
-            'shutterstock', 'istockphoto', 'getty', 'alamy', 'dreamstime',
-            'warbyparker', 'zenni', 'eyebuydirect', 'lenscrafters',
-            'rayban', 'oakley', 'persol'
-        ]
+        # Perceptual hash to detect visual (near-)duplicates
+        duplicate = self.hash_index.find_duplicate(rendered.image_hash)
+        if duplicate:
+            self.metrics.incr('dedup_hits', kind='perceptual')
+            print(f"⚠️  Skipping visually duplicate image (matches {duplicate})")
+            self.reject_url(url, relpath, f"duplicate of {duplicate}")
+            return False
         
-        # Check for positive indicators
-        positive_score = sum(1 for keyword in positive_keywords if keyword in all_text)
+        # Record this download to prevent duplicates (atomic across engines)
+        if not self.claim_download(url, rendered.image_hash, relpath):
+            self.metrics.incr('dedup_hits', kind='claimed')
+            print("⚠️  Skipping duplicate image claimed by another frame")
+            return False
         
-        # Check for negative indicators
-        negative_score = sum(1 for keyword in negative_keywords if keyword in all_text)
+        # Write via a temp file so an interrupted write never looks like a finished frame
+        tmp_path = f"{filepath}.part"
+        try:
+            with self.metrics.timer('write'):
+                with open(tmp_path, 'wb') as f:
+                    f.write(rendered.data)
+                os.replace(tmp_path, filepath)
+        except Exception:
+            self.unclaim_download(url, relpath)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.hash_index.record_file(relpath, filepath)
+        face_shape, frame_type = self.split_relpath(relpath)
+        with self.dedup_lock:
+            source = self.source_info.pop(url, None)
+        self.manifest.record_output(relpath, face_shape, frame_type, url, rendered.image_hash, source,
+                                    hashlib.sha256(rendered.data).hexdigest())
+        with self.dedup_lock:
+            self.written_relpaths.append(relpath)
+        self.record_encode_savings(face_shape, rendered)
+        self.metrics.incr('frames_written')
         
-        # Bonus for preferred domains
-        domain_bonus = 1 if any(domain in display_link for domain in preferred_domains) else 0
+        return True
+
+    def replace_frame(self, url: str, filepath: str, rendered: RenderedFrame, source: Dict) -> bool:
+        """Overwrite an existing frame with the re-rendered new version of its source"""
+        relpath = self.frame_relpath(filepath)
+        with self.dedup_lock:
+            duplicate = self.hash_index.find_duplicate(rendered.image_hash, exclude=relpath)
+            if duplicate:
+                self.metrics.incr('dedup_hits', kind='perceptual')
+                print(f"⚠️  New version of {relpath} duplicates {duplicate}; keeping the old one")
+                return False
         
-        # Must have positive indicators, no negative indicators
-        return (positive_score + domain_bonus) > 0 and negative_score == 0
+        tmp_path = f"{filepath}.part"
+        try:
+            with self.metrics.timer('write'):
+                with open(tmp_path, 'wb') as f:
+                    f.write(rendered.data)
+                os.replace(tmp_path, filepath)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        face_shape, frame_type = self.split_relpath(relpath)
+        self.manifest.record_output(relpath, face_shape, frame_type, url, rendered.image_hash, source,
+                                    hashlib.sha256(rendered.data).hexdigest())
+        # Only swap the index entry (dropping the old hash) once the new file and its record are in place
+        with self.dedup_lock:
+            self.hash_index.add(rendered.image_hash, relpath)
+            self.written_relpaths.append(relpath)
+        self.hash_index.record_file(relpath, filepath)
+        self.record_encode_savings(face_shape, rendered)
+        self.metrics.incr('frames_written')
+        return True
+
+    def record_encode_savings(self, face_shape: str, rendered: RenderedFrame):
+        """Count the bytes a quality-targeted encode saved over the fixed quality"""
+        if rendered.baseline_bytes is None:
+            return
+        from quality_search import ShapeSavings
+        with self.dedup_lock:
+            savings = self.encode_savings.get(face_shape)
+            if savings is None:
+                savings = self.encode_savings[face_shape] = ShapeSavings()
+            savings.add(rendered.baseline_bytes, len(rendered.data), rendered.quality)
+        self.metrics.incr('encode_bytes_saved', rendered.baseline_bytes - len(rendered.data))
+
+    def print_encode_savings(self):
+        if self.encode_savings:
+            from quality_search import print_savings_report
+            print_savings_report(self.encode_savings, 'BYTES SAVED PER FACE SHAPE (vs. fixed quality)')
+
+    def handle_download_error(self, url: str, relpath: str, error: Exception):
+        """Report a failed download and record whether the URL is worth retrying"""
+        if isinstance(error, ImageRejected):
+            print(f"⚠️  {error}")
+            self.reject_url(url, relpath, error.reason)
+        elif isinstance(error, requests.HTTPError):
+            # 4xx responses other than timeouts/rate limits will not fix themselves
+            status = error.response.status_code if error.response is not None else 0
+            print(f"Error downloading {url}: {error}")
+            self.reject_url(url, relpath, f"http {status}",
+                            permanent=400 <= status < 500 and status not in (408, 429))
+        elif isinstance(error, HostUnavailable):
+            print(f"⏭️  {error}")
+            self.reject_url(url, relpath, 'host unavailable', permanent=False)
+        elif isinstance(error, requests.RequestException):
+            print(f"Error downloading {url}: {error}")
+            self.reject_url(url, relpath, type(error).__name__, permanent=False)
+        else:
+            print(f"Error downloading {url}: {error}")
+            self.reject_url(url, relpath, f"{type(error).__name__}: {error}")
 
     def download_image(self, url: str, filepath: str) -> bool:
         """Download an image from URL and save to filepath with duplicate detection"""
+        relpath = self.frame_relpath(filepath)
         try:
             # Skip if URL already downloaded
             if url in self.downloaded_urls:
-                print(f"⚠️  Skipping duplicate URL")
-                return False
-            
-            # Add headers to appear more like a browser
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8',
-                'Accept-Language': 'en-US,en;q=0.9',
-                'Accept-Encoding': 'gzip, deflate, br',
-                'DNT': '1',
-                'Connection': 'keep-alive',
-                'Upgrade-Insecure-Requests': '1'
-            }
-            
-            response = self.session.get(url, timeout=30, headers=headers)
-            response.raise_for_status()
-            
-            # Check if response is actually an image
-            content_type = response.headers.get('content-type', '').lower()
-            if not any(img_type in content_type for img_type in ['image/jpeg', 'image/jpg', 'image/png', 'image/webp']):
-                print(f"⚠️  Not an image file: {content_type}")
-                return False
-            
-            # Calculate hash to detect visual duplicates
-            image_hash = self.calculate_image_hash(response.content)
-            if image_hash in self.downloaded_hashes:
-                print(f"⚠️  Skipping visually duplicate image")
+                self.metrics.incr('dedup_hits', kind='url')
+                print("⚠️  Skipping duplicate URL")
                 return False
             
-            # Open and process image
-            image = Image.open(io.BytesIO(response.content))
-            
-            # Convert to RGB if necessary
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # Check minimum size requirements
-            if image.width < 200 or image.height < 200:
-                print(f"⚠️  Image too small: {image.width}x{image.height}")
-                return False
-            
-            # Resize to 800x800 while maintaining aspect ratio
-            image.thumbnail((800, 800), Image.Resampling.LANCZOS)
-            
-            # Create a white background and center the image
-            final_image = Image.new('RGB', (800, 800), 'white')
-            x = (800 - image.width) // 2
-            y = (800 - image.height) // 2
-            final_image.paste(image, (x, y))
-            
-            # Save as high-quality JPEG
-            final_image.save(filepath, 'JPEG', quality=95, optimize=True)
-            
-            # Record this download to prevent duplicates
-            self.downloaded_urls.add(url)
-            self.downloaded_hashes.add(image_hash)
-            
-            return True
+            image = self.fetch_image(url)
+            rendered = self.render_image(image)
+            return self.commit_frame(url, filepath, rendered)
             
         except Exception as e:
-            print(f"Error downloading {url}: {e}")
+            self.handle_download_error(url, relpath, e)
             return False
 
-    def find_best_image(self, face_shape: str, frame_type: str) -> Optional[str]:
-        """Find the best image for a given face shape and frame type"""
+    def is_url_available(self, url: str) -> bool:
+        return (url not in self.downloaded_urls and url not in self.bad_urls
+                and self.session.is_host_available(url))
+
+    def rank_candidates(self, face_shape: str, frame_type: str) -> List[Candidate]:
+        """Collect and rank candidate images for a frame within the per-frame search budget"""
         queries = self.search_queries[face_shape][frame_type]
+        try:
+            with self.metrics.timer('plan'):
+                plan = self.query_planner.plan(queries, self.is_url_available)
+        finally:
+            # Hand back the quota reserved by start_frame; the calls made are already counted
+            self.release_quota_reservation(f"{face_shape}/{frame_type}.jpg")
+        if self.quota is not None:
+            self.quota.record_frame(plan.search_calls)
+        self.manifest.add_candidates(f"{face_shape}/{frame_type}.jpg",
+                                     [candidate.url for candidate in plan.suitable])
+        return plan.candidates
+
+    def release_quota_reservation(self, relpath: str):
+        """Hand back the quota start_frame reserved for a frame, if it still holds any"""
+        if self.quota is None:
+            return
+        with self.dedup_lock:
+            reservation_id = self.quota_reservations.pop(relpath, None)
+        if reservation_id is not None:
+            self.quota.release(reservation_id)
+    
+    def reserve_next_candidate(self, candidates: List[Candidate]) -> Optional[str]:
+        """Take ranked candidates off the front of the list until one can be reserved"""
+        while candidates:
+            candidate = candidates.pop(0)
+            if self.is_url_available(candidate.url) and self.reserve_url(candidate.url):
+                if not candidate.suitable:
+                    print("🔄 No suitable results left, trying next available...")
+                return candidate.url
+        return None
+
+    def find_best_image(self, face_shape: str, frame_type: str) -> Optional[str]:
+        """Find the best image for a given face shape and frame type
         
-        for query in queries:
-            print(f"🔍 Searching Google Images: {query}")
-            
-            # Search Google Images with Creative Commons filter
-            results = self.search_google_images(query, num_results=10)
-            
-            # Filter and sort results
-            suitable_results = []
-            for result in results:
-                if self.is_suitable_image(result):
-                    url = result.get('url')
-                    if url and url not in self.downloaded_urls:
-                        suitable_results.append((result, url))
-            
-            # Try the most suitable results first
-            for result, url in suitable_results[:3]:  # Try top 3 suitable results
-                return url
-            
-            # Small delay between searches
-            time.sleep(1)
-        
-        # If no suitable results found, try with first available result
-        print("🔄 No suitable results found, trying first available...")
-        for query in queries:
-            results = self.search_google_images(query, num_results=5)
-            for result in results:
-                url = result.get('url')
-                if url and url not in self.downloaded_urls:
-                    return url
+        The returned URL is reserved; callers must release_url() it when done.
+        """
+        return self.reserve_next_candidate(self.rank_candidates(face_shape, frame_type))
+
+    def iter_frames(self) -> List[Tuple[str, str]]:
+        """List this run's (face_shape, frame_type) work items in catalog order"""
+        frames = [
+            (face_shape, frame_type)
+            for face_shape, frame_types in self.search_queries.items()
+            for frame_type in frame_types
+        ]
+        if self.shard:
+            frames = shard_frames(frames, self.shard)
+        return frames
+
+    def frame_filepath(self, face_shape: str, frame_type: str) -> str:
+        return os.path.join(self.base_path, face_shape, f"{frame_type}.jpg")
+
+    def is_search_cached(self, query: str, start: int = 1) -> bool:
+        """True if a page of a query would be answered by the search cache"""
+        if self.search_cache is None:
+            return False
+        params = self.search_params(query, PAGE_SIZE, start)
+        return self.search_cache.contains(SearchCache.make_key(query, params), params['num'])
+
+    def worst_case_search_calls(self, face_shape: str, frame_type: str) -> int:
+        """API calls a frame's plan can make at most: its budget, less pages the cache already holds"""
+        planner = self.query_planner
+        uncached = sum(1 for query in self.search_queries[face_shape][frame_type]
+                       for page in range(planner.max_pages)
+                       if not self.is_search_cached(query, page * PAGE_SIZE + 1))
+        return min(planner.max_calls_per_frame, uncached)
+
+    def schedule_frames(self, frames: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """Order work for the search quota: missing frames, then failed ones, cheapest first"""
+        statuses = self.manifest.frame_statuses()
+        mean_calls = self.quota.expected_calls_per_frame(default=self.query_planner.max_calls_per_frame)
+        items = []
+        for face_shape, frame_type in frames:
+            if os.path.exists(self.frame_filepath(face_shape, frame_type)):
+                items.append(WorkItem(face_shape, frame_type, PRIORITY_EXISTS, 0))
+                continue
+            priority = PRIORITY_RETRY if statuses.get(f"{face_shape}/{frame_type}.jpg") == FRAME_FAILED \
+                else PRIORITY_MISSING
+            # The planner usually stops after the first query, which may already be cached
+            cached = self.is_search_cached(self.search_queries[face_shape][frame_type][0])
+            items.append(WorkItem(face_shape, frame_type, priority, 0 if cached else mean_calls))
         
-        return None
+        scheduler = QuotaScheduler(self.quota)
+        items = scheduler.order(items)
+        estimate = scheduler.estimate(items)
+        print(f"📅 Search quota: {estimate['remaining']}/{self.quota.daily_limit} calls left today (UTC); "
+              f"{estimate['pending']} frames to do need ~{estimate['expected_calls']:.0f}, "
+              f"about {estimate['fits']} fit")
+        return [(item.face_shape, item.frame_type) for item in items]
+
+    def defer_frame(self, face_shape: str, frame_type: str):
+        """Postpone a frame that does not fit in today's search quota to the next run"""
+        relpath = f"{face_shape}/{frame_type}.jpg"
+        with self.dedup_lock:
+            first = not self.deferred_relpaths
+            self.deferred_relpaths.append(relpath)
+        if first:
+            print(f"⏸️  Daily search quota reached ({self.quota.used()}/{self.quota.daily_limit} calls); "
+                  f"deferring the remaining frames to the next run")
+        self.manifest.record_frame_deferred(relpath, face_shape, frame_type, 'search quota')
+        self.metrics.incr('frames', outcome='deferred')
+
+    def start_frame(self, face_shape: str, frame_type: str, index: int, total: int) -> bool:
+        """Report progress and record the attempt; returns False if the frame already exists
+        
+        With a search quota, the frame's worst-case search calls (see
+        worst_case_search_calls) are reserved until rank_candidates() returns;
+        QuotaExhausted is raised (and the frame deferred) when they do not fit.
+        """
+        filename = f"{frame_type}.jpg"
+        
+        # Skip if file already exists
+        if os.path.exists(self.frame_filepath(face_shape, frame_type)):
+            print(f"✅ {index}/{total} - Skipping {face_shape}/{filename} (already exists)")
+            return False
+        
+        if self.quota is not None:
+            calls = self.worst_case_search_calls(face_shape, frame_type)
+            if calls:
+                reservation_id = self.quota.admit(calls)
+                if reservation_id is None:
+                    self.defer_frame(face_shape, frame_type)
+                    raise QuotaExhausted(f"{face_shape}/{filename}")
+                with self.dedup_lock:
+                    self.quota_reservations[f"{face_shape}/{filename}"] = reservation_id
+        
+        print(f"⬇️  {index}/{total} - Downloading {face_shape}/{filename}...")
+        self.manifest.record_attempt(f"{face_shape}/{filename}", face_shape, frame_type)
+        return True
+
+    def finish_frame(self, face_shape: str, frame_type: str, image_url: Optional[str], success: bool) -> bool:
+        """Release the frame's URL reservation and report/record the outcome"""
+        filename = f"{frame_type}.jpg"
+        relpath = f"{face_shape}/{filename}"
+        
+        if not image_url:
+            self.metrics.incr('frames', outcome='no candidate')
+            print(f"❌ No suitable image found for {relpath}")
+            self.manifest.record_frame_failure(relpath, face_shape, frame_type, 'no suitable image')
+            return False
+        
+        self.release_url(image_url)
+        self.metrics.incr('frames', outcome='done' if success else 'failed')
+        if success:
+            print(f"✅ Successfully downloaded {relpath}")
+        else:
+            print(f"❌ Failed to download {relpath}")
+            self.manifest.record_frame_failure(relpath, face_shape, frame_type, f"download failed: {image_url}")
+        return success
+
+    def download_frame(self, face_shape: str, frame_type: str, index: int, total: int) -> bool:
+        """Find and download a single frame image, returning True if the file exists afterwards"""
+        try:
+            if not self.start_frame(face_shape, frame_type, index, total):
+                return True
+        except QuotaExhausted:
+            return False
+        
+        # Try the best ranked candidates in order until one downloads
+        with self.metrics.timer('frame', item=f"{face_shape}/{frame_type}.jpg"):
+            candidates = self.rank_candidates(face_shape, frame_type)
+            filepath = self.frame_filepath(face_shape, frame_type)
+            image_url = None
+            success = False
+            try:
+                if self.hedged_download is not None:
+                    success, image_url = self.hedged_download.run(candidates, filepath)
+                else:
+                    for attempt in range(self.candidates_per_frame):
+                        image_url = self.reserve_next_candidate(candidates)
+                        if not image_url:
+                            break
+                        if attempt:
+                            print(f"🔁 Trying candidate {attempt + 1}/{self.candidates_per_frame}")
+                        success = self.download_image(image_url, filepath)
+                        if success:
+                            break
+                        self.release_url(image_url)
+            finally:
+                self.finish_frame(face_shape, frame_type, image_url, success)
+        return success
 
-    def download_all_images(self):
+    def download_all_images(self, engine: str = 'serial', render_workers: Optional[int] = None):
         """Download all images for all face shapes and frame types"""
-        total_images = sum(len(frames) for frames in self.search_queries.values())
-        current_count = 0
-        successful_downloads = 0
+        frames = self.iter_frames()
+        total_images = len(frames)
+        if self.quota is not None:
+            frames = self.schedule_frames(frames)
         
-        print(f"🚀 Starting download of {total_images} images...")
+        print(f"🚀 Starting download of {total_images} images ({engine} engine)...")
         print("📁 Saving to:", self.base_path)
         
-        for face_shape, frame_types in self.search_queries.items():
-            print(f"\n📂 Processing {face_shape.upper()} face shape...")
-            
-            for frame_type, queries in frame_types.items():
-                current_count += 1
-                filename = f"{frame_type}.jpg"
-                filepath = os.path.join(self.base_path, face_shape, filename)
-                
-                # Skip if file already exists
-                if os.path.exists(filepath):
-                    print(f"✅ {current_count}/{total_images} - Skipping {filename} (already exists)")
+        if engine == 'async':
+            from async_engine import AsyncDownloadEngine
+            successful_downloads = AsyncDownloadEngine(self, self.concurrency).run(frames)
+        elif engine == 'pipeline':
+            from pipeline import DownloadPipeline
+            if self.hedge > 1:
+                print("ℹ️  --hedge applies to the serial and async engines; "
+                      "the pipeline tries candidates one at a time")
+            successful_downloads = DownloadPipeline(self, render_workers=render_workers).run(frames)
+        elif engine == 'serial':
+            successful_downloads = 0
+            current_shape = None
+            for index, (face_shape, frame_type) in enumerate(frames, start=1):
+                if face_shape != current_shape:
+                    current_shape = face_shape
+                    print(f"\n📂 Processing {face_shape.upper()} face shape...")
+                if self.download_frame(face_shape, frame_type, index, total_images):
                     successful_downloads += 1
-                    continue
-                
-                print(f"⬇️  {current_count}/{total_images} - Downloading {filename}...")
-                
-                # Find and download the best image
-                image_url = self.find_best_image(face_shape, frame_type)
-                
-                if image_url:
-                    success = self.download_image(image_url, filepath)
-                    if success:
-                        print(f"✅ Successfully downloaded {filename}")
-                        successful_downloads += 1
-                    else:
-                        print(f"❌ Failed to download {filename}")
-                else:
-                    print(f"❌ No suitable image found for {filename}")
-                
-                # Rate limiting - be respectful to Google API
-                time.sleep(2)  # Longer delay for Google API
+        else:
+            raise ValueError(f"Unknown download engine: {engine}")
         
-        print(f"\n🎉 Download process completed!")
+        if self.hedged_download is not None:
+            self.hedged_download.drain()
+        self.hash_index.save()
+        
+        self.build_assets()
+        
+        print("\n🎉 Download process completed!")
         print(f"📊 Successfully downloaded: {successful_downloads}/{total_images} images")
+        manifest_summary = self.manifest.summary()
+        print(f"🗂️  Manifest: {manifest_summary.get(FRAME_DONE, 0)} frames done, "
+              f"{manifest_summary['bad_urls']} known-bad URLs skipped on future runs")
+        print(f"🔍 Search API calls: {self.api_calls}")
+        if self.quota is not None:
+            print(f"📅 Search quota used today (UTC): {self.quota.used()}/{self.quota.daily_limit}")
+        if self.deferred_relpaths:
+            print(f"⏸️  {len(self.deferred_relpaths)} frames deferred until the quota resets; "
+                  f"run again after 00:00 UTC to continue")
+        if self.search_cache is not None:
+            print(f"🗄️  Search cache: {self.search_cache.hits} hits, {self.search_cache.misses} misses")
+        self.print_encode_savings()
+        for host in sorted(self.session.open_hosts()):
+            print(f"⛔ Skipped failing host: {host}")
+        self.metrics.print_report()
+        self.metrics.close()
         self.print_summary()
 
+    def build_assets(self):
+        """Run the optional frontend build stages for frames written during this run"""
+        if self.derivatives and self.written_relpaths:
+            from derivatives import DerivativeGenerator
+            DerivativeGenerator(self.base_path, self.face_shapes).build(self.written_relpaths)
+        if self.sprites:
+            from sprites import SpriteAtlasBuilder
+            SpriteAtlasBuilder(self.base_path, self.search_queries).build()
+
+    def encoder_description(self) -> str:
+        """The configured JPEG encoding, as the summary describes it"""
+        options = {**DEFAULT_ENCODER_OPTIONS, **self.encoder_options}
+        if not options.get('target_ssim'):
+            return f"{options['quality']}% JPEG quality"
+        from quality_search import DEFAULT_MIN_QUALITY
+        min_quality = options.get('min_quality') or DEFAULT_MIN_QUALITY
+        return (f"JPEG quality {min_quality}-{options['quality']}% "
+                f"targeting SSIM {options['target_ssim']}")
+    
     def print_summary(self):
         """Print a summary of downloaded images"""
         print("\n📊 DOWNLOAD SUMMARY")
         print("=" * 50)
         
+        # Count this run's catalog (and shard) rather than every file on disk
+        frames = self.iter_frames()
         total_downloaded = 0
         for face_shape in self.face_shapes:
-            face_shape_path = os.path.join(self.base_path, face_shape)
-            if os.path.exists(face_shape_path):
-                files = [f for f in os.listdir(face_shape_path) if f.endswith('3.jpg')]
-                count = len(files)
-                total_downloaded += count
-                print(f"{face_shape.capitalize()}: {count}/6 images")
+            expected = [frame_type for shape, frame_type in frames if shape == face_shape]
+            if not expected:
+                continue
+            count = sum(1 for frame_type in expected if os.path.exists(self.frame_filepath(face_shape, frame_type)))
+            total_downloaded += count
+            print(f"{face_shape.capitalize()}: {count}/{len(expected)} images")
         
-        print(f"\nTotal: {total_downloaded}/36 images downloaded")
+        print(f"\nTotal: {total_downloaded}/{len(frames)} images downloaded")
         
-        if total_downloaded < 36:
+        if total_downloaded < len(frames):
             print("\n💡 NEXT STEPS:")
             print("1. Check your Google API credentials")
             print("2. Verify your Custom Search Engine settings")
@@ -523,11 +1213,122 @@ class GoogleImagesGlassesDownloader:
             print("   • Product photography focus")
             print("   • White backgrounds preferred")
             print("   • No duplicate images")
-            print("   • 800x800 resolution, 95% JPEG quality")
+            print(f"   • {FRAME_SIZE}x{FRAME_SIZE} resolution, {self.encoder_description()}")
             print("   • Proper licensing for commercial use")
 
+def build_arg_parser() -> argparse.ArgumentParser:
+    """Command-line options for the downloader"""
+    parser = argparse.ArgumentParser(description='Download Creative Commons glasses images')
+    parser.add_argument('command', nargs='?',
+                        choices=['download', 'merge', 'refresh', 'audit', 'ingest', 'reencode'],
+                        default='download',
+                        help='download frames (default), merge shard state into .downloader/, '
+                             'revalidate existing frames against their sources, '
+                             'check the frame files for corruption and drift, '
+                             'render frames from a local image dump, '
+                             'or shrink existing frames to the lowest quality meeting --target-ssim')
+    parser.add_argument('--source', default=None, metavar='PATH',
+                        help='ingest: directory, tar or zip of images (- reads a tar stream from stdin)')
+    parser.add_argument('--mapping', default=None, metavar='PATH',
+                        help='ingest: JSON object of member paths or glob patterns to <shape>/<frame type>')
+    parser.add_argument('--record-hashes', action='store_true',
+                        help='audit: store file hashes for valid frames written before they were recorded')
+    parser.add_argument('--refresh-method', choices=['get', 'head'], default='get',
+                        help='refresh with conditional GETs, or try HEAD first for hosts that ignore them')
+    parser.add_argument('--engine', choices=['serial', 'async', 'pipeline'], default='serial',
+                        help='serial processes one frame at a time, async runs frames concurrently, '
+                             'pipeline runs search/fetch/render/write as separate stages')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='maximum frames processed at once by the async engine')
+    parser.add_argument('--render-workers', type=int, default=None,
+                        help='decode/encode processes for the pipeline engine, ingest and reencode '
+                             '(default: CPU count)')
+    parser.add_argument('--search-rate', type=float, default=1.0,
+                        help='Custom Search API queries per second (0 disables pacing)')
+    parser.add_argument('--search-burst', type=int, default=1,
+                        help='Custom Search API queries allowed in a burst')
+    parser.add_argument('--cache-ttl', type=float, default=168,
+                        help='hours before cached search results expire (0 never expires)')
+    parser.add_argument('--cache-size', type=int, default=5000,
+                        help='maximum cached searches kept (least recently used evicted first)')
+    parser.add_argument('--cache-only', action='store_true',
+                        help='replay searches from the cache without any API calls')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='always query the API and do not store results')
+    parser.add_argument('--dedup-distance', type=int, default=10,
+                        help='maximum perceptual-hash bit difference treated as a duplicate')
+    parser.add_argument('--fetch-mode', choices=['streaming', 'buffered'], default='streaming',
+                        help='stream image bodies with early rejection, or buffer whole responses')
+    parser.add_argument('--fetch-memory-mb', type=float, default=8,
+                        help='in-memory buffer per worker before streamed bodies spill to disk')
+    parser.add_argument('--max-image-mb', type=float, default=25,
+                        help='reject images larger than this')
+    parser.add_argument('--max-retries', type=int, default=3,
+                        help='retries for 429/5xx responses, timeouts and connection errors')
+    parser.add_argument('--host-failures', type=int, default=5,
+                        help='consecutive failures before a host is skipped')
+    parser.add_argument('--host-cooldown', type=float, default=60,
+                        help='seconds a failing host is skipped before it is probed again')
+    parser.add_argument('--connect-timeout', type=float, default=5,
+                        help='seconds to wait for a connection')
+    parser.add_argument('--read-timeout', type=float, default=30,
+                        help='seconds to wait between bytes of a response')
+    parser.add_argument('--resize-mode', choices=['fast', 'legacy'], default='fast',
+                        help='fast decodes JPEGs near the target size, legacy decodes at full resolution')
+    parser.add_argument('--no-product-check', action='store_true',
+                        help='accept images without a white background and skip the auto-crop')
+    parser.add_argument('--jpeg-quality', type=int, default=95,
+                        help='JPEG quality for saved frames')
+    parser.add_argument('--no-optimize', action='store_true',
+                        help='skip the extra JPEG Huffman optimization pass')
+    parser.add_argument('--progressive', action='store_true',
+                        help='save progressive JPEGs')
+    parser.add_argument('--target-ssim', type=float, nargs='?', const=DEFAULT_TARGET_SSIM, default=None,
+                        metavar='SSIM',
+                        help=f'search each frame\'s JPEG quality for the smallest file whose SSIM against '
+                             f'the master meets this (default when given: {DEFAULT_TARGET_SSIM})')
+    parser.add_argument('--min-quality', type=int, default=DEFAULT_MIN_QUALITY,
+                        help='lowest JPEG quality --target-ssim may choose')
+    parser.add_argument('--search-budget', type=int, default=3,
+                        help='maximum searches per frame')
+    parser.add_argument('--candidates-per-frame', type=int, default=3,
+                        help='ranked candidates to collect and try per frame')
+    parser.add_argument('--daily-quota', type=int, default=DEFAULT_DAILY_LIMIT,
+                        help='Custom Search API calls allowed per key per UTC day (0 disables tracking)')
+    parser.add_argument('--hedge', type=int, default=1, metavar='K',
+                        help='fetch up to K ranked candidates per frame concurrently and keep the first valid one')
+    parser.add_argument('--hedge-delay', type=float, default=0.5,
+                        help='seconds without a usable result before the next hedged candidate starts')
+    parser.add_argument('--sprites', action='store_true',
+                        help='rebuild per-face-shape sprite atlases whose frames changed')
+    parser.add_argument('--derivatives', action='store_true',
+                        help='render responsive WebP/AVIF derivatives for newly downloaded frames')
+    parser.add_argument('--metrics-log', default=None, metavar='PATH',
+                        help='append per-stage timing and counter events to a JSON-lines file')
+    parser.add_argument('--metrics-prom', default=None, metavar='PATH',
+                        help='write run totals to a Prometheus text-format file')
+    parser.add_argument('--profile', action='store_true',
+                        help='profile each stage with cProfile, stack sampling and tracemalloc')
+    parser.add_argument('--profile-dir', default=None, metavar='DIR',
+                        help='where --profile writes its per-run reports (default: .downloader/profiles/)')
+    parser.add_argument('--profile-top', type=int, default=10,
+                        help='slowest frames and top allocation sites listed by --profile')
+    parser.add_argument('--catalog', default=None, metavar='PATH',
+                        help='JSON catalog of face shapes, frame types and queries (default: built-in)')
+    parser.add_argument('--export-catalog', default=None, metavar='PATH',
+                        help='write the catalog in use to a JSON file and exit')
+    parser.add_argument('--shard', type=parse_shard, default=None, metavar='I/N',
+                        help='only process work items in shard I of N (stable hash; 0 <= I < N)')
+    parser.add_argument('--merge-from', nargs='+', default=None, metavar='DIR',
+                        help='shard state directories to merge (default: all under .downloader/shards/)')
+    parser.add_argument('--yes', '-y', action='store_true',
+                        help='skip interactive confirmations')
+    return parser
+
 def main():
     """Main function to run the Google Images downloader"""
+    args = build_arg_parser().parse_args()
+    
     print("🔍 Google Images Glasses Downloader v3.0 (Creative Commons)")
     print("=" * 65)
     print("🎯 Features:")
@@ -544,17 +1345,48 @@ def main():
     if not base_path.endswith('frames'):
         print("⚠️  Warning: You should run this script from the /frames directory")
         print(f"Current directory: {base_path}")
-        response = input("Continue anyway? (y/n): ")
+        response = 'y' if args.yes else input("Continue anyway? (y/n): ")
         if response.lower() != 'y':
             return
     
     print(f"📁 Working directory: {base_path}")
     
+    if args.command == 'merge':
+        state_dir = os.path.join(base_path, '.downloader')
+        shard_dirs = args.merge_from or find_shard_dirs(state_dir)
+        if not shard_dirs:
+            print("❌ No shard state found under .downloader/shards/")
+            return
+        report = merge_shard_state(state_dir, shard_dirs, base_path, args.dedup_distance)
+        print_merge_report(report)
+        return
+    
+    catalog = None
+    if args.catalog:
+        try:
+            catalog = load_catalog(args.catalog)
+        except (OSError, ValueError) as e:
+            print(f"❌ Could not load catalog {args.catalog}: {e}")
+            return
+    
+    if args.command == 'audit':
+        from audit import FrameAuditor, audit_failed, print_audit_report
+        state_dir = os.path.join(base_path, '.downloader')
+        face_shapes = list(catalog) if catalog else FACE_SHAPES
+        report = FrameAuditor(base_path, state_dir, face_shapes, workers=args.concurrency).run(args.record_hashes)
+        print_audit_report(report)
+        if audit_failed(report):
+            raise SystemExit(1)
+        return
+    
     # Check for API credentials
     google_api_key = os.getenv('GOOGLE_API_KEY')
     google_cse_id = os.getenv('GOOGLE_CSE_ID')
     
-    if not google_api_key or not google_cse_id:
+    if args.cache_only:
+        print("🗄️  Cache-only mode: searches replayed from the local cache")
+    elif (not args.export_catalog and args.command not in ('refresh', 'ingest', 'reencode')
+          and (not google_api_key or not google_cse_id)):
         print("\n❌ Google API credentials not found!")
         print("\n🔑 Setup Instructions:")
         print("1. Create a Custom Search Engine: https://cse.google.com/cse/")
@@ -567,19 +1399,103 @@ def main():
         print("\n💡 Google Custom Search provides 100 free queries per day")
         return
     
-    print("✅ Google API key found")
-    print("✅ Google CSE ID found")
+    elif google_api_key and google_cse_id:
+        print("✅ Google API key found")
+        print("✅ Google CSE ID found")
+    
+    encoder_options = {
+        'quality': args.jpeg_quality,
+        'optimize': not args.no_optimize,
+        'progressive': args.progressive
+    }
+    if args.target_ssim:
+        encoder_options.update(target_ssim=args.target_ssim, min_quality=args.min_quality)
     
     # Create downloader instance and start downloading
-    downloader = GoogleImagesGlassesDownloader(base_path)
+    downloader = GoogleImagesGlassesDownloader(
+        base_path,
+        concurrency=args.concurrency,
+        search_rate=args.search_rate,
+        search_burst=args.search_burst,
+        use_cache=not args.no_cache,
+        cache_ttl_hours=args.cache_ttl,
+        cache_size=args.cache_size,
+        cache_only=args.cache_only,
+        dedup_distance=args.dedup_distance,
+        fetch_mode=args.fetch_mode,
+        fetch_memory_mb=args.fetch_memory_mb,
+        max_image_mb=args.max_image_mb,
+        max_retries=args.max_retries,
+        host_failures=args.host_failures,
+        host_cooldown=args.host_cooldown,
+        connect_timeout=args.connect_timeout,
+        read_timeout=args.read_timeout,
+        hedge=args.hedge,
+        hedge_delay=args.hedge_delay,
+        daily_quota=args.daily_quota,
+        resize_mode=args.resize_mode,
+        product_check=not args.no_product_check,
+        encoder_options=encoder_options,
+        derivatives=args.derivatives,
+        sprites=args.sprites,
+        search_budget=args.search_budget,
+        candidates_per_frame=args.candidates_per_frame,
+        metrics_log=args.metrics_log,
+        metrics_prom=args.metrics_prom,
+        profile=args.profile,
+        profile_dir=args.profile_dir,
+        profile_top=args.profile_top,
+        catalog=catalog,
+        shard=args.shard
+    )
+    
+    if args.export_catalog:
+        save_catalog(downloader.search_queries, args.export_catalog)
+        print(f"💾 Catalog written to {args.export_catalog}")
+        return
+    
+    if args.command == 'ingest':
+        from ingest import BulkIngester, IngestMapping, print_ingest_report
+        if not args.source or not args.mapping:
+            print("❌ ingest needs --source and --mapping")
+            return
+        try:
+            mapping = IngestMapping.load(args.mapping, downloader.face_shapes)
+        except (OSError, ValueError) as e:
+            print(f"❌ Could not load mapping {args.mapping}: {e}")
+            return
+        report = BulkIngester(downloader, mapping, workers=args.render_workers).run(args.source)
+        print_ingest_report(report)
+        downloader.print_encode_savings()
+        downloader.metrics.print_report()
+        downloader.metrics.close()
+        return
+    
+    if args.command == 'reencode':
+        from quality_search import FrameReencoder, print_reencode_report
+        reencoder = FrameReencoder(downloader, args.target_ssim or DEFAULT_TARGET_SSIM, args.min_quality,
+                                   workers=args.render_workers)
+        print_reencode_report(reencoder.run())
+        downloader.metrics.print_report()
+        downloader.metrics.close()
+        return
+    
+    if args.command == 'refresh':
+        from refresh import FrameRefresher
+        FrameRefresher(downloader, IMAGE_REQUEST_HEADERS, method=args.refresh_method).run()
+        return
     
-    print(f"\n🎯 Will download 36 glasses images (6 per face shape)")
+    frames = downloader.iter_frames()
+    if args.shard:
+        print(f"🧩 Shard {args.shard[0]}/{args.shard[1]}: {len(frames)} work items, "
+              f"state in {downloader.state_dir}")
+    print(f"\n🎯 Will download {len(frames)} glasses images across {len(downloader.face_shapes)} face shapes")
     print("📋 New filenames will have '3' suffix (Creative Commons)")
     print("⚖️  All images will be Creative Commons licensed")
-    response = input("Start Google Images download? (y/n): ")
+    response = 'y' if args.yes else input("Start Google Images download? (y/n): ")
     
     if response.lower() == 'y':
-        downloader.download_all_images()
+        downloader.download_all_images(engine=args.engine, render_workers=args.render_workers)
     else:
         print("❌ Download cancelled")
 
@@ -0,0 +1,124 @@
+"""
+Hedged candidate downloads for the glasses downloader.
+
+Without hedging a frame tries its ranked candidates one after another, so a
+slow or broken first candidate costs a full timeout before the next one is
+even requested. With --hedge K, up to K candidates are in flight at once:
+- the best candidate starts immediately; another one starts whenever
+  --hedge-delay seconds pass without a usable result, or right away when an
+  attempt fails
+- each attempt fetches and renders (validates) its image on a worker thread;
+  results are committed (dedup claim and write) one at a time on the frame's
+  thread, so the first valid, non-duplicate image wins
+- the remaining attempts are cancelled: queued ones never start and streamed
+  downloads stop at the next chunk
+- no more than --candidates-per-frame attempts are made per frame, as without
+  hedging
+
+K and the delay bound the extra bandwidth: a fast first candidate finishes
+before any hedge starts.
+"""
+
+import threading
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, wait
+from typing import Dict, List, Optional, Set, Tuple
+
+from image_processing import RenderedFrame
+from query_planner import Candidate
+from streaming_fetch import FetchCancelled
+
+
+class HedgedDownload:
+    """Race up to width ranked candidates for one frame and keep the first valid image"""
+
+    def __init__(self, downloader, executor: Executor, width: int = 2, delay: float = 0.5):
+        self.downloader = downloader
+        self.executor = executor
+        self.width = max(1, width)
+        self.delay = delay
+        # Attempts still running on the executor, including cancelled losers
+        self.outstanding: Set[Future] = set()
+        self.lock = threading.Lock()
+
+    def attempt(self, url: str, cancelled: threading.Event) -> RenderedFrame:
+        """Fetch and render one candidate, unless the frame was already won"""
+        if cancelled.is_set():
+            raise FetchCancelled(url)
+        image = self.downloader.fetch_image(url, cancelled)
+        if cancelled.is_set():
+            raise FetchCancelled(url)
+        return self.downloader.render_image(image)
+
+    def _forget(self, future: Future):
+        with self.lock:
+            self.outstanding.discard(future)
+
+    def drain(self):
+        """Wait for cancelled attempts that are still winding down"""
+        with self.lock:
+            outstanding = list(self.outstanding)
+        wait(outstanding)
+
+    def run(self, candidates: List[Candidate], filepath: str) -> Tuple[bool, Optional[str]]:
+        """Return (success, last URL tried); the URL is None if no candidate was available"""
+        downloader = self.downloader
+        relpath = downloader.frame_relpath(filepath)
+        budget = downloader.candidates_per_frame
+        cancelled = threading.Event()
+        in_flight: Dict[Future, str] = {}
+        launched = 0
+        last_url = None
+
+        def launch() -> bool:
+            nonlocal launched, last_url
+            if launched >= budget or len(in_flight) >= self.width:
+                return False
+            url = downloader.reserve_next_candidate(candidates)
+            if not url:
+                return False
+            if launched:
+                print(f"🔀 Hedging with candidate {launched + 1}/{budget}")
+                downloader.metrics.incr('hedges', event='started')
+            future = self.executor.submit(self.attempt, url, cancelled)
+            with self.lock:
+                self.outstanding.add(future)
+            future.add_done_callback(self._forget)
+            in_flight[future] = url
+            launched += 1
+            last_url = url
+            return True
+
+        try:
+            launch()
+            while in_flight:
+                can_hedge = launched < budget and len(in_flight) < self.width
+                done, _ = wait(list(in_flight), timeout=self.delay if can_hedge else None,
+                               return_when=FIRST_COMPLETED)
+                if not done:
+                    launch()
+                    continue
+
+                for future in done:
+                    url = in_flight.pop(future)
+                    try:
+                        rendered = future.result()
+                    except Exception as e:
+                        downloader.handle_download_error(url, relpath, e)
+                        downloader.release_url(url)
+                        continue
+                    if downloader.commit_frame(url, filepath, rendered):
+                        return True, url
+                    downloader.release_url(url)
+
+                # Replace every finished attempt that did not produce the frame
+                while launch():
+                    pass
+            return False, last_url
+        finally:
+            cancelled.set()
+            for future, url in in_flight.items():
+                downloader.metrics.incr('hedges', event='cancelled')
+                if future.cancel():
+                    downloader.release_url(url)
+                else:
+                    future.add_done_callback(lambda _, url=url: downloader.release_url(url))
@@ -0,0 +1,214 @@
+"""
+Host-aware HTTP session for the glasses downloader.
+
+Retailer and stock-photo hosts behave very differently, so every request goes
+through per-host state instead of one global policy:
+- connections are pooled per host (one urllib3 pool per host, up to
+  max_per_host connections each, for up to HOST_POOLS hosts)
+- each host has an AdaptiveLimit: it starts at a couple of concurrent requests,
+  grows by one per window of successes and halves on 429/503 or timeouts
+- 429 and 5xx responses, timeouts and connection errors are retried with
+  exponential backoff and full jitter; a Retry-After header is honored and
+  pauses every request to that host, not just the one that got it
+- a CircuitBreaker per host opens after consecutive failures (connection
+  errors and timeouts per attempt, 5xx once per request after its retries),
+  so requests to a dead host fail immediately with HostUnavailable instead of
+  each waiting for a timeout; after a cooldown a single probe decides whether
+  it closes again
+"""
+
+import email.utils
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+
+from metrics import Metrics
+from rate_limit import AdaptiveLimit, CircuitBreaker
+
+# Distinct hosts whose connection pools are kept open at the same time
+HOST_POOLS = 64
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_METHODS = ('GET', 'HEAD')
+THROTTLE_STATUSES = (429, 503)
+
+
+class HostUnavailable(requests.ConnectionError):
+    """Raised without sending a request while a host's circuit breaker is open"""
+
+
+def host_of(url: str) -> str:
+    """Host (and explicit port) a URL's requests are limited and pooled by"""
+    parts = urlsplit(url)
+    host = (parts.hostname or '').lower()
+    return f"{host}:{parts.port}" if parts.port else host
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class HostState:
+    """Concurrency limit and circuit breaker of a single host"""
+
+    def __init__(self, initial_limit: int, max_limit: int, failure_threshold: int, cooldown: float):
+        self.limit = AdaptiveLimit(initial_limit, max_limit)
+        self.breaker = CircuitBreaker(failure_threshold, cooldown)
+        self.requests = 0
+        self.retries = 0
+
+
+class HostAwareSession(requests.Session):
+    """requests.Session with per-host limits, retries with backoff and circuit breakers"""
+
+    def __init__(self, max_per_host: int = 8, initial_per_host: int = 2, max_retries: int = 3,
+                 backoff_base: float = 0.5, backoff_max: float = 30.0, max_retry_after: float = 60.0,
+                 failure_threshold: int = 5, cooldown: float = 60.0, metrics: Optional[Metrics] = None):
+        super().__init__()
+        self.max_per_host = max(1, max_per_host)
+        self.initial_per_host = initial_per_host
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retry_after = max_retry_after
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.metrics = metrics or Metrics()
+        self.hosts: Dict[str, HostState] = {}
+        self.hosts_lock = threading.Lock()
+
+        adapter = requests.adapters.HTTPAdapter(pool_connections=HOST_POOLS, pool_maxsize=self.max_per_host)
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+
+    def host_state(self, host: str) -> HostState:
+        with self.hosts_lock:
+            state = self.hosts.get(host)
+            if state is None:
+                state = HostState(self.initial_per_host, self.max_per_host,
+                                  self.failure_threshold, self.cooldown)
+                self.hosts[host] = state
+            return state
+
+    def is_host_available(self, url: str) -> bool:
+        """False while the URL's host has an open circuit"""
+        state = self.hosts.get(host_of(url))
+        return state is None or not state.breaker.is_open
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for the given retry attempt (0-based)"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def request(self, method, url, *args, final_statuses: Tuple[int, ...] = (),
+                on_attempt: Optional[Callable[[], None]] = None, **kwargs):
+        """Send a request with host limits and retries
+
+        final_statuses are returned without retrying; on_attempt is called
+        before every attempt actually sent, retries included.
+        """
+        host = host_of(url)
+        state = self.host_state(host)
+        max_retries = self.max_retries if method.upper() in RETRY_METHODS else 0
+        attempt = 0
+        while True:
+            if not state.breaker.allow():
+                self.metrics.incr('host_skips')
+                raise HostUnavailable(f"Skipping {host}: too many recent failures")
+
+            state.limit.acquire()
+            state.requests += 1
+            if on_attempt is not None:
+                on_attempt()
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                state.limit.release()
+                if isinstance(e, requests.Timeout):
+                    state.limit.record_throttle()
+                self.record_failure(host, state)
+                if attempt >= max_retries or state.breaker.is_open:
+                    raise
+                delay = self.backoff_delay(attempt)
+                reason = type(e).__name__
+            except BaseException:
+                # Not the host's fault (bad URL, interrupted run); just free the probe slot
+                state.limit.release()
+                state.breaker.abandon_probe()
+                raise
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    state.limit.record_success()
+                    state.breaker.record_success()
+                    return self.hold_slot(response, state, kwargs.get('stream', False))
+
+                retry_after = parse_retry_after(response.headers.get('retry-after'))
+                if response.status_code in THROTTLE_STATUSES:
+                    state.limit.record_throttle(min(retry_after or 0.0, self.max_retry_after))
+                give_up = (attempt >= max_retries or response.status_code in final_statuses
+                           or (retry_after is not None and retry_after > self.max_retry_after))
+                if response.status_code == 429:
+                    # Throttled but alive
+                    state.breaker.record_success()
+                elif give_up:
+                    # A 5xx is often one broken URL on a live host, so it counts once per
+                    # request rather than once per attempt like connection errors
+                    self.record_failure(host, state)
+                if give_up:
+                    return self.hold_slot(response, state, kwargs.get('stream', False))
+                response.close()
+                state.limit.release()
+                delay = retry_after if retry_after is not None else self.backoff_delay(attempt)
+                reason = str(response.status_code)
+
+            attempt += 1
+            state.retries += 1
+            self.metrics.incr('http_retries', reason=reason)
+            time.sleep(delay)
+
+    def record_failure(self, host: str, state: HostState):
+        if state.breaker.record_failure():
+            self.metrics.incr('circuit_opened')
+            print(f"⛔ {host} keeps failing; skipping it for {state.breaker.cooldown:.0f}s")
+
+    @staticmethod
+    def hold_slot(response: requests.Response, state: HostState, stream: bool) -> requests.Response:
+        """Release the host slot now, or when a streamed response is closed"""
+        if not stream:
+            state.limit.release()
+            return response
+
+        close = response.close
+        released = False
+
+        def close_and_release():
+            nonlocal released
+            try:
+                close()
+            finally:
+                if not released:
+                    released = True
+                    state.limit.release()
+
+        response.close = close_and_release
+        return response
+
+    def open_hosts(self) -> Dict[str, HostState]:
+        """Hosts whose circuit is currently open"""
+        with self.hosts_lock:
+            return {host: state for host, state in self.hosts.items() if state.breaker.is_open}
@@ -0,0 +1,228 @@
+"""
+Decode, resize and encode steps for frame images.
+
+The fast path avoids most of the full-resolution work the original code did:
+- JPEGs are decoded with Image.draft, so the DCT decoder scales by 1/2, 1/4 or
+  1/8 and never produces pixels far beyond the 800x800 target; with the
+  product check on, the scale is picked so the product crop (found on a 1/8
+  decode first) still spans 800 pixels
+- what is left is shrunk by thumbnail, which pre-shrinks with Image.reduce
+  (integer box filter) before the final LANCZOS pass
+- L images are converted to RGB after resizing, on the small image
+- images that already fill the canvas are used as-is instead of being pasted
+  onto a new white canvas
+- the product-shot check (product_check.py) rejects lifestyle shots and crops
+  padded products on the decoded image, before any of the resize work
+
+prepare_frame_legacy reproduces the original pipeline for benchmarks and
+parity checks (see bench_image_processing.py).
+"""
+
+import io
+import math
+import time
+from typing import BinaryIO, Dict, Optional, Tuple
+
+from PIL import Image
+
+from phash_index import HASH_SIZE, format_hash, perceptual_hash
+from product_check import analyze_product_shot, product_shot_problem
+
+FRAME_SIZE = 800
+MIN_SOURCE_SIZE = 200
+
+# Modes Pillow can resize directly; others are converted to RGB first
+RESIZABLE_MODES = ('RGB', 'L')
+
+DEFAULT_ENCODER_OPTIONS = {'quality': 95, 'optimize': True}
+
+
+class ImageRejected(Exception):
+    """Raised when a candidate image is unusable; reason is recorded in the manifest"""
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+    def __reduce__(self):
+        # Keep both arguments when a process-pool render sends the error back
+        return type(self), (self.reason, str(self))
+
+
+class RenderedFrame:
+    """An encoded frame ready to be written, with its perceptual hash and step timings"""
+
+    def __init__(self, data: bytes, image_hash: str, timings: Optional[Dict[str, float]] = None):
+        self.data = data
+        self.image_hash = image_hash
+        # Seconds spent per step ('decode', 'check', 'resize', 'hash', 'encode'), measured
+        # where the work ran so process-pool renders can be reported too
+        self.timings = timings or {}
+        # Set when the quality was searched to a target SSIM (see quality_search.py)
+        self.quality: Optional[int] = None
+        self.baseline_bytes: Optional[int] = None
+
+
+def open_for_processing(fp: BinaryIO, fast: bool = True, size: int = FRAME_SIZE,
+                        product_check: bool = True) -> Image.Image:
+    """Open and fully load an image, decoding JPEGs at reduced scale when fast is set
+
+    With product_check, the scale is chosen for the product rather than the
+    whole source: render_frame crops to the product before resizing and never
+    upscales, so a small product in a large photo must still decode at `size`
+    or more.
+    """
+    start = fp.tell()
+    image = Image.open(fp)
+    if fast and image.format == 'JPEG':
+        draft_size = (size, size)
+        if product_check and min(image.size) >= 2 * size:
+            draft_size = product_draft_size(image, fp, start, size)
+            fp.seek(start)
+            image = Image.open(fp)
+        # Keeps both sides >= draft_size
+        image.draft('RGB', draft_size)
+    image.load()
+    return image
+
+
+def product_draft_size(image: Image.Image, fp: BinaryIO, start: int, size: int) -> Tuple[int, int]:
+    """Smallest decode size at which the source's product crop still spans `size` pixels
+
+    The product is found on a 1/8-scale decode, which costs a fraction of the
+    real one.
+    """
+    width, height = image.size
+    image.draft('RGB', (width // 8, height // 8))
+    image.load()
+    crop = analyze_product_shot(image).crop_box()
+    crop_side = max(crop[2] - crop[0], crop[3] - crop[1]) * width / image.width
+    if crop_side <= 0:
+        return size, size
+    scale = min(1.0, size / crop_side)
+    return max(size, math.ceil(width * scale)), max(size, math.ceil(height * scale))
+
+
+def prepare_frame(image: Image.Image, size: int = FRAME_SIZE, reducing_gap: float = 2.0) -> Image.Image:
+    """Fit an image into a size x size white canvas using the fast resize path"""
+    if image.mode not in RESIZABLE_MODES:
+        image = image.convert('RGB')
+
+    if image.width > size or image.height > size:
+        image.thumbnail((size, size), Image.Resampling.LANCZOS, reducing_gap=reducing_gap)
+
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    if image.size == (size, size):
+        return image
+
+    final_image = Image.new('RGB', (size, size), 'white')
+    final_image.paste(image, ((size - image.width) // 2, (size - image.height) // 2))
+    return final_image
+
+
+def prepare_frame_legacy(image: Image.Image, size: int = FRAME_SIZE) -> Image.Image:
+    """The original full-resolution pipeline, kept for benchmarks and parity checks"""
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    image.thumbnail((size, size), Image.Resampling.LANCZOS)
+    final_image = Image.new('RGB', (size, size), 'white')
+    final_image.paste(image, ((size - image.width) // 2, (size - image.height) // 2))
+    return final_image
+
+
+def save_frame(image: Image.Image, filepath, encoder_options: Optional[Dict] = None):
+    """Encode a prepared frame as JPEG with configurable encoder settings"""
+    data, _ = encode_frame(image, encoder_options)
+    if hasattr(filepath, 'write'):
+        filepath.write(data)
+    else:
+        with open(filepath, 'wb') as f:
+            f.write(data)
+
+
+def encode_frame(image: Image.Image, encoder_options: Optional[Dict] = None) -> Tuple[bytes, Optional[Dict]]:
+    """Encode a prepared frame; with a 'target_ssim' option, at the lowest quality that meets it
+
+    Returns the JPEG bytes and, for targeted encodes, the chosen quality and
+    the size the fixed quality would have written.
+    """
+    options = dict(DEFAULT_ENCODER_OPTIONS)
+    if encoder_options:
+        options.update(encoder_options)
+    target = options.pop('target_ssim', None)
+    min_quality = options.pop('min_quality', None)
+    if not target:
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', **options)
+        return buffer.getvalue(), None
+
+    from quality_search import DEFAULT_MIN_QUALITY, encode_to_target
+    max_quality = options.pop('quality')
+    encoded = encode_to_target(image, target, min_quality or DEFAULT_MIN_QUALITY, max_quality, options)
+    return encoded.data, {'quality': encoded.quality, 'baseline_bytes': encoded.baseline_bytes}
+
+
+def render_frame(image: Image.Image, resize_mode: str = 'fast', encoder_options: Optional[Dict] = None,
+                 hash_size: int = HASH_SIZE, product_check: bool = True) -> RenderedFrame:
+    """Validate, resize, hash and encode a decoded source image"""
+    if image.width < MIN_SOURCE_SIZE or image.height < MIN_SOURCE_SIZE:
+        raise ImageRejected(f"too small {image.width}x{image.height}",
+                            f"Image too small: {image.width}x{image.height}")
+
+    timings = {}
+    if product_check:
+        started = time.perf_counter()
+        shot = analyze_product_shot(image)
+        reason, message = product_shot_problem(shot, MIN_SOURCE_SIZE)
+        if reason:
+            raise ImageRejected(reason, message)
+        crop_box = shot.crop_box()
+        if crop_box != (0, 0, image.width, image.height):
+            image = image.crop(crop_box)
+        timings['check'] = time.perf_counter() - started
+
+    # Fit into an 800x800 white canvas while maintaining aspect ratio
+    started = time.perf_counter()
+    if resize_mode == 'legacy':
+        final_image = prepare_frame_legacy(image)
+    else:
+        final_image = prepare_frame(image)
+    resized = time.perf_counter()
+
+    image_hash = format_hash(perceptual_hash(final_image, hash_size), hash_size)
+    hashed = time.perf_counter()
+
+    data, search = encode_frame(final_image, encoder_options)
+    encoded = time.perf_counter()
+
+    timings.update(resize=resized - started, hash=hashed - resized, encode=encoded - hashed)
+    rendered = RenderedFrame(data, image_hash, timings)
+    if search:
+        rendered.quality = search['quality']
+        rendered.baseline_bytes = search['baseline_bytes']
+    return rendered
+
+
+def render_frame_bytes(data: bytes, resize_mode: str = 'fast', encoder_options: Optional[Dict] = None,
+                       hash_size: int = HASH_SIZE, product_check: bool = True) -> RenderedFrame:
+    """Decode and render an encoded source; picklable entry point for process pools"""
+    started = time.perf_counter()
+    image = open_for_processing(io.BytesIO(data), fast=resize_mode == 'fast', product_check=product_check)
+    decoded = time.perf_counter() - started
+    rendered = render_frame(image, resize_mode, encoder_options, hash_size, product_check)
+    rendered.timings['decode'] = decoded
+    return rendered
+
+
+def render_frame_file(path: str, resize_mode: str = 'fast', encoder_options: Optional[Dict] = None,
+                      hash_size: int = HASH_SIZE, product_check: bool = True) -> RenderedFrame:
+    """render_frame_bytes for a source spooled to disk; the file is decoded without reading it into memory"""
+    started = time.perf_counter()
+    with open(path, 'rb') as f:
+        image = open_for_processing(f, fast=resize_mode == 'fast', product_check=product_check)
+    decoded = time.perf_counter() - started
+    rendered = render_frame(image, resize_mode, encoder_options, hash_size, product_check)
+    rendered.timings['decode'] = decoded
+    return rendered
@@ -0,0 +1,240 @@
+"""
+Bulk ingestion of local candidate images for the glasses downloader.
+
+`glasses_downloader.py ingest --source DUMP --mapping MAP` turns a supplier
+dump of product photos into frames without going through search or HTTP:
+- DUMP is a directory, a tar archive (any compression; '-' streams one from
+  stdin) or a zip archive; members are read one at a time straight out of the
+  archive, nothing is extracted to disk
+- MAP is a JSON object assigning member paths, or fnmatch patterns over them,
+  to frames:
+
+      {
+        "suppliers/acme/AV-100-gold.jpg": "oval/aviator-gold3",
+        "suppliers/acme/round-*.jpg": "round/round-wire3"
+      }
+
+  exact paths win over patterns, and patterns are tried in file order
+- every mapped member goes through render_frame_bytes on a process pool across
+  all cores (--render-workers), so it gets the same size, product-shot, resize
+  and encode treatment as a downloaded image, and the result is committed with
+  the downloader's own perceptual/URL dedup, atomic write and manifest record
+- results are committed in archive order, so for a frame with several mapped
+  members the first one that passes wins, deterministically; members for
+  frames that already exist are skipped before decoding
+
+Ingested frames record an ingest:// source URL; refresh leaves them alone.
+"""
+
+import fnmatch
+import json
+import os
+import sys
+import tarfile
+import time
+import zipfile
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from image_processing import ImageRejected, render_frame_bytes
+from metrics import reason_label
+
+SOURCE_SCHEME = 'ingest://'
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+
+def normalize_member(name: str) -> str:
+    """'./a/b.jpg' and 'a/b.jpg' name the same member"""
+    while name.startswith('./'):
+        name = name[2:]
+    return name
+
+
+class IngestMapping:
+    """Member path -> (face_shape, frame_type) assignments loaded from a JSON file"""
+
+    def __init__(self, entries: Dict[str, str], face_shapes: List[str]):
+        self.exact: Dict[str, Tuple[str, str]] = {}
+        self.patterns: List[Tuple[str, Tuple[str, str]]] = []
+        for pattern, frame in entries.items():
+            target = self.parse_frame(frame, face_shapes)
+            if any(char in pattern for char in '*?['):
+                self.patterns.append((pattern, target))
+            else:
+                self.exact[normalize_member(pattern)] = target
+
+    @staticmethod
+    def parse_frame(frame: str, face_shapes: List[str]) -> Tuple[str, str]:
+        face_shape, _, frame_type = str(frame).partition('/')
+        if frame_type.endswith('.jpg'):
+            frame_type = frame_type[:-4]
+        if face_shape not in face_shapes:
+            raise ValueError(f"'{frame}': unknown face shape '{face_shape}'")
+        if not frame_type or '/' in frame_type or os.sep in frame_type:
+            raise ValueError(f"'{frame}' must look like '<face shape>/<frame type>'")
+        return face_shape, frame_type
+
+    @classmethod
+    def load(cls, path: str, face_shapes: List[str]) -> 'IngestMapping':
+        with open(path, 'r', encoding='utf-8') as f:
+            try:
+                data = json.load(f)
+            except ValueError as e:
+                raise ValueError(f"{path} is not valid JSON: {e}") from None
+        if not isinstance(data, dict) or not data:
+            raise ValueError(f"{path} must be a non-empty object of member paths to frames")
+        return cls(data, face_shapes)
+
+    def target(self, name: str) -> Optional[Tuple[str, str]]:
+        name = normalize_member(name)
+        if name in self.exact:
+            return self.exact[name]
+        for pattern, target in self.patterns:
+            if fnmatch.fnmatchcase(name, pattern):
+                return target
+        return None
+
+
+def iter_source(source: str) -> Iterator[Tuple[str, int, Callable[[], bytes]]]:
+    """Yield (member name, size, read) for every file in a directory, tar or zip, in archive order
+
+    read() returns the member's bytes; it is only called for members that are
+    mapped, and for tar streams only until the next member is yielded.
+    """
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for filename in sorted(files):
+                filepath = os.path.join(root, filename)
+                name = os.path.relpath(filepath, source).replace(os.sep, '/')
+
+                def read(filepath=filepath):
+                    with open(filepath, 'rb') as f:
+                        return f.read()
+                yield name, os.path.getsize(filepath), read
+    elif source != '-' and zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    yield info.filename, info.file_size, lambda info=info: archive.read(info)
+    else:
+        # Stream mode: members are read in order without seeking, so pipes and .tar.gz work
+        fileobj = sys.stdin.buffer if source == '-' else None
+        with tarfile.open(source if fileobj is None else None, mode='r|*', fileobj=fileobj) as archive:
+            for member in archive:
+                if member.isfile():
+                    yield member.name, member.size, lambda member=member: archive.extractfile(member).read()
+
+
+class BulkIngester:
+    """Render mapped images from a local dump on a process pool and commit them as frames"""
+
+    def __init__(self, downloader, mapping: IngestMapping, workers: Optional[int] = None):
+        self.downloader = downloader
+        self.mapping = mapping
+        self.workers = workers or os.cpu_count() or 1
+        # Renders in flight; bounded so a large dump never sits in memory at once
+        self.window = self.workers * 4
+        self.rejects: Counter = Counter()
+        self.written = 0
+        self.processed = 0
+
+    def reject(self, url: str, relpath: str, reason: str):
+        self.rejects[reason_label(reason)] += 1
+        self.downloader.reject_url(url, relpath, reason)
+
+    def commit(self, url: str, face_shape: str, frame_type: str, future):
+        """Commit one finished render in archive order"""
+        downloader = self.downloader
+        relpath = f"{face_shape}/{frame_type}.jpg"
+        filepath = downloader.frame_filepath(face_shape, frame_type)
+        try:
+            rendered = future.result()
+        except ImageRejected as e:
+            self.reject(url, relpath, e.reason)
+            return
+        except OSError:
+            # PIL.UnidentifiedImageError and truncated files
+            self.reject(url, relpath, 'undecodable')
+            return
+        except Exception as e:
+            self.reject(url, relpath, f"{type(e).__name__}: {e}")
+            return
+        downloader.record_render_timings(rendered)
+        if os.path.exists(filepath):
+            # An earlier member of this dump already filled the frame
+            self.rejects['frame exists'] += 1
+            return
+        if downloader.commit_frame(url, filepath, rendered):
+            self.written += 1
+            print(f"✅ {relpath} <- {url[len(SOURCE_SCHEME):]}")
+        else:
+            # commit_frame already recorded the reject; report it under the reason it recorded
+            reason = downloader.manifest.url_failure_reason(url) or 'duplicate'
+            self.rejects[reason_label(reason)] += 1
+
+    def run(self, source: str) -> Dict:
+        """Ingest every mapped member of source and return counts, rejects by reason and rate"""
+        downloader = self.downloader
+        source_name = 'stdin' if source == '-' else os.path.basename(os.path.abspath(source))
+        name_prefix = f"{SOURCE_SCHEME}{source_name}/"
+        print(f"📦 Ingesting {source} with {self.workers} render workers...")
+
+        started = time.perf_counter()
+        unmapped = 0
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            for name, size, read in iter_source(source):
+                target = self.mapping.target(name)
+                if target is None or not name.lower().endswith(IMAGE_EXTENSIONS):
+                    unmapped += 1
+                    continue
+                face_shape, frame_type = target
+                url = name_prefix + normalize_member(name)
+                self.processed += 1
+                if os.path.exists(downloader.frame_filepath(face_shape, frame_type)):
+                    self.rejects['frame exists'] += 1
+                    continue
+                if url in downloader.bad_urls:
+                    # Rejected by an earlier ingest of the same dump
+                    self.rejects['known bad'] += 1
+                    continue
+                if size > downloader.max_image_bytes:
+                    self.reject(url, f"{face_shape}/{frame_type}.jpg", 'too large')
+                    continue
+
+                data = read()
+                downloader.metrics.incr('bytes_fetched', len(data))
+                future = executor.submit(
+                    render_frame_bytes, data, downloader.resize_mode, downloader.encoder_options,
+                    downloader.hash_index.hash_size, downloader.product_check
+                )
+                pending.append((url, face_shape, frame_type, future))
+                while len(pending) >= self.window:
+                    self.commit(*pending.popleft())
+            while pending:
+                self.commit(*pending.popleft())
+        elapsed = time.perf_counter() - started
+
+        downloader.hash_index.save()
+        downloader.build_assets()
+        return {
+            'processed': self.processed,
+            'written': self.written,
+            'unmapped': unmapped,
+            'rejects': dict(self.rejects),
+            'elapsed': elapsed,
+        }
+
+
+def print_ingest_report(report: Dict):
+    for reason, count in sorted(report['rejects'].items(), key=lambda item: (-item[1], item[0])):
+        print(f"   ❌ {reason}: {count}")
+    if report['unmapped']:
+        print(f"   ⏭️  {report['unmapped']} files not in the mapping were skipped")
+    elapsed = max(report['elapsed'], 1e-9)
+    print(f"✅ Ingested {report['processed']} images in {report['elapsed']:.1f}s "
+          f"({report['processed'] / elapsed:.1f} images/s): {report['written']} frames written, "
+          f"{sum(report['rejects'].values())} rejected")
@@ -0,0 +1,308 @@
+"""
+Persistent run manifest for the glasses downloader.
+
+A SQLite database (WAL mode) records every frame's status, the candidate URLs
+found for it, each download attempt and failure, and the hash and source of
+every written output. It replaces the in-memory downloaded_urls set: a crash or
+quota cutoff keeps all dedup knowledge, restarts skip finished frames with a
+primary-key lookup, and URLs that failed permanently are never fetched again.
+
+Finished frames also keep their source's ETag, Last-Modified and SHA-256, so
+`glasses_downloader.py refresh` can revalidate them with conditional requests
+(see refresh.py), and the SHA-256 of the written file, which
+`glasses_downloader.py audit` checks the frames on disk against (see audit.py).
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+# Frame statuses
+FRAME_PENDING = 'pending'
+FRAME_DONE = 'done'
+FRAME_FAILED = 'failed'
+FRAME_DEFERRED = 'deferred'
+
+# Source validator columns added to frames after the first release
+SOURCE_COLUMNS = {
+    'etag': 'TEXT',
+    'last_modified': 'TEXT',
+    'source_hash': 'TEXT',
+    'checked_at': 'REAL',
+}
+
+# SHA-256 of the written frame file
+OUTPUT_COLUMNS = {
+    'output_hash': 'TEXT',
+}
+
+ADDED_COLUMNS = {**SOURCE_COLUMNS, **OUTPUT_COLUMNS}
+
+# URL statuses
+URL_CANDIDATE = 'candidate'
+URL_DOWNLOADED = 'downloaded'
+URL_FAILED = 'failed'
+URL_BAD = 'bad'
+
+
+class RunManifest:
+    """Transactional record of frames, candidate URLs, attempts and outputs"""
+
+    def __init__(self, path: str, max_url_failures: int = 3):
+        self.path = path
+        self.max_url_failures = max_url_failures
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        with self.connection:
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS frames (
+                    relpath TEXT PRIMARY KEY,
+                    face_shape TEXT NOT NULL,
+                    frame_type TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    source_url TEXT,
+                    image_hash TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS urls (
+                    url TEXT PRIMARY KEY,
+                    relpath TEXT,
+                    status TEXT NOT NULL,
+                    reason TEXT,
+                    failures INTEGER NOT NULL DEFAULT 0,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS idx_urls_status ON urls (status)')
+            existing = {row[1] for row in self.connection.execute('PRAGMA table_info(frames)')}
+            for column, column_type in ADDED_COLUMNS.items():
+                if column not in existing:
+                    self.connection.execute(f'ALTER TABLE frames ADD COLUMN {column} {column_type}')
+
+    def _ensure_frame(self, relpath: str, face_shape: str, frame_type: str, now: float):
+        self.connection.execute('''
+            INSERT OR IGNORE INTO frames (relpath, face_shape, frame_type, status, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (relpath, face_shape, frame_type, FRAME_PENDING, now))
+
+    def frame_status(self, relpath: str) -> Optional[str]:
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT status FROM frames WHERE relpath = ?', (relpath,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def frame_record(self, relpath: str) -> Optional[Dict]:
+        with self.lock:
+            cursor = self.connection.execute('SELECT * FROM frames WHERE relpath = ?', (relpath,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            return dict(zip([column[0] for column in cursor.description], row))
+
+    def urls_with_status(self, status: str) -> Set[str]:
+        with self.lock:
+            rows = self.connection.execute('SELECT url FROM urls WHERE status = ?', (status,))
+            return {row[0] for row in rows}
+
+    def add_candidates(self, relpath: str, urls: Iterable[str]):
+        """Remember candidate URLs found for a frame without touching already known URLs"""
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.executemany('''
+                INSERT OR IGNORE INTO urls (url, relpath, status, updated_at) VALUES (?, ?, ?, ?)
+            ''', [(url, relpath, URL_CANDIDATE, now) for url in urls])
+
+    def record_attempt(self, relpath: str, face_shape: str, frame_type: str):
+        now = time.time()
+        with self.lock, self.connection:
+            self._ensure_frame(relpath, face_shape, frame_type, now)
+            self.connection.execute(
+                'UPDATE frames SET attempts = attempts + 1, updated_at = ? WHERE relpath = ?',
+                (now, relpath)
+            )
+
+    def url_failure_reason(self, url: str) -> Optional[str]:
+        """The last recorded failure reason of a URL, if it ever failed"""
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT reason FROM urls WHERE url = ? AND status != ?', (url, URL_DOWNLOADED)
+            ).fetchone()
+        return row[0] if row else None
+
+    def record_url_failure(self, url: str, relpath: Optional[str], reason: str, permanent: bool) -> bool:
+        """Record a failed fetch and return True if the URL should never be tried again"""
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.execute('''
+                INSERT INTO urls (url, relpath, status, reason, failures, updated_at)
+                VALUES (?, ?, ?, ?, 1, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    status = excluded.status, reason = excluded.reason,
+                    failures = failures + 1, updated_at = excluded.updated_at
+            ''', (url, relpath, URL_BAD if permanent else URL_FAILED, reason, now))
+            failures = self.connection.execute(
+                'SELECT failures FROM urls WHERE url = ?', (url,)
+            ).fetchone()[0]
+            if not permanent and failures >= self.max_url_failures:
+                self.connection.execute('UPDATE urls SET status = ? WHERE url = ?', (URL_BAD, url))
+                permanent = True
+        return permanent
+
+    def record_frame_failure(self, relpath: str, face_shape: str, frame_type: str, reason: str):
+        now = time.time()
+        with self.lock, self.connection:
+            self._ensure_frame(relpath, face_shape, frame_type, now)
+            self.connection.execute('''
+                UPDATE frames SET status = ?, last_error = ?, updated_at = ? WHERE relpath = ?
+            ''', (FRAME_FAILED, reason, now, relpath))
+
+    def record_frame_deferred(self, relpath: str, face_shape: str, frame_type: str, reason: str):
+        """Mark a never-attempted frame as postponed (e.g. out of search quota); failed frames stay failed"""
+        now = time.time()
+        with self.lock, self.connection:
+            self._ensure_frame(relpath, face_shape, frame_type, now)
+            self.connection.execute('''
+                UPDATE frames SET status = ?, last_error = ?, updated_at = ?
+                WHERE relpath = ? AND status IN (?, ?)
+            ''', (FRAME_DEFERRED, reason, now, relpath, FRAME_PENDING, FRAME_DEFERRED))
+
+    def frame_statuses(self) -> Dict[str, str]:
+        """Status of every known frame by relpath, for scheduling"""
+        with self.lock:
+            return dict(self.connection.execute('SELECT relpath, status FROM frames'))
+
+    def record_output(self, relpath: str, face_shape: str, frame_type: str, url: str, image_hash: str,
+                      source: Optional[Dict] = None, output_hash: Optional[str] = None):
+        """Mark a frame done with its source URL, image hash, source validators and file hash in one transaction"""
+        now = time.time()
+        source = source or {}
+        with self.lock, self.connection:
+            self._ensure_frame(relpath, face_shape, frame_type, now)
+            self.connection.execute('''
+                UPDATE frames SET status = ?, source_url = ?, image_hash = ?, last_error = NULL,
+                    etag = ?, last_modified = ?, source_hash = ?, checked_at = ?, output_hash = ?,
+                    updated_at = ? WHERE relpath = ?
+            ''', (FRAME_DONE, url, image_hash, source.get('etag'), source.get('last_modified'),
+                  source.get('source_hash'), now, output_hash, now, relpath))
+            self.connection.execute('''
+                INSERT INTO urls (url, relpath, status, updated_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    relpath = excluded.relpath, status = excluded.status,
+                    reason = NULL, updated_at = excluded.updated_at
+            ''', (url, relpath, URL_DOWNLOADED, now))
+
+    def record_validators(self, relpath: str, source: Dict):
+        """Store a revalidated source's validators without touching the frame's output"""
+        with self.lock, self.connection:
+            self.connection.execute('''
+                UPDATE frames SET etag = ?, last_modified = ?, source_hash = ?, checked_at = ?
+                WHERE relpath = ?
+            ''', (source.get('etag'), source.get('last_modified'), source.get('source_hash'),
+                  time.time(), relpath))
+
+    def done_frames(self) -> List[Dict]:
+        """Finished frames with their source URL and validators, for refresh"""
+        with self.lock:
+            cursor = self.connection.execute('''
+                SELECT relpath, face_shape, frame_type, source_url, image_hash,
+                    etag, last_modified, source_hash
+                FROM frames WHERE status = ? AND source_url IS NOT NULL ORDER BY relpath
+            ''', (FRAME_DONE,))
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor]
+
+    def output_hashes(self) -> Dict[str, Optional[str]]:
+        """Recorded file SHA-256 of every finished frame (None for frames written before it was kept)"""
+        with self.lock:
+            return dict(self.connection.execute(
+                'SELECT relpath, output_hash FROM frames WHERE status = ?', (FRAME_DONE,)
+            ))
+
+    def record_output_hashes(self, hashes: Dict[str, str]):
+        """Store file hashes for finished frames, e.g. to baseline frames that predate them"""
+        with self.lock, self.connection:
+            self.connection.executemany(
+                'UPDATE frames SET output_hash = ? WHERE relpath = ? AND status = ?',
+                [(output_hash, relpath, FRAME_DONE) for relpath, output_hash in hashes.items()]
+            )
+
+    def merge_from(self, path: str) -> Dict[str, int]:
+        """Fold another manifest (e.g. a shard's) into this one
+
+        Finished frames win over unfinished ones and downloaded URLs over bad,
+        failed and candidate ones; otherwise the most recently updated row wins.
+        Returns the number of frame and URL rows inserted or updated.
+        """
+        url_rank = 'CASE {0}.status WHEN ? THEN 3 WHEN ? THEN 2 WHEN ? THEN 1 ELSE 0 END'
+        url_rank_params = (URL_DOWNLOADED, URL_BAD, URL_FAILED)
+        with self.lock:
+            self.connection.execute('ATTACH DATABASE ? AS other', (path,))
+            try:
+                # Manifests written before the added columns existed merge with NULLs
+                other_columns = {row[1] for row in self.connection.execute('PRAGMA other.table_info(frames)')}
+                source_names = ', '.join(ADDED_COLUMNS)
+                source_select = ', '.join(column if column in other_columns else 'NULL'
+                                          for column in ADDED_COLUMNS)
+                source_update = ', '.join(f'{column} = excluded.{column}' for column in ADDED_COLUMNS)
+                with self.connection:
+                    before = self.connection.total_changes
+                    self.connection.execute(f'''
+                        INSERT INTO frames (relpath, face_shape, frame_type, status, source_url,
+                            image_hash, attempts, last_error, updated_at, {source_names})
+                        SELECT relpath, face_shape, frame_type, status, source_url,
+                            image_hash, attempts, last_error, updated_at, {source_select}
+                            FROM other.frames WHERE true
+                        ON CONFLICT(relpath) DO UPDATE SET
+                            status = excluded.status, source_url = excluded.source_url,
+                            image_hash = excluded.image_hash, last_error = excluded.last_error,
+                            attempts = MAX(frames.attempts, excluded.attempts), {source_update},
+                            updated_at = excluded.updated_at
+                        WHERE (excluded.status = ?) > (frames.status = ?)
+                           OR ((excluded.status = ?) = (frames.status = ?)
+                               AND excluded.updated_at > frames.updated_at)
+                    ''', (FRAME_DONE,) * 4)
+                    frames = self.connection.total_changes - before
+
+                    before = self.connection.total_changes
+                    self.connection.execute(f'''
+                        INSERT INTO urls SELECT url, relpath, status, reason, failures, updated_at
+                            FROM other.urls WHERE true
+                        ON CONFLICT(url) DO UPDATE SET
+                            relpath = excluded.relpath, status = excluded.status,
+                            reason = excluded.reason, failures = MAX(urls.failures, excluded.failures),
+                            updated_at = excluded.updated_at
+                        WHERE {url_rank.format('excluded')} > {url_rank.format('urls')}
+                           OR ({url_rank.format('excluded')} = {url_rank.format('urls')}
+                               AND excluded.updated_at > urls.updated_at)
+                    ''', url_rank_params * 4)
+                    urls = self.connection.total_changes - before
+            finally:
+                self.connection.execute('DETACH DATABASE other')
+        return {'frames': frames, 'urls': urls}
+
+    def summary(self) -> Dict[str, int]:
+        with self.lock:
+            rows = self.connection.execute('SELECT status, COUNT(*) FROM frames GROUP BY status')
+            counts = {status: count for status, count in rows}
+            counts['bad_urls'] = self.connection.execute(
+                'SELECT COUNT(*) FROM urls WHERE status = ?', (URL_BAD,)
+            ).fetchone()[0]
+        return counts
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
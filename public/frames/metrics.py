@@ -0,0 +1,227 @@
+"""
+Structured metrics for GoogleImagesGlassesDownloader.
+
+Metrics collects per-stage timers (search, plan, fetch, decode, resize, hash,
+encode, write, frame) and labelled counters (API calls, cache hits, bytes
+fetched, rejects by reason, dedup hits). When enabled it writes:
+- a JSON-lines event log, one object per timed operation or counter increment
+  plus run_start/run_end events with the totals:
+      {"ts": 1760700000.123, "event": "timer", "stage": "fetch", "seconds": 0.084}
+      {"ts": 1760700000.125, "event": "count", "name": "rejects", "reason": "too small", "value": 1}
+- a Prometheus text-format file (for the node_exporter textfile collector),
+  rewritten atomically when the run ends
+
+Disabled metrics (the default) return a shared no-op context manager from
+timer() and return immediately from incr() and observe(), so instrumented hot
+paths pay one attribute check per call.
+
+Given a StageProfiler (--profile, see profiling.py), timer() spans are also
+profiled, and profile() marks extra spans that are profiled but not timed.
+"""
+
+import contextlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+METRIC_PREFIX = 'framefinder'
+
+# Shared no-op timer handed out while metrics are disabled
+NULL_TIMER = contextlib.nullcontext()
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def reason_label(reason: str) -> str:
+    """Collapse a reject reason to a low-cardinality label: 'too small 150x120' -> 'too small'"""
+    label = reason.split(':', 1)[0]
+    if label.startswith('duplicate of'):
+        return 'duplicate'
+    return re.sub(r'\s*\d+x\d+$', '', label)
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ''
+    parts = []
+    for name, value in key:
+        value = value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{name}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+class _Timer:
+    """Context manager measuring one stage; reports to Metrics.observe on exit"""
+
+    __slots__ = ('metrics', 'stage', 'labels', 'started')
+
+    def __init__(self, metrics: 'Metrics', stage: str, labels: Dict[str, str]):
+        self.metrics = metrics
+        self.stage = stage
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.stage, time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class Metrics:
+    """Thread-safe stage timers and counters with JSON-lines and Prometheus output"""
+
+    def __init__(self, event_log: Optional[str] = None, prometheus_path: Optional[str] = None,
+                 profiler=None):
+        self.event_log_path = event_log
+        self.prometheus_path = prometheus_path
+        self.profiler = profiler
+        self.enabled = bool(event_log or prometheus_path or profiler)
+        self.lock = threading.Lock()
+        self.counters: Dict[Tuple[str, LabelKey], float] = {}
+        # (stage, labels) -> [count, total seconds, max seconds]
+        self.timers: Dict[Tuple[str, LabelKey], list] = {}
+        self.started = time.time()
+        self.event_log = None
+        if event_log:
+            os.makedirs(os.path.dirname(os.path.abspath(event_log)), exist_ok=True)
+            self.event_log = open(event_log, 'a', encoding='utf-8')
+            self.event('run_start')
+
+    def event(self, event_type: str, **fields):
+        """Append one event to the JSON-lines log"""
+        if self.event_log is None:
+            return
+        line = json.dumps({'ts': round(time.time(), 3), 'event': event_type, **fields})
+        with self.lock:
+            if self.event_log is not None:
+                self.event_log.write(line + '\n')
+
+    def timer(self, stage: str, item: Optional[str] = None, **labels):
+        """Context manager timing one stage; a shared no-op when disabled
+
+        item names the frame being worked on, for the profiler's per-frame report.
+        """
+        if not self.enabled:
+            return NULL_TIMER
+        if self.profiler is not None:
+            return self.profiler.span(stage, item, self, **labels)
+        return _Timer(self, stage, labels)
+
+    def profile(self, stage: str, item: Optional[str] = None):
+        """Context manager profiling a span without timing it; a shared no-op unless profiling"""
+        if self.profiler is None:
+            return NULL_TIMER
+        return self.profiler.span(stage, item)
+
+    def observe(self, stage: str, seconds: float, **labels):
+        """Record a stage duration measured elsewhere (e.g. in a render worker process)"""
+        if not self.enabled:
+            return
+        key = (stage, _label_key(labels))
+        with self.lock:
+            timer = self.timers.get(key)
+            if timer is None:
+                self.timers[key] = [1, seconds, seconds]
+            else:
+                timer[0] += 1
+                timer[1] += seconds
+                if seconds > timer[2]:
+                    timer[2] = seconds
+        self.event('timer', stage=stage, seconds=round(seconds, 6), **labels)
+
+    def incr(self, name: str, value: float = 1, **labels):
+        """Add to a labelled counter"""
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+        self.event('count', name=name, value=value, **labels)
+
+    def snapshot(self) -> Dict:
+        """Totals per counter and per stage, keyed by 'name{labels}'"""
+        with self.lock:
+            counters = {name + _format_labels(labels): value for (name, labels), value in self.counters.items()}
+            timers = {
+                stage + _format_labels(labels): {'count': count, 'seconds': total, 'max_seconds': peak}
+                for (stage, labels), (count, total, peak) in self.timers.items()
+            }
+        return {'counters': counters, 'timers': timers}
+
+    def prometheus_text(self) -> str:
+        """Render all counters and timers in the Prometheus text exposition format"""
+        with self.lock:
+            counters = sorted(self.counters.items())
+            timers = sorted(self.timers.items())
+
+        lines = []
+        names = sorted({name for (name, _), _ in counters})
+        for name in names:
+            metric = f"{METRIC_PREFIX}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for (counter_name, labels), value in counters:
+                if counter_name == name:
+                    lines.append(f"{metric}{_format_labels(labels)} {_format_value(value)}")
+
+        for suffix, kind, index in (('stage_calls_total', 'counter', 0),
+                                    ('stage_seconds_total', 'counter', 1),
+                                    ('stage_seconds_max', 'gauge', 2)):
+            if not timers:
+                break
+            metric = f"{METRIC_PREFIX}_{suffix}"
+            lines.append(f"# TYPE {metric} {kind}")
+            for (stage, labels), values in timers:
+                stage_labels = _label_key({'stage': stage, **dict(labels)})
+                lines.append(f"{metric}{_format_labels(stage_labels)} {_format_value(values[index])}")
+
+        lines.append(f"# TYPE {METRIC_PREFIX}_run_started_seconds gauge")
+        lines.append(f"{METRIC_PREFIX}_run_started_seconds {self.started:.3f}")
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self):
+        if not self.prometheus_path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.prometheus_path)), exist_ok=True)
+        tmp_path = f"{self.prometheus_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, self.prometheus_path)
+
+    def close(self):
+        """Write the run_end totals and the Prometheus file"""
+        if not self.enabled:
+            return
+        self.event('run_end', elapsed_seconds=round(time.time() - self.started, 3), **self.snapshot())
+        self.write_prometheus()
+        if self.event_log is not None:
+            with self.lock:
+                self.event_log.close()
+                self.event_log = None
+        if self.profiler is not None:
+            self.profiler.print_report(self.profiler.close())
+            self.profiler = None
+
+    def print_report(self):
+        """Print per-stage totals, slowest total first"""
+        if not self.enabled:
+            return
+        snapshot = self.snapshot()
+        print("\n📈 STAGE TIMINGS")
+        for stage, timer in sorted(snapshot['timers'].items(), key=lambda item: -item[1]['seconds']):
+            mean_ms = timer['seconds'] / timer['count'] * 1000
+            print(f"   {stage:24} {timer['count']:6d} calls {timer['seconds']:8.2f}s total {mean_ms:8.1f} ms avg")
+        for name, value in sorted(snapshot['counters'].items()):
+            print(f"   {name:40} {_format_value(value)}")
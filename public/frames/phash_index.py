@@ -0,0 +1,309 @@
+"""
+Perceptual-hash near-duplicate index for the glasses downloader.
+
+Images are hashed with a 256-bit difference hash (dHash) computed on a 17x16
+grayscale array. Before hashing, the image is trimmed to its foreground so the
+same product shot padded, re-encoded or resized by a different retailer hashes
+to (nearly) the same value. Hashes live in a BK-tree, so near-duplicate lookups
+only visit a small part of the library, and the index is persisted as JSON and
+re-seeded from public/frames/<shape>/*.jpg at startup. When a frame is
+overwritten (refresh, reencode) its old hash is removed from the tree, so the
+frame's previous version never matches as a duplicate.
+"""
+
+import io
+import json
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from PIL import Image, ImageChops, ImageFilter
+
+HASH_SIZE = 16
+
+# Working size for trimming; large enough to find the product, small enough to be cheap
+WORK_SIZE = 256
+
+# Gray-level difference from the background that counts as foreground
+FOREGROUND_THRESHOLD = 40
+
+# Gradients smaller than this are treated as flat so JPEG noise does not flip bits
+GRADIENT_TOLERANCE = 8
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+def format_hash(value_hash: int, hash_size: int = HASH_SIZE) -> str:
+    """Fixed-width hex form of a hash, as stored in the index and manifest"""
+    return f"{value_hash:0{hash_size * hash_size // 4}x}"
+
+
+def _trim_to_foreground(gray: Image.Image) -> Image.Image:
+    """Crop a grayscale image to the bounding box of pixels that differ from its border"""
+    width, height = gray.size
+    step_x = max(1, width // 16)
+    step_y = max(1, height // 16)
+    border = [gray.getpixel((x, y)) for x in range(0, width, step_x) for y in (0, height - 1)]
+    border += [gray.getpixel((x, y)) for y in range(0, height, step_y) for x in (0, width - 1)]
+    background = sorted(border)[len(border) // 2]
+
+    diff = ImageChops.difference(gray.filter(ImageFilter.MedianFilter(3)),
+                                 Image.new('L', gray.size, background))
+    mask = diff.point([255 if level > FOREGROUND_THRESHOLD else 0 for level in range(256)])
+    box = mask.getbbox()
+    return gray.crop(box) if box else gray
+
+
+def perceptual_hash(image: Union[bytes, Image.Image], hash_size: int = HASH_SIZE) -> int:
+    """Difference hash of an image's foreground, scaled to a square on white"""
+    if isinstance(image, (bytes, bytearray)):
+        image = Image.open(io.BytesIO(image))
+        image.draft('L', (WORK_SIZE, WORK_SIZE))
+
+    gray = image.convert('L')
+    gray.thumbnail((WORK_SIZE, WORK_SIZE), Image.Resampling.BOX)
+    gray = _trim_to_foreground(gray)
+
+    side = max(gray.size)
+    square = Image.new('L', (side, side), 255)
+    square.paste(gray, ((side - gray.width) // 2, (side - gray.height) // 2))
+    pixels = square.resize((hash_size + 1, hash_size), Image.Resampling.BOX).tobytes()
+
+    value = 0
+    row_length = hash_size + 1
+    for row in range(hash_size):
+        offset = row * row_length
+        for col in range(hash_size):
+            left = pixels[offset + col]
+            right = pixels[offset + col + 1]
+            value = (value << 1) | (left > right + GRADIENT_TOLERANCE)
+    return value
+
+
+class BKTree:
+    """Burkhard-Keller tree over Hamming distance for sublinear near-neighbour lookup"""
+
+    def __init__(self):
+        # Each node is [hash, [values], {distance: child_node}]; a node whose values were
+        # all removed stays in place as a tombstone that still routes lookups to its children
+        self.root: Optional[list] = None
+        self.size = 0
+        self.nodes = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, value_hash: int, value: str):
+        self.size += 1
+        if self.root is None:
+            self.root = [value_hash, [value], {}]
+            self.nodes = 1
+            return
+
+        node = self.root
+        while True:
+            distance = hamming_distance(value_hash, node[0])
+            if distance == 0:
+                node[1].append(value)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value_hash, [value], {}]
+                self.nodes += 1
+                return
+            node = child
+
+    def remove(self, value_hash: int, value: str) -> bool:
+        """Drop one value stored under value_hash, returning False if it was not there"""
+        node = self.root
+        while node is not None:
+            distance = hamming_distance(value_hash, node[0])
+            if distance == 0:
+                if value not in node[1]:
+                    return False
+                node[1].remove(value)
+                self.size -= 1
+                return True
+            node = node[2].get(distance)
+        return False
+
+    def find(self, value_hash: int, max_distance: int) -> List[Tuple[int, int, str]]:
+        """Return (distance, hash, value) for every entry within max_distance"""
+        matches = []
+        if self.root is None:
+            return matches
+
+        stack = [self.root]
+        while stack:
+            node_hash, values, children = stack.pop()
+            distance = hamming_distance(value_hash, node_hash)
+            if distance <= max_distance:
+                matches.extend((distance, node_hash, value) for value in values)
+            low = distance - max_distance
+            high = distance + max_distance
+            for child_distance, child in children.items():
+                if low <= child_distance <= high:
+                    stack.append(child)
+
+        matches.sort()
+        return matches
+
+
+class PerceptualHashIndex:
+    """Persistent near-duplicate index keyed by file path relative to the frames directory"""
+
+    def __init__(self, path: str, max_distance: int = 10, hash_size: int = HASH_SIZE):
+        self.path = path
+        self.max_distance = max_distance
+        self.hash_size = hash_size
+        # relpath -> {'hash': hex, 'mtime': float, 'size': int}
+        self.entries: Dict[str, Dict] = {}
+        self.tree = BKTree()
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Ignoring unreadable hash index {self.path}: {e}")
+            return
+        if data.get('hash_size') != self.hash_size:
+            return
+        self.entries = data.get('entries', {})
+        self._rebuild()
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self.lock:
+            payload = {'hash_size': self.hash_size, 'entries': self.entries}
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def _rebuild(self):
+        """Rebuild the tree from the entries, dropping tombstoned nodes"""
+        tree = BKTree()
+        for relpath, entry in self.entries.items():
+            tree.add(int(entry['hash'], 16), relpath)
+        self.tree = tree
+
+    def seed_from_directory(self, base_path: str, face_shapes: Iterable[str]) -> int:
+        """Hash new or changed frame images and drop entries whose files are gone"""
+        seen = set()
+        hashed = 0
+        for face_shape in face_shapes:
+            shape_path = os.path.join(base_path, face_shape)
+            if not os.path.isdir(shape_path):
+                continue
+            for filename in sorted(os.listdir(shape_path)):
+                if not filename.lower().endswith('.jpg'):
+                    continue
+                relpath = f"{face_shape}/{filename}"
+                filepath = os.path.join(shape_path, filename)
+                stat = os.stat(filepath)
+                seen.add(relpath)
+
+                entry = self.entries.get(relpath)
+                if entry and entry.get('mtime') == stat.st_mtime and entry.get('size') == stat.st_size:
+                    continue
+                try:
+                    with Image.open(filepath) as image:
+                        value_hash = perceptual_hash(image, self.hash_size)
+                except Exception as e:
+                    print(f"⚠️  Could not hash {relpath}: {e}")
+                    continue
+                self.entries[relpath] = {
+                    'hash': self.format_hash(value_hash),
+                    'mtime': stat.st_mtime,
+                    'size': stat.st_size
+                }
+                hashed += 1
+
+        for relpath in list(self.entries):
+            if relpath not in seen:
+                del self.entries[relpath]
+
+        self._rebuild()
+        return hashed
+
+    def format_hash(self, value_hash: int) -> str:
+        return format_hash(value_hash, self.hash_size)
+
+    def find_duplicate(self, value_hash: Union[int, str], exclude: Optional[str] = None) -> Optional[str]:
+        """Return the closest indexed path within max_distance, if any, other than exclude"""
+        if isinstance(value_hash, str):
+            value_hash = int(value_hash, 16)
+        with self.lock:
+            for _, node_hash, relpath in self.tree.find(value_hash, self.max_distance):
+                entry = self.entries.get(relpath)
+                if relpath != exclude and entry and int(entry['hash'], 16) == node_hash:
+                    return relpath
+        return None
+
+    def add(self, value_hash: Union[int, str], relpath: str):
+        """Index a path's hash, replacing the hash it had before (e.g. an overwritten frame)"""
+        if isinstance(value_hash, str):
+            value_hash = int(value_hash, 16)
+        with self.lock:
+            self._discard(relpath)
+            self.entries[relpath] = {'hash': self.format_hash(value_hash), 'mtime': None, 'size': None}
+            self.tree.add(value_hash, relpath)
+
+    def _discard(self, relpath: str):
+        """Remove a path's entry and tree value; the caller holds the lock"""
+        entry = self.entries.pop(relpath, None)
+        if entry is None:
+            return
+        self.tree.remove(int(entry['hash'], 16), relpath)
+        # Tombstones only slow lookups down; rebuild once they outnumber live nodes
+        if self.tree.nodes > 2 * max(len(self.tree), 64):
+            self._rebuild()
+
+    def record_file(self, relpath: str, filepath: str):
+        """Store the written file's stat so the next startup seed can skip rehashing it"""
+        stat = os.stat(filepath)
+        with self.lock:
+            entry = self.entries.get(relpath)
+            if entry is not None:
+                entry['mtime'] = stat.st_mtime
+                entry['size'] = stat.st_size
+
+    def merge(self, other: 'PerceptualHashIndex') -> List[Tuple[str, str]]:
+        """Add another index's entries (e.g. a shard's)
+
+        Returns (relpath, existing relpath) pairs for new entries that are
+        near-duplicates of frames already indexed; shards deduplicate
+        independently, so these can only be caught here.
+        """
+        duplicates = []
+        for relpath, entry in sorted(other.entries.items()):
+            current = self.entries.get(relpath)
+            if current is not None and current['hash'] == entry['hash']:
+                continue
+            if current is None:
+                match = self.find_duplicate(entry['hash'])
+                if match is not None:
+                    duplicates.append((relpath, match))
+            elif (current.get('mtime') or 0) > (entry.get('mtime') or 0):
+                continue
+            with self.lock:
+                self._discard(relpath)
+                self.entries[relpath] = dict(entry)
+                self.tree.add(int(entry['hash'], 16), relpath)
+        return duplicates
+
+    def remove(self, relpath: str):
+        with self.lock:
+            self._discard(relpath)
+
+    def __len__(self) -> int:
+        return len(self.entries)
@@ -0,0 +1,394 @@
+"""
+Producer/consumer download pipeline for GoogleImagesGlassesDownloader.
+
+download_all_images(engine='pipeline') splits each frame's work into stages
+connected by bounded queues, so CPU-heavy Pillow work never stalls network I/O
+and the reverse:
+
+    search (query planner: queries + candidate ranking)     threads
+      -> fetch (stream the image body, next candidate on failure)  threads
+      -> render (decode, validate, resize, hash, encode)     process pool
+      -> write (dedup claim, write file, manifest)          thread
+
+A rejected render or a duplicate write sends the frame's next ranked
+candidate back to the fetch queue, so fetching and rendering always stay on
+their own workers. Any error a stage raises still ends the frame in the
+normal failure path, freeing its URL and quota reservations.
+
+Decode and encode run together in one process-pool task so only the encoded
+source and the encoded output cross the process boundary; sources over
+--fetch-memory-mb cross it as the path of a temporary file. Every stage keeps
+counters (processed, dropped, busy time, peak queue depth); they are printed
+periodically and as a table at the end, to size workers to the machine.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from PIL import Image
+
+from image_processing import ImageRejected, render_frame_bytes, render_frame_file
+from quota import QuotaExhausted
+
+# Queue sentinel telling a stage worker to exit
+STOP = object()
+# Handler result for a job sent back to an earlier stage (e.g. the next candidate to fetch)
+REQUEUED = object()
+
+# Errors rendering a source that mean the image itself is bad, not the worker pool
+DECODE_ERRORS = (ImageRejected, OSError, SyntaxError, ValueError, Image.DecompressionBombError)
+
+
+class FrameJob:
+    """One frame moving through the pipeline"""
+
+    def __init__(self, face_shape: str, frame_type: str, index: int, total: int):
+        self.face_shape = face_shape
+        self.frame_type = frame_type
+        self.index = index
+        self.total = total
+        self.url: Optional[str] = None
+        self.candidates: List = []
+        self.attempts = 0
+        # Encoded source, or the path of its temporary file when it is too large to hold
+        self.data: Optional[Union[bytes, str]] = None
+        self.rendered = None
+        # Set once the frame's outcome is recorded and it has left the pipeline
+        self.retired = False
+
+    @property
+    def relpath(self) -> str:
+        return f"{self.face_shape}/{self.frame_type}.jpg"
+
+
+class PipelineStage:
+    """A pool of worker threads reading from a bounded queue
+
+    A handler returns the job for the next stage, None when the job has ended,
+    or REQUEUED when it sent the job back upstream itself. A handler that
+    raises hands the job to on_error, so it still ends in the failure path.
+    """
+
+    def __init__(self, name: str, workers: int, handler: Callable, queue_size: int,
+                 on_error: Callable[['FrameJob', Exception], None]):
+        self.name = name
+        self.workers = max(1, workers)
+        self.handler = handler
+        self.on_error = on_error
+        # Unbounded underneath: the bound is the slots semaphore, which requeue() bypasses
+        self.queue: queue.Queue = queue.Queue()
+        self.slots = threading.Semaphore(queue_size)
+        self.next_stage: Optional['PipelineStage'] = None
+        self.threads: List[threading.Thread] = []
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.dropped = 0
+        self.requeued = 0
+        self.busy_seconds = 0.0
+        self.peak_depth = 0
+
+    def start(self):
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"pipeline-{self.name}-{number}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def put(self, item):
+        """Queue an item from upstream, waiting while the stage is full"""
+        self.slots.acquire()
+        self._enqueue(item, True)
+
+    def requeue(self, item):
+        """Queue an item sent back from a downstream stage without waiting
+
+        Blocking here could deadlock: this stage's workers may themselves be
+        waiting for room downstream.
+        """
+        self._enqueue(item, False)
+
+    def stop(self):
+        for _ in range(self.workers):
+            self.queue.put((STOP, False))
+
+    def _enqueue(self, item, holds_slot: bool):
+        self.queue.put((item, holds_slot))
+        depth = self.queue.qsize()
+        if depth > self.peak_depth:
+            self.peak_depth = depth
+
+    def _run(self):
+        while True:
+            job, holds_slot = self.queue.get()
+            if holds_slot:
+                self.slots.release()
+            if job is STOP:
+                break
+
+            started = time.perf_counter()
+            try:
+                result = self.handler(job)
+            except Exception as e:
+                print(f"❌ Pipeline stage {self.name} failed: {e}")
+                self.on_error(job, e)
+                result = None
+            elapsed = time.perf_counter() - started
+
+            with self.lock:
+                self.busy_seconds += elapsed
+                if result is REQUEUED:
+                    self.requeued += 1
+                elif result is None:
+                    self.dropped += 1
+                else:
+                    self.processed += 1
+
+            if result is not None and result is not REQUEUED and self.next_stage is not None:
+                self.next_stage.put(result)
+
+    def join(self):
+        for thread in self.threads:
+            thread.join()
+
+
+class DownloadPipeline:
+    """Staged, queue-connected variant of download_all_images"""
+
+    def __init__(self, downloader, search_workers: Optional[int] = None,
+                 fetch_workers: Optional[int] = None, render_workers: Optional[int] = None,
+                 queue_size: int = 16, report_interval: float = 10.0):
+        self.downloader = downloader
+        concurrency = downloader.concurrency
+        self.render_workers = render_workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.report_interval = report_interval
+        self.successes = 0
+        self.success_lock = threading.Lock()
+        self.executor: Optional[ProcessPoolExecutor] = None
+        # Jobs not yet retired; the stages are stopped once it drops to zero
+        self.in_flight = 0
+        self.idle = threading.Condition()
+
+        self.stages = [
+            PipelineStage('search', search_workers or concurrency, self._profiled('search', self.search),
+                          queue_size, self._abort),
+            PipelineStage('fetch', fetch_workers or concurrency, self._profiled('fetch', self.fetch),
+                          queue_size, self._abort),
+            PipelineStage('render', self.render_workers, self._profiled('render', self.render),
+                          queue_size, self._abort),
+            PipelineStage('write', 1, self._profiled('write', self.write), queue_size, self._abort),
+        ]
+        for stage, next_stage in zip(self.stages, self.stages[1:]):
+            stage.next_stage = next_stage
+        self.fetch_stage = self.stages[1]
+
+    def _profiled(self, name: str, handler: Callable) -> Callable:
+        """Wrap a stage handler in a profiling span; the handler itself unless --profile is on"""
+        metrics = self.downloader.metrics
+        if metrics.profiler is None:
+            return handler
+
+        def run(job: FrameJob):
+            with metrics.profile(f"pipeline-{name}", job.relpath):
+                return handler(job)
+        return run
+
+    def _retire(self, job: FrameJob):
+        if job.retired:
+            return
+        job.retired = True
+        with self.idle:
+            self.in_flight -= 1
+            self.idle.notify_all()
+
+    def _finish(self, job: FrameJob, success: bool):
+        try:
+            self.downloader.finish_frame(job.face_shape, job.frame_type, job.url, success)
+            if success:
+                with self.success_lock:
+                    self.successes += 1
+        finally:
+            self._retire(job)
+
+    def _fail(self, job: FrameJob, error: Exception):
+        self.downloader.handle_download_error(job.url, job.relpath, error)
+        self._finish(job, False)
+
+    def _abort(self, job: FrameJob, error: Exception):
+        """End a job whose stage raised: free its reservations and record the frame as failed"""
+        if job.retired:
+            return
+        try:
+            if isinstance(job.data, str) and os.path.exists(job.data):
+                os.remove(job.data)
+            job.data = None
+            self.downloader.release_quota_reservation(job.relpath)
+            if job.url:
+                self._finish(job, False)
+            else:
+                self.downloader.manifest.record_frame_failure(job.relpath, job.face_shape, job.frame_type,
+                                                              f"{type(error).__name__}: {error}")
+        finally:
+            self._retire(job)
+
+    def search(self, job: FrameJob) -> Optional[FrameJob]:
+        try:
+            if not self.downloader.start_frame(job.face_shape, job.frame_type, job.index, job.total):
+                with self.success_lock:
+                    self.successes += 1
+                self._retire(job)
+                return None
+        except QuotaExhausted:
+            self._retire(job)
+            return None
+        job.candidates = self.downloader.rank_candidates(job.face_shape, job.frame_type)
+        job.url = self.downloader.reserve_next_candidate(job.candidates)
+        if not job.url:
+            self._finish(job, False)
+            return None
+        return job
+
+    def _next_candidate(self, job: FrameJob) -> bool:
+        """Fall back to the next ranked candidate without searching again"""
+        self.downloader.release_url(job.url)
+        next_url = None
+        if job.attempts < self.downloader.candidates_per_frame:
+            next_url = self.downloader.reserve_next_candidate(job.candidates)
+        if not next_url:
+            self._finish(job, False)
+            return False
+        print(f"🔁 Trying candidate {job.attempts + 1}/{self.downloader.candidates_per_frame}")
+        job.url = next_url
+        return True
+
+    def _retry(self, job: FrameJob):
+        """Send the job's next candidate back to the fetch stage, or end the frame if none is left"""
+        job.data = None
+        job.rendered = None
+        if not self._next_candidate(job):
+            return None
+        self.fetch_stage.requeue(job)
+        return REQUEUED
+
+    def fetch(self, job: FrameJob) -> Optional[FrameJob]:
+        while True:
+            job.attempts += 1
+            try:
+                job.data = self.downloader.fetch_image_body(job.url)
+                return job
+            except Exception as e:
+                self.downloader.handle_download_error(job.url, job.relpath, e)
+            if not self._next_candidate(job):
+                return None
+
+    def render(self, job: FrameJob) -> Optional[FrameJob]:
+        spooled = job.data if isinstance(job.data, str) else None
+        try:
+            future = self.executor.submit(
+                render_frame_file if spooled else render_frame_bytes, job.data,
+                self.downloader.resize_mode, self.downloader.encoder_options,
+                self.downloader.hash_index.hash_size, self.downloader.product_check
+            )
+            job.data = None
+            job.rendered = future.result()
+        except DECODE_ERRORS as e:
+            # Not a usable product shot, or not an image at all: the next candidate is fetched
+            # by the fetch stage so fetching never runs on a render worker
+            self.downloader.handle_download_error(job.url, job.relpath, e)
+            return self._retry(job)
+        except Exception as e:
+            # The pool failed (e.g. BrokenProcessPool), not the image: keep the URL retryable
+            print(f"❌ Rendering {job.relpath} failed: {e}")
+            self.downloader.reject_url(job.url, job.relpath, f"render failed: {type(e).__name__}", permanent=False)
+            self._finish(job, False)
+            return None
+        finally:
+            if spooled:
+                os.remove(spooled)
+        self.downloader.record_render_timings(job.rendered)
+        return job
+
+    def write(self, job: FrameJob) -> Optional[FrameJob]:
+        filepath = self.downloader.frame_filepath(job.face_shape, job.frame_type)
+        try:
+            success = self.downloader.commit_frame(job.url, filepath, job.rendered)
+        except Exception as e:
+            self._fail(job, e)
+            return None
+        if success:
+            self._finish(job, True)
+            return job
+        # A (near-)duplicate falls back to the next candidate like the serial engine
+        return self._retry(job)
+
+    def stats(self, elapsed: float) -> List[Dict]:
+        """Per-stage counters, queue depth, utilization and throughput"""
+        rows = []
+        for stage in self.stages:
+            with stage.lock:
+                completed = stage.processed + stage.dropped
+                rows.append({
+                    'stage': stage.name,
+                    'workers': stage.workers,
+                    'queue_depth': stage.queue.qsize(),
+                    'peak_queue_depth': stage.peak_depth,
+                    'processed': stage.processed,
+                    'dropped': stage.dropped,
+                    'requeued': stage.requeued,
+                    'busy_seconds': stage.busy_seconds,
+                    'utilization': stage.busy_seconds / (elapsed * stage.workers) if elapsed else 0.0,
+                    'throughput_per_second': completed / elapsed if elapsed else 0.0,
+                })
+        return rows
+
+    def _report_loop(self, started: float, done: threading.Event):
+        while not done.wait(self.report_interval):
+            depths = ', '.join(
+                f"{row['stage']} q={row['queue_depth']} {row['throughput_per_second']:.2f}/s"
+                for row in self.stats(time.perf_counter() - started)
+            )
+            print(f"📈 Pipeline: {depths}")
+
+    def print_stats(self, elapsed: float):
+        print(f"\n📈 PIPELINE STAGES ({elapsed:.1f}s)")
+        print(f"{'stage':8} {'workers':>7} {'done':>5} {'dropped':>7} {'back':>5} {'busy s':>7} {'util':>5} "
+              f"{'items/s':>8} {'peak q':>6}")
+        for row in self.stats(elapsed):
+            print(f"{row['stage']:8} {row['workers']:7d} {row['processed']:5d} {row['dropped']:7d} {row['requeued']:5d} "
+                  f"{row['busy_seconds']:7.1f} {row['utilization']:5.0%} "
+                  f"{row['throughput_per_second']:8.2f} {row['peak_queue_depth']:6d}")
+
+    def run(self, frames: List[Tuple[str, str]]) -> int:
+        """Push all frames through the pipeline and return the number of successful frames"""
+        total = len(frames)
+        started = time.perf_counter()
+        done = threading.Event()
+        reporter = threading.Thread(target=self._report_loop, args=(started, done), daemon=True)
+
+        with ProcessPoolExecutor(max_workers=self.render_workers) as executor:
+            self.executor = executor
+            for stage in self.stages:
+                stage.start()
+            reporter.start()
+
+            # Jobs can travel back upstream, so a stage only stops once every job has left
+            with self.idle:
+                self.in_flight = total
+            first = self.stages[0]
+            for index, (face_shape, frame_type) in enumerate(frames, start=1):
+                first.put(FrameJob(face_shape, frame_type, index, total))
+            with self.idle:
+                while self.in_flight:
+                    self.idle.wait()
+
+            for stage in self.stages:
+                stage.stop()
+            for stage in self.stages:
+                stage.join()
+            done.set()
+
+        self.print_stats(time.perf_counter() - started)
+        return self.successes
@@ -0,0 +1,250 @@
+"""
+Opt-in per-stage profiling for the glasses downloader.
+
+With --profile, every stage the downloader already times (search, plan, fetch,
+decode, write, frame), the render step and each pipeline stage run inside a
+profiling span:
+- cProfile: one profiler per thread and stage; a nested stage pauses its
+  parent's profiler, so each stage's stats hold only its own work. Merged per
+  stage into <stage>.pstats (python -m pstats, snakeviz)
+- a sampler thread records the call stacks of threads inside a span every
+  few milliseconds, prefixed with the open stages, as stacks.collapsed for
+  flamegraph.pl / speedscope; unlike cProfile it also shows where time goes
+  waiting (sleeps, sockets, futures)
+- tracemalloc: the allocation peak of every span, so each stage and each frame
+  gets a peak allocation, and the run's top allocation sites compared to the
+  start of the run in allocations.txt
+The slowest frames and their peaks are listed in report.txt and printed.
+
+Peaks are exact for the serial engine; spans that overlap on other threads
+share tracemalloc's global peak, so concurrent engines report upper bounds.
+Work in render processes (pipeline render stage, ingest) is not profiled.
+On Python 3.12+ only one cProfile profiler can be active at a time; spans
+that start while another thread is being profiled skip cProfile (counted in
+the report) but are still sampled and traced.
+
+Without --profile none of this is imported: Metrics hands out the same
+no-op timers as before.
+"""
+
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+# Traceback depth kept by tracemalloc for the allocation report
+TRACE_FRAMES = 10
+
+SAMPLE_INTERVAL = 0.005
+
+
+class ProfileSpan:
+    """One profiled stage on one thread; also reports its duration to Metrics when timed"""
+
+    __slots__ = ('profiler', 'stage', 'item', 'metrics', 'labels', 'profile', 'parent',
+                 'started', 'start_memory', 'peak_memory')
+
+    def __init__(self, profiler: 'StageProfiler', stage: str, item: Optional[str] = None,
+                 metrics=None, labels: Optional[Dict[str, str]] = None):
+        self.profiler = profiler
+        self.stage = stage
+        self.item = item
+        self.metrics = metrics
+        self.labels = labels or {}
+        self.profile: Optional[cProfile.Profile] = None
+        self.parent: Optional['ProfileSpan'] = None
+
+    def __enter__(self):
+        self.profiler.enter(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = self.profiler.exit(self)
+        if self.metrics is not None:
+            self.metrics.observe(self.stage, seconds, **self.labels)
+        return False
+
+
+class StageProfiler:
+    """Collects cProfile stats, sampled stacks and tracemalloc peaks per stage for one run"""
+
+    def __init__(self, output_dir: str, top: int = 10, sample_interval: float = SAMPLE_INTERVAL):
+        self.output_dir = output_dir
+        self.top = top
+        self.sample_interval = sample_interval
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        # thread id -> innermost open span, read by the sampler
+        self.current: Dict[int, ProfileSpan] = {}
+        self.open_spans: List[ProfileSpan] = []
+        # stage -> the per-thread profilers that ran it
+        self.profiles: Dict[str, List[cProfile.Profile]] = defaultdict(list)
+        self.stacks: Counter = Counter()
+        # stage -> [spans, seconds, peak bytes]
+        self.stages: Dict[str, list] = {}
+        # item -> [seconds, peak bytes]
+        self.items: Dict[str, list] = {}
+        self.skipped_profiles = 0
+        self.started = time.perf_counter()
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+        self.baseline = tracemalloc.take_snapshot()
+        self.stopped = threading.Event()
+        self.sampler = threading.Thread(target=self._sample_loop, name='glasses-profile-sampler', daemon=True)
+        self.sampler.start()
+
+    def span(self, stage: str, item: Optional[str] = None, metrics=None, **labels) -> ProfileSpan:
+        return ProfileSpan(self, stage, item, metrics, labels)
+
+    def _thread_profile(self, stage: str) -> cProfile.Profile:
+        profiles = getattr(self.local, 'profiles', None)
+        if profiles is None:
+            profiles = self.local.profiles = {}
+        profile = profiles.get(stage)
+        if profile is None:
+            profile = profiles[stage] = cProfile.Profile()
+            with self.lock:
+                self.profiles[stage].append(profile)
+        return profile
+
+    def _fold_peak(self):
+        """Credit tracemalloc's peak since the last boundary to every open span, then reset it"""
+        _, peak = tracemalloc.get_traced_memory()
+        for span in self.open_spans:
+            if peak > span.peak_memory:
+                span.peak_memory = peak
+        tracemalloc.reset_peak()
+
+    def enter(self, span: ProfileSpan):
+        thread_id = threading.get_ident()
+        span.parent = self.current.get(thread_id)
+        if span.parent is not None and span.parent.profile is not None:
+            span.parent.profile.disable()
+        with self.lock:
+            self._fold_peak()
+            span.start_memory = span.peak_memory = tracemalloc.get_traced_memory()[0]
+            self.open_spans.append(span)
+            self.current[thread_id] = span
+        span.started = time.perf_counter()
+        profile = self._thread_profile(span.stage)
+        try:
+            profile.enable()
+            span.profile = profile
+        except ValueError:
+            # Another thread's profiler is active (Python 3.12+ allows one at a time)
+            with self.lock:
+                self.skipped_profiles += 1
+
+    def exit(self, span: ProfileSpan) -> float:
+        if span.profile is not None:
+            span.profile.disable()
+        seconds = time.perf_counter() - span.started
+        thread_id = threading.get_ident()
+        with self.lock:
+            self._fold_peak()
+            self.open_spans.remove(span)
+            if span.parent is None:
+                self.current.pop(thread_id, None)
+            else:
+                self.current[thread_id] = span.parent
+            peak = span.peak_memory - span.start_memory
+            stage = self.stages.setdefault(span.stage, [0, 0.0, 0])
+            stage[0] += 1
+            stage[1] += seconds
+            stage[2] = max(stage[2], peak)
+            if span.item is not None:
+                item = self.items.setdefault(span.item, [0.0, 0])
+                item[0] += seconds
+                item[1] = max(item[1], peak)
+        if span.parent is not None and span.parent.profile is not None:
+            try:
+                span.parent.profile.enable()
+            except ValueError:
+                span.parent.profile = None
+        return seconds
+
+    def _sample_loop(self):
+        while not self.stopped.wait(self.sample_interval):
+            frames = sys._current_frames()
+            with self.lock:
+                current = dict(self.current)
+            for thread_id, span in current.items():
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                calls = []
+                while frame is not None:
+                    code = frame.f_code
+                    calls.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stages = []
+                while span is not None:
+                    stages.append(f"[{span.stage}]")
+                    span = span.parent
+                self.stacks[';'.join(stages[::-1] + calls[::-1])] += 1
+
+    def close(self) -> Dict[str, str]:
+        """Stop sampling and tracing, write all reports and return their paths"""
+        self.stopped.set()
+        self.sampler.join()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        os.makedirs(self.output_dir, exist_ok=True)
+        paths = {}
+
+        for stage, profiles in sorted(self.profiles.items()):
+            profiles = [profile for profile in profiles if profile.getstats()]
+            if not profiles:
+                continue
+            stats = pstats.Stats(profiles[0])
+            for profile in profiles[1:]:
+                stats.add(profile)
+            paths[stage] = os.path.join(self.output_dir, f"{stage}.pstats")
+            stats.dump_stats(paths[stage])
+
+        paths['stacks'] = os.path.join(self.output_dir, 'stacks.collapsed')
+        with open(paths['stacks'], 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+
+        paths['allocations'] = os.path.join(self.output_dir, 'allocations.txt')
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        growth = snapshot.filter_traces(ignore).compare_to(self.baseline.filter_traces(ignore), 'lineno')
+        with open(paths['allocations'], 'w', encoding='utf-8') as f:
+            f.write(f"Top {self.top} allocation sites by growth over the run\n")
+            for stat in growth[:self.top]:
+                f.write(f"{stat}\n")
+            f.write(f"\nTop {self.top} allocation tracebacks still held at the end of the run\n")
+            for stat in snapshot.filter_traces(ignore).statistics('traceback')[:self.top]:
+                f.write(f"\n{stat.size / 1024:.1f} KiB in {stat.count} blocks\n")
+                f.write('\n'.join(stat.traceback.format()) + '\n')
+
+        paths['report'] = os.path.join(self.output_dir, 'report.txt')
+        with open(paths['report'], 'w', encoding='utf-8') as f:
+            f.write('\n'.join(self.report_lines()) + '\n')
+        return paths
+
+    def report_lines(self) -> List[str]:
+        lines = ['Stages (wall time including nested stages; each .pstats holds only its own stage)']
+        for stage, (spans, seconds, peak) in sorted(self.stages.items(), key=lambda item: -item[1][1]):
+            lines.append(f"  {stage:20} {spans:6d} spans {seconds:8.2f}s  peak {peak / 1024 / 1024:8.2f} MiB")
+        lines.append(f"Slowest {self.top} frames")
+        slowest = sorted(self.items.items(), key=lambda item: -item[1][0])[:self.top]
+        for item, (seconds, peak) in slowest:
+            lines.append(f"  {item:40} {seconds:8.2f}s  peak {peak / 1024 / 1024:8.2f} MiB")
+        if self.skipped_profiles:
+            lines.append(f"{self.skipped_profiles} spans ran while another thread held the profiler "
+                         f"and are missing from the pstats (use --engine serial for complete stats)")
+        return lines
+
+    def print_report(self, paths: Dict[str, str]):
+        print("\n🔬 PROFILE")
+        for line in self.report_lines():
+            print(f"   {line}")
+        print(f"   Written to {self.output_dir}: {', '.join(os.path.basename(path) for path in paths.values())}")
@@ -0,0 +1,340 @@
+"""
+Perceptual-quality-targeted JPEG encoding for frame images.
+
+A fixed quality 95 spends far more bytes than a flat white-background product
+shot needs. With a target SSIM, each frame is encoded at the lowest quality
+whose decoded result still scores at least the target against the 800x800
+master:
+- the master is converted to YCbCr once and its per-window statistics are
+  kept; every probe encodes, decodes and compares with NumPy only
+- SSIM is computed over 8x8 windows at a stride of 4 (sums of 4x4 blocks),
+  per channel, weighted 0.8 luma / 0.1 per chroma channel
+- windows of flat white background are left out of the mean, otherwise the
+  background (a perfect match at any quality) would hide damage to the glasses
+- the quality is binary-searched between --min-quality and --jpeg-quality;
+  the first probe is the maximum quality, i.e. what the fixed setting writes,
+  so the bytes saved are known for every frame
+
+Frames are rendered through this on whatever pool already renders them (the
+pipeline engine's render processes, ingest). `glasses_downloader.py reencode
+--target-ssim` does the same for frames already on disk, on a process pool,
+measured against the frame as it is now, and reports the bytes saved per face
+shape. A file is only rewritten when it gets smaller, and frames that were
+already encoded below the maximum quality are skipped, so repeated passes never
+compound the loss.
+"""
+
+import hashlib
+import io
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from phash_index import HASH_SIZE, format_hash, perceptual_hash
+
+DEFAULT_TARGET_SSIM = 0.985
+DEFAULT_MIN_QUALITY = 60
+
+WINDOW_BLOCK = 4
+CHANNEL_WEIGHTS = (0.8, 0.1, 0.1)
+# Windows whose master luma is at least this bright and this flat are background
+BACKGROUND_LUMA = 250
+BACKGROUND_VARIANCE = 4.0
+
+# SSIM stabilizers for 8-bit data
+C1 = (0.01 * 255) ** 2
+C2 = (0.03 * 255) ** 2
+
+# libjpeg's base luminance table (natural order), scaled by the quality setting
+STANDARD_LUMA_TABLE = (
+    16, 11, 10, 16, 24, 40, 51, 61,
+    12, 12, 14, 19, 26, 58, 60, 55,
+    14, 13, 16, 24, 40, 57, 69, 56,
+    14, 17, 22, 29, 51, 87, 80, 62,
+    18, 22, 37, 56, 68, 109, 103, 77,
+    24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101,
+    72, 92, 95, 98, 112, 100, 103, 99,
+)
+
+
+def window_sums(channels: np.ndarray) -> np.ndarray:
+    """Sums over 8x8 windows at a stride of 4 for each (H, W, C) channel"""
+    height = channels.shape[0] // WINDOW_BLOCK * WINDOW_BLOCK
+    width = channels.shape[1] // WINDOW_BLOCK * WINDOW_BLOCK
+    blocks = np.add.reduceat(channels[:height, :width], np.arange(0, height, WINDOW_BLOCK), axis=0)
+    blocks = np.add.reduceat(blocks, np.arange(0, width, WINDOW_BLOCK), axis=1)
+    return blocks[:-1, :-1] + blocks[1:, :-1] + blocks[:-1, 1:] + blocks[1:, 1:]
+
+
+def to_ycbcr(image: Image.Image) -> np.ndarray:
+    # float32 keeps window variances accurate to well below C2
+    return np.asarray(image.convert('YCbCr'), dtype=np.float32)
+
+
+class SSIMReference:
+    """A master image's window statistics, compared against many encodings of it
+
+    Only the bounding box of the foreground windows is kept, so probes of a
+    product on a wide white canvas compare a fraction of the pixels.
+    """
+
+    def __init__(self, image: Image.Image):
+        pixels = to_ycbcr(image)
+        self.count = (2 * WINDOW_BLOCK) ** 2
+        mean = window_sums(pixels) / self.count
+        variance = window_sums(pixels ** 2) / self.count - mean ** 2
+        mask = ~((mean[..., 0] >= BACKGROUND_LUMA) & (variance[..., 0] <= BACKGROUND_VARIANCE))
+        if not mask.any():
+            # All background: score every window
+            mask[...] = True
+
+        rows, columns = np.nonzero(mask.any(axis=1))[0], np.nonzero(mask.any(axis=0))[0]
+        top, bottom, left, right = rows[0], rows[-1] + 1, columns[0], columns[-1] + 1
+        # Window (i, j) covers pixels [4i, 4i + 8) in each direction
+        self.crop = (slice(top * WINDOW_BLOCK, (bottom + 1) * WINDOW_BLOCK),
+                     slice(left * WINDOW_BLOCK, (right + 1) * WINDOW_BLOCK))
+        self.pixels = pixels[self.crop]
+        self.mean = mean[top:bottom, left:right]
+        self.variance = variance[top:bottom, left:right]
+        self.mask = mask[top:bottom, left:right]
+
+    def score(self, image: Image.Image) -> float:
+        """Weighted mean SSIM of an encoding over the master's foreground windows"""
+        pixels = to_ycbcr(image)[self.crop]
+        mean = window_sums(pixels) / self.count
+        variance = window_sums(pixels ** 2) / self.count - mean ** 2
+        covariance = window_sums(self.pixels * pixels) / self.count - self.mean * mean
+        ssim = ((2 * self.mean * mean + C1) * (2 * covariance + C2)) / (
+            (self.mean ** 2 + mean ** 2 + C1) * (self.variance + variance + C2)
+        )
+        return float(np.dot(ssim[self.mask].mean(axis=0), CHANNEL_WEIGHTS))
+
+
+class EncodedFrame:
+    """The chosen encoding, its quality and SSIM, and the size at the maximum quality"""
+
+    def __init__(self, data: bytes, quality: int, score: float, baseline_bytes: int):
+        self.data = data
+        self.quality = quality
+        self.score = score
+        self.baseline_bytes = baseline_bytes
+
+
+def encode_to_target(image: Image.Image, target: float = DEFAULT_TARGET_SSIM,
+                     min_quality: int = DEFAULT_MIN_QUALITY, max_quality: int = 95,
+                     options: Optional[Dict] = None, image_format: str = 'JPEG') -> EncodedFrame:
+    """Encode at the lowest quality in [min_quality, max_quality] whose SSIM meets target
+
+    SSIM rises with quality, so a binary search needs about log2(range) probes.
+    If even max_quality misses the target, the max_quality encoding is used.
+    """
+    options = dict(options or {})
+    options.pop('quality', None)
+    reference = SSIMReference(image)
+
+    def probe(quality: int) -> Tuple[bytes, float]:
+        buffer = io.BytesIO()
+        image.save(buffer, image_format, quality=quality, **options)
+        data = buffer.getvalue()
+        with Image.open(io.BytesIO(data)) as decoded:
+            return data, reference.score(decoded)
+
+    best_data, best_score = probe(max_quality)
+    best = EncodedFrame(best_data, max_quality, best_score, len(best_data))
+    if best_score < target:
+        return best
+
+    low, high = min_quality, max_quality - 1
+    while low <= high:
+        quality = (low + high) // 2
+        data, score = probe(quality)
+        if score >= target:
+            if len(data) < len(best.data):
+                best.data, best.quality, best.score = data, quality, score
+            high = quality - 1
+        else:
+            low = quality + 1
+    return best
+
+
+def jpeg_quality(image: Image.Image) -> Optional[int]:
+    """The libjpeg quality setting a JPEG was saved with, or None for other encoders"""
+    tables = getattr(image, 'quantization', None)
+    if not tables or 0 not in tables or len(tables[0]) != 64:
+        return None
+    luma = list(tables[0])
+    for quality in range(100, 0, -1):
+        scale = 5000 // quality if quality < 50 else 200 - quality * 2
+        if luma == [min(255, max(1, (value * scale + 50) // 100)) for value in STANDARD_LUMA_TABLE]:
+            return quality
+    return None
+
+
+def reencode_frame(base_path: str, relpath: str, target: float, min_quality: int, max_quality: int,
+                   options: Dict, hash_size: int = HASH_SIZE) -> Dict:
+    """Re-encode one frame file against its current pixels (runs in a worker process)"""
+    with open(os.path.join(base_path, relpath), 'rb') as f:
+        original = f.read()
+    result = {'relpath': relpath, 'bytes': len(original), 'sha256': hashlib.sha256(original).hexdigest()}
+    try:
+        with Image.open(io.BytesIO(original)) as image:
+            if image.format != 'JPEG':
+                result['skipped'] = f"not a JPEG ({image.format})"
+                return result
+            quality = jpeg_quality(image)
+            if quality is not None and quality < max_quality:
+                result['skipped'] = 'already optimized'
+                result['quality'] = quality
+                return result
+            master = image.convert('RGB')
+    except OSError:
+        result['skipped'] = 'undecodable'
+        return result
+
+    encoded = encode_to_target(master, target, min_quality, max_quality, options)
+    result['quality'] = encoded.quality
+    result['score'] = encoded.score
+    if len(encoded.data) < len(original) and encoded.quality < max_quality:
+        result['data'] = encoded.data
+        # The duplicate index must hash what is on disk after the rewrite
+        result['image_hash'] = format_hash(perceptual_hash(encoded.data, hash_size), hash_size)
+    else:
+        result['skipped'] = 'no smaller encoding'
+    return result
+
+
+class ShapeSavings:
+    """Bytes before and after quality targeting for one face shape"""
+
+    def __init__(self):
+        self.frames = 0
+        self.encoded = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+        self.qualities: List[int] = []
+
+    def add(self, bytes_before: int, bytes_after: int, quality: Optional[int] = None):
+        self.frames += 1
+        self.bytes_before += bytes_before
+        self.bytes_after += bytes_after
+        if quality is not None and bytes_after < bytes_before:
+            self.encoded += 1
+            self.qualities.append(quality)
+
+
+def print_savings_report(savings: Dict[str, ShapeSavings], title: str = 'QUALITY TARGETING'):
+    """Bytes saved per face shape and overall"""
+    if not savings:
+        return
+    print(f"\n🗜️  {title}")
+    total = ShapeSavings()
+    for face_shape, shape in sorted(savings.items()):
+        saved = shape.bytes_before - shape.bytes_after
+        percent = 100 * saved / shape.bytes_before if shape.bytes_before else 0.0
+        median = f"median q{sorted(shape.qualities)[len(shape.qualities) // 2]}" if shape.qualities else '-'
+        print(f"   {face_shape:10} {shape.encoded:4d}/{shape.frames:<4d} frames smaller  "
+              f"{shape.bytes_before / 1024:9.1f} KB -> {shape.bytes_after / 1024:9.1f} KB  "
+              f"saved {saved / 1024:8.1f} KB ({percent:4.1f}%)  {median}")
+        total.frames += shape.frames
+        total.encoded += shape.encoded
+        total.bytes_before += shape.bytes_before
+        total.bytes_after += shape.bytes_after
+    saved = total.bytes_before - total.bytes_after
+    percent = 100 * saved / total.bytes_before if total.bytes_before else 0.0
+    print(f"   {'total':10} {total.encoded:4d}/{total.frames:<4d} frames smaller  "
+          f"{total.bytes_before / 1024:9.1f} KB -> {total.bytes_after / 1024:9.1f} KB  "
+          f"saved {saved / 1024:8.1f} KB ({percent:4.1f}%)")
+
+
+class FrameReencoder:
+    """Re-encode existing frames at their target quality on a process pool"""
+
+    def __init__(self, downloader, target: float = DEFAULT_TARGET_SSIM,
+                 min_quality: int = DEFAULT_MIN_QUALITY, workers: Optional[int] = None):
+        self.downloader = downloader
+        self.target = target
+        self.min_quality = min_quality
+        self.workers = workers or os.cpu_count() or 1
+
+    def frame_relpaths(self, face_shapes: Iterable[str]) -> List[str]:
+        relpaths = []
+        for face_shape in face_shapes:
+            shape_path = os.path.join(self.downloader.base_path, face_shape)
+            if os.path.isdir(shape_path):
+                relpaths.extend(f"{face_shape}/{filename}" for filename in sorted(os.listdir(shape_path))
+                                if filename.lower().endswith('.jpg'))
+        return relpaths
+
+    def write(self, relpath: str, result: Dict) -> bool:
+        """Atomically replace a frame unless it changed while it was being re-encoded"""
+        downloader = self.downloader
+        filepath = os.path.join(downloader.base_path, relpath)
+        with open(filepath, 'rb') as f:
+            if hashlib.sha256(f.read()).hexdigest() != result['sha256']:
+                return False
+        tmp_path = f"{filepath}.part"
+        with downloader.metrics.timer('write'):
+            with open(tmp_path, 'wb') as f:
+                f.write(result['data'])
+            os.replace(tmp_path, filepath)
+        with downloader.dedup_lock:
+            downloader.hash_index.add(result['image_hash'], relpath)
+        downloader.hash_index.record_file(relpath, filepath)
+        downloader.manifest.record_output_hashes({relpath: hashlib.sha256(result['data']).hexdigest()})
+        with downloader.dedup_lock:
+            downloader.written_relpaths.append(relpath)
+        return True
+
+    def run(self) -> Dict:
+        """Re-encode every frame and return per-shape savings, skip reasons and timing"""
+        downloader = self.downloader
+        max_quality = downloader.encoder_options.get('quality', 95)
+        options = {key: value for key, value in downloader.encoder_options.items()
+                   if key not in ('quality', 'target_ssim', 'min_quality')}
+        relpaths = self.frame_relpaths(downloader.face_shapes)
+        print(f"🗜️  Re-encoding {len(relpaths)} frames to SSIM >= {self.target} "
+              f"(quality {self.min_quality}-{max_quality}) with {self.workers} workers...")
+
+        started = time.perf_counter()
+        savings: Dict[str, ShapeSavings] = defaultdict(ShapeSavings)
+        skipped: Dict[str, int] = defaultdict(int)
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            results = executor.map(
+                reencode_frame, [downloader.base_path] * len(relpaths), relpaths,
+                [self.target] * len(relpaths), [self.min_quality] * len(relpaths),
+                [max_quality] * len(relpaths), [options] * len(relpaths),
+                [downloader.hash_index.hash_size] * len(relpaths), chunksize=4
+            )
+            for relpath, result in zip(relpaths, results):
+                face_shape = relpath.split('/', 1)[0]
+                if 'data' in result and self.write(relpath, result):
+                    savings[face_shape].add(result['bytes'], len(result['data']), result['quality'])
+                    print(f"✅ {relpath}: {result['bytes'] / 1024:.1f} KB -> {len(result['data']) / 1024:.1f} KB "
+                          f"(q{result['quality']}, SSIM {result['score']:.4f})")
+                else:
+                    savings[face_shape].add(result['bytes'], result['bytes'])
+                    skipped[result.get('skipped', 'changed during re-encode')] += 1
+
+        downloader.hash_index.save()
+        downloader.build_assets()
+        return {
+            'frames': len(relpaths),
+            'savings': dict(savings),
+            'skipped': dict(skipped),
+            'elapsed': time.perf_counter() - started,
+        }
+
+
+def print_reencode_report(report: Dict):
+    for reason, count in sorted(report['skipped'].items(), key=lambda item: (-item[1], item[0])):
+        print(f"   ⏭️  {reason}: {count}")
+    print_savings_report(report['savings'], 'BYTES SAVED PER FACE SHAPE')
+    elapsed = max(report['elapsed'], 1e-9)
+    print(f"✅ Re-encoded {report['frames']} frames in {report['elapsed']:.1f}s "
+          f"({report['frames'] / elapsed:.1f} frames/s)")
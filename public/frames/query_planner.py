@@ -0,0 +1,115 @@
+"""
+Query planner for find_best_image.
+
+The original find_best_image returned the first suitable URL of the first
+query that had one, and otherwise re-ran every query with num=5 for a
+fallback pass, so a single frame could spend six API calls. The planner:
+- runs the frame's queries lazily, in order, stopping as soon as the pool holds
+  enough suitable candidates
+- pages further into results (start=11, 21, ...) only if the first pages did
+  not produce enough candidates and the budget allows it
+- ranks every collected result with a scored priority queue (score, then
+  query order, then search rank)
+- keeps unsuitable results at the end of the ranking as the fallback pool, so
+  fallbacks never trigger new searches
+- caps the number of search calls per frame
+"""
+
+import heapq
+from typing import Callable, Dict, List
+
+PAGE_SIZE = 10
+
+
+class Candidate:
+    """A ranked candidate image URL for a frame"""
+
+    def __init__(self, url: str, score: float, query_index: int, position: int, result: Dict):
+        self.url = url
+        self.score = score
+        self.query_index = query_index
+        self.position = position
+        self.result = result
+
+    @property
+    def suitable(self) -> bool:
+        return self.score > 0
+
+    def sort_key(self):
+        return (-self.score, self.query_index, self.position)
+
+
+class QueryPlan:
+    """Outcome of planning one frame: ranked candidates and the calls spent"""
+
+    def __init__(self, candidates: List[Candidate], search_calls: int):
+        self.candidates = candidates
+        self.search_calls = search_calls
+
+    @property
+    def suitable(self) -> List[Candidate]:
+        return [candidate for candidate in self.candidates if candidate.suitable]
+
+
+class QueryPlanner:
+    """Collects and ranks candidates for a frame within a search-call budget"""
+
+    def __init__(self, search: Callable[..., List[Dict]], score_batch: Callable[[List[Dict]], List[float]],
+                 max_calls_per_frame: int = 3, target_candidates: int = 3, max_pages: int = 2):
+        # search(query, num_results=..., start=...) and score_batch(results) -> scores
+        self.search = search
+        self.score_batch = score_batch
+        self.max_calls_per_frame = max(1, max_calls_per_frame)
+        self.target_candidates = max(1, target_candidates)
+        self.max_pages = max(1, max_pages)
+
+    def plan(self, queries: List[str], is_available: Callable[[str], bool]) -> QueryPlan:
+        """Search until enough available, suitable candidates are found or the budget is spent"""
+        pool: Dict[str, Candidate] = {}
+        exhausted = set()
+        calls = 0
+
+        for page in range(self.max_pages):
+            for query_index, query in enumerate(queries):
+                if calls >= self.max_calls_per_frame or self._enough(pool, is_available):
+                    return QueryPlan(self._rank(pool, is_available), calls)
+                if query_index in exhausted:
+                    continue
+
+                start = page * PAGE_SIZE + 1
+                print(f"🔍 Searching Google Images: {query}" + (f" (start={start})" if page else ""))
+                results = self.search(query, num_results=PAGE_SIZE, start=start)
+                calls += 1
+
+                scores = self.score_batch(results)
+                for position, (result, score) in enumerate(zip(results, scores), start=page * PAGE_SIZE):
+                    url = result.get('url')
+                    if not url:
+                        continue
+                    candidate = Candidate(url, score, query_index, position, result)
+                    existing = pool.get(url)
+                    if existing is None or candidate.sort_key() < existing.sort_key():
+                        pool[url] = candidate
+
+                # A short page means the query has no further results
+                if len(results) < PAGE_SIZE:
+                    exhausted.add(query_index)
+
+        return QueryPlan(self._rank(pool, is_available), calls)
+
+    def _enough(self, pool: Dict[str, Candidate], is_available: Callable[[str], bool]) -> bool:
+        suitable = sum(1 for candidate in pool.values()
+                       if candidate.suitable and is_available(candidate.url))
+        return suitable >= self.target_candidates
+
+    @staticmethod
+    def _rank(pool: Dict[str, Candidate], is_available: Callable[[str], bool]) -> List[Candidate]:
+        """Pop available candidates off a priority queue, best first"""
+        heap = [(candidate.sort_key(), candidate.url) for candidate in pool.values()
+                if is_available(candidate.url)]
+        heapq.heapify(heap)
+        ranked = []
+        while heap:
+            _, url = heapq.heappop(heap)
+            ranked.append(pool[url])
+        return ranked
@@ -0,0 +1,261 @@
+"""
+Daily Custom Search API quota tracking for the glasses downloader.
+
+The free Custom Search tier allows 100 queries per key per day. Without
+tracking, a run only finds out by getting 429s, and every frame after that
+burns its timeouts for nothing. The ledger:
+- counts search calls per API key (stored as a fingerprint, never the key)
+  per UTC day in .downloader/quota.sqlite, shared by every shard of a
+  base path, so separate processes draw from the same budget
+- admits a frame only if its worst case (--search-budget calls, less the
+  pages already in the search cache) still fits in the day's remaining calls,
+  holding that reservation while the frame plans its searches, so a run can
+  never start a search it cannot pay for; reservations are rows of the same
+  database, taken in one write transaction with the check, so shards sharing
+  it cannot spend the same remaining calls twice
+- counts every request sent to the search endpoint, retries included, since
+  each one is billed
+- marks the day exhausted when the API answers 429 anyway (e.g. queries made
+  from another machine); such a 429 is not retried, only per-minute rate
+  limits are
+- keeps the calls spent per planned frame, the expected cost used to size and
+  order the work (see QuotaScheduler)
+
+Frames that do not fit are recorded as deferred in the manifest; the next run
+schedules them first, so a multi-day catalog resumes exactly where the
+previous day stopped.
+"""
+
+import datetime
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+DEFAULT_DAILY_LIMIT = 100
+# A reservation left behind by a crashed process stops counting after this many seconds
+RESERVATION_TTL = 15 * 60
+RESERVATION_POLL = 0.5
+
+# Work priorities, most urgent first
+PRIORITY_MISSING = 0
+PRIORITY_RETRY = 1
+PRIORITY_EXISTS = 2
+
+
+def utc_day(now: Optional[datetime.datetime] = None) -> str:
+    """The quota day a call is counted against, e.g. '2024-05-01'"""
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    return now.strftime('%Y-%m-%d')
+
+
+def key_fingerprint(api_key: str) -> str:
+    """Identify an API key in the ledger without storing the key itself"""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+
+
+def is_daily_limit_response(response) -> bool:
+    """True for a Custom Search 429 that means the day's quota is spent, not a per-minute rate limit
+
+    Unrecognized 429 bodies count as the daily limit, the common case on the free tier.
+    """
+    if response.status_code != 429:
+        return False
+    try:
+        error = response.json().get('error', {})
+    except ValueError:
+        return True
+    reasons = {item.get('reason') for item in error.get('errors', []) if isinstance(item, dict)}
+    message = str(error.get('message', '')).lower()
+    if 'dailyLimitExceeded' in reasons or 'per day' in message:
+        return True
+    return not ('rateLimitExceeded' in reasons or 'userRateLimitExceeded' in reasons or 'per minute' in message)
+
+
+class QuotaExhausted(Exception):
+    """Raised when a frame cannot be admitted within today's remaining search quota"""
+
+
+class QuotaLedger:
+    """Persistent per-key, per-UTC-day count of search calls and of the calls reserved for planning frames"""
+
+    def __init__(self, path: str, api_key: str, daily_limit: int = DEFAULT_DAILY_LIMIT,
+                 clock: Callable[[], str] = utc_day):
+        self.path = path
+        self.key_id = key_fingerprint(api_key)
+        self.daily_limit = daily_limit
+        self.clock = clock
+        # Reservation ids this ledger holds, dropped on close
+        self.reservations: Set[int] = set()
+        self.condition = threading.Condition()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        with self.connection:
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS quota_usage (
+                    key_id TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    calls INTEGER NOT NULL DEFAULT 0,
+                    frames INTEGER NOT NULL DEFAULT 0,
+                    frame_calls INTEGER NOT NULL DEFAULT 0,
+                    exhausted INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (key_id, day)
+                )
+            ''')
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS quota_reservations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    key_id TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    calls INTEGER NOT NULL,
+                    created REAL NOT NULL
+                )
+            ''')
+
+    def _update(self, assignments: str, params: Tuple = ()):
+        self.connection.execute(
+            'INSERT OR IGNORE INTO quota_usage (key_id, day) VALUES (?, ?)', (self.key_id, self.clock())
+        )
+        self.connection.execute(
+            f'UPDATE quota_usage SET {assignments} WHERE key_id = ? AND day = ?',
+            params + (self.key_id, self.clock())
+        )
+
+    def _used(self) -> int:
+        row = self.connection.execute(
+            'SELECT calls, exhausted FROM quota_usage WHERE key_id = ? AND day = ?',
+            (self.key_id, self.clock())
+        ).fetchone()
+        if row is None:
+            return 0
+        calls, exhausted = row
+        return max(calls, self.daily_limit) if exhausted else calls
+
+    def _reserved(self) -> int:
+        """Calls held today by live reservations of every process sharing the ledger"""
+        row = self.connection.execute(
+            'SELECT SUM(calls) FROM quota_reservations WHERE key_id = ? AND day = ? AND created >= ?',
+            (self.key_id, self.clock(), time.time() - RESERVATION_TTL)
+        ).fetchone()
+        return row[0] or 0
+
+    def used(self) -> int:
+        """Calls counted against today's quota, by this process and any other"""
+        with self.condition:
+            return self._used()
+
+    def remaining(self) -> int:
+        """Calls left today that are not held by a planning frame in any process"""
+        with self.condition:
+            return max(0, self.daily_limit - self._used() - self._reserved())
+
+    def admit(self, calls: int) -> Optional[int]:
+        """Reserve calls for one frame, waiting while other frames' reservations may free up
+
+        Returns a reservation id, or None once the calls cannot fit today.
+        Every reservation must be handed back with release(). The check and
+        the reservation share one write transaction, so shards sharing the
+        ledger cannot both take the same remaining calls.
+        """
+        with self.condition:
+            while True:
+                with self.connection:
+                    self.connection.execute('BEGIN IMMEDIATE')
+                    self.connection.execute(
+                        'DELETE FROM quota_reservations WHERE created < ?', (time.time() - RESERVATION_TTL,)
+                    )
+                    reserved = self._reserved()
+                    if self.daily_limit - self._used() - reserved >= calls:
+                        reservation_id = self.connection.execute(
+                            'INSERT INTO quota_reservations (key_id, day, calls, created) VALUES (?, ?, ?, ?)',
+                            (self.key_id, self.clock(), calls, time.time())
+                        ).lastrowid
+                        self.reservations.add(reservation_id)
+                        return reservation_id
+                if not reserved:
+                    return None
+                # Woken by a release in this process; other processes' releases are polled
+                self.condition.wait(RESERVATION_POLL)
+
+    def release(self, reservation_id: int):
+        """Return a frame's reservation; the calls it actually made are already counted"""
+        with self.condition:
+            with self.connection:
+                self.connection.execute('DELETE FROM quota_reservations WHERE id = ?', (reservation_id,))
+            self.reservations.discard(reservation_id)
+            self.condition.notify_all()
+
+    def record_call(self):
+        with self.condition, self.connection:
+            self._update('calls = calls + 1')
+
+    def record_frame(self, calls: int):
+        """Remember the calls one frame's search plan spent, for cost estimates"""
+        with self.condition, self.connection:
+            self._update('frames = frames + 1, frame_calls = frame_calls + ?', (calls,))
+
+    def mark_exhausted(self):
+        """The API refused a call for quota: treat the rest of the day as used up"""
+        with self.condition:
+            with self.connection:
+                self._update('exhausted = 1')
+            self.condition.notify_all()
+
+    def expected_calls_per_frame(self, default: float) -> float:
+        """Mean search calls per planned frame over this key's history"""
+        with self.condition:
+            frames, calls = self.connection.execute(
+                'SELECT SUM(frames), SUM(frame_calls) FROM quota_usage WHERE key_id = ?', (self.key_id,)
+            ).fetchone()
+        return calls / frames if frames else default
+
+    def close(self):
+        with self.condition:
+            with self.connection:
+                self.connection.executemany('DELETE FROM quota_reservations WHERE id = ?',
+                                            [(reservation_id,) for reservation_id in self.reservations])
+            self.reservations.clear()
+            self.connection.close()
+
+
+class WorkItem:
+    """A frame to schedule, with its priority and expected search calls"""
+
+    def __init__(self, face_shape: str, frame_type: str, priority: int, expected_calls: float):
+        self.face_shape = face_shape
+        self.frame_type = frame_type
+        self.priority = priority
+        self.expected_calls = expected_calls
+
+
+class QuotaScheduler:
+    """Orders work by priority and expected cost and estimates how much fits today"""
+
+    def __init__(self, ledger: QuotaLedger):
+        self.ledger = ledger
+
+    def order(self, items: List[WorkItem]) -> List[WorkItem]:
+        """Most urgent first, then cheapest first so the budget finishes the most frames
+
+        The sort is stable, so equally urgent and expensive frames keep catalog order.
+        """
+        return sorted(items, key=lambda item: (item.priority, item.expected_calls))
+
+    def estimate(self, items: List[WorkItem]) -> Dict[str, float]:
+        """Expected calls for the pending work and how many of its frames today's quota covers"""
+        remaining = self.ledger.remaining()
+        pending = [item for item in items if item.priority != PRIORITY_EXISTS]
+        expected = 0.0
+        fits = 0
+        for item in pending:
+            expected += item.expected_calls
+            if expected <= remaining:
+                fits += 1
+        return {'remaining': remaining, 'pending': len(pending), 'expected_calls': expected, 'fits': fits}
@@ -0,0 +1,144 @@
+"""
+Rate limiting helpers for the glasses downloader.
+
+The Custom Search API is paced with a token bucket instead of fixed sleeps, so
+the serial and async engines share the same request budget logic. Image hosts
+get an adaptive concurrency limit and a circuit breaker each (see
+http_session.py).
+"""
+
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """Thread-safe token bucket used to pace Custom Search API calls"""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        # rate is tokens per second; a rate of 0 or less disables limiting
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Block until enough tokens are available, returning the time waited"""
+        if self.rate <= 0:
+            return 0.0
+
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return waited
+                delay = (tokens - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class AdaptiveLimit:
+    """Concurrency limit that grows additively on success and halves on throttling (AIMD)"""
+
+    def __init__(self, initial: int = 2, maximum: int = 8):
+        self.maximum = max(1, maximum)
+        self.limit = max(1, min(initial, self.maximum))
+        self.in_flight = 0
+        self.successes = 0
+        # Requests wait here until a slot frees up or blocked_until has passed
+        self.blocked_until = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self) -> float:
+        """Block until a slot is free and any Retry-After pause is over, returning the time waited"""
+        started = time.monotonic()
+        with self.condition:
+            while True:
+                pause = self.blocked_until - time.monotonic()
+                if pause > 0:
+                    self.condition.wait(pause)
+                elif self.in_flight >= self.limit:
+                    self.condition.wait()
+                else:
+                    self.in_flight += 1
+                    return time.monotonic() - started
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify()
+
+    def record_success(self):
+        with self.condition:
+            self.successes += 1
+            # One more slot per window of successful requests at the current limit
+            if self.successes >= self.limit and self.limit < self.maximum:
+                self.limit += 1
+                self.successes = 0
+                self.condition.notify()
+
+    def record_throttle(self, retry_after: float = 0.0):
+        """Halve the limit and, given a Retry-After, pause every request to this host"""
+        with self.condition:
+            self.limit = max(1, self.limit // 2)
+            self.successes = 0
+            if retry_after > 0:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+
+class CircuitBreaker:
+    """Stops requests to a host after consecutive failures, probing again after a cooldown
+
+    closed: requests pass; open: requests are refused until the cooldown ends;
+    half-open: a single probe request passes and its outcome closes or reopens
+    the circuit.
+    """
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 60.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        with self.lock:
+            return self.opened_at is not None and time.monotonic() - self.opened_at < self.cooldown
+
+    def allow(self) -> bool:
+        """Return True if a request may be sent now"""
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.cooldown or self.probing:
+                return False
+            self.probing = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def abandon_probe(self):
+        """Let another request probe when the probe ended without telling us anything"""
+        with self.lock:
+            self.probing = False
+
+    def record_failure(self) -> bool:
+        """Count a failure and return True if it (re)opened the circuit"""
+        with self.lock:
+            self.failures += 1
+            if self.probing or (self.opened_at is None and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                self.probing = False
+                return True
+            return False
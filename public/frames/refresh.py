@@ -0,0 +1,192 @@
+"""
+Conditional refresh of existing frames for the glasses downloader.
+
+`glasses_downloader.py refresh` revalidates every finished frame against its
+source URL instead of skipping it (the default) or deleting and re-downloading
+it (a search call plus a full fetch and re-encode each). For each frame in the
+manifest, in parallel:
+- a conditional GET is sent with the stored ETag (If-None-Match) and
+  Last-Modified (If-Modified-Since); a 304 means unchanged and costs no body
+- with --refresh-method head, a HEAD request is tried first and a matching
+  ETag or Last-Modified counts as unchanged, for hosts that ignore conditional
+  headers; anything else falls through to the GET
+- a 200 body is hashed while it streams; the same SHA-256 as before means
+  unchanged (the host just does not support validators)
+- only a changed body is rendered and written over the old frame, keeping the
+  perceptual-hash index and manifest in step; if the new version is rejected
+  (not a product shot, undecodable...) the old frame is kept and the new
+  validators are stored, so it is not fetched and rejected again every refresh;
+  that includes responses rejected from their headers alone (content-type,
+  size), whose ETag/Last-Modified are stored without a body hash
+- 404/410 are reported as gone and the old frame is kept
+- frames ingested from a local dump (see ingest.py) have no URL to revalidate
+  and are counted as local
+
+Frames written before validators were recorded have nothing to compare
+against; their first refresh stores a baseline without re-encoding.
+"""
+
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Optional, Tuple
+
+import requests
+
+from image_processing import ImageRejected, open_for_processing
+from ingest import SOURCE_SCHEME
+from streaming_fetch import read_image_response
+
+# Outcomes per frame
+UNCHANGED = 'unchanged'
+CHANGED = 'changed'
+BASELINED = 'baselined'
+GONE = 'gone'
+MISSING = 'missing'
+KEPT = 'kept'
+FAILED = 'failed'
+LOCAL = 'local'
+
+GONE_STATUSES = (404, 410)
+
+
+def validators_match(row: Dict, response: requests.Response) -> bool:
+    """True if a response carries the same ETag (or, without ETags, Last-Modified) as stored"""
+    etag = response.headers.get('etag')
+    if row.get('etag') and etag:
+        return etag == row['etag']
+    last_modified = response.headers.get('last-modified')
+    return bool(row.get('last_modified') and last_modified == row['last_modified'])
+
+
+class FrameRefresher:
+    """Revalidate finished frames with conditional requests and re-render only changed ones"""
+
+    def __init__(self, downloader, headers: Dict[str, str], workers: Optional[int] = None,
+                 method: str = 'get'):
+        self.downloader = downloader
+        self.headers = headers
+        self.workers = max(1, workers or downloader.concurrency)
+        self.method = method
+
+    def _conditional_headers(self, row: Dict) -> Dict[str, str]:
+        headers = dict(self.headers)
+        if row.get('etag'):
+            headers['If-None-Match'] = row['etag']
+        if row.get('last_modified'):
+            headers['If-Modified-Since'] = row['last_modified']
+        return headers
+
+    def _record_headers(self, row: Dict, response: Optional[requests.Response] = None):
+        """Store the response's validators, keeping the stored ones (and source hash) it lacks"""
+        headers = response.headers if response is not None else {}
+        self.downloader.manifest.record_validators(row['relpath'], {
+            'etag': headers.get('etag') or row.get('etag'),
+            'last_modified': headers.get('last-modified') or row.get('last_modified'),
+            'source_hash': row.get('source_hash'),
+        })
+
+    def _unchanged(self, row: Dict, response: Optional[requests.Response] = None) -> str:
+        """Record the check, picking up validators the host may have started sending"""
+        self._record_headers(row, response)
+        return UNCHANGED
+
+    def check(self, row: Dict) -> Tuple[str, str]:
+        """Revalidate one frame and return (outcome, detail)"""
+        downloader = self.downloader
+        url = row['source_url']
+        filepath = os.path.join(downloader.base_path, row['relpath'])
+        if not os.path.exists(filepath):
+            return MISSING, 'frame file is gone; a normal download run will replace it'
+        if url.startswith(SOURCE_SCHEME):
+            return LOCAL, ''
+
+        headers = self._conditional_headers(row)
+        if self.method == 'head' and (row.get('etag') or row.get('last_modified')):
+            response = downloader.session.head(url, headers=headers, timeout=downloader.request_timeout,
+                                               allow_redirects=True)
+            response.close()
+            if response.status_code in GONE_STATUSES:
+                return GONE, f"http {response.status_code}"
+            if response.status_code == 304 or (response.ok and validators_match(row, response)):
+                return self._unchanged(row, response), ''
+
+        response = downloader.session.get(url, headers=headers, timeout=downloader.request_timeout, stream=True)
+        if response.status_code == 304:
+            response.close()
+            return self._unchanged(row, response), ''
+        if response.status_code in GONE_STATUSES:
+            response.close()
+            return GONE, f"http {response.status_code}"
+
+        try:
+            with downloader.metrics.timer('fetch'):
+                fetched = read_image_response(response, url, max_bytes=downloader.max_image_bytes,
+                                              memory_limit=downloader.fetch_memory_limit)
+        except ImageRejected as e:
+            # Rejected before the body was hashed (e.g. its content-type changed): the new
+            # validators alone let the next refresh get a 304 instead of fetching it again
+            self._record_headers(row, response)
+            return KEPT, f"new version rejected: {e}"
+        try:
+            downloader.metrics.incr('bytes_fetched', fetched.byte_count)
+            source = fetched.source
+            if source['source_hash'] == row.get('source_hash'):
+                downloader.manifest.record_validators(row['relpath'], source)
+                return UNCHANGED, ''
+            if not row.get('source_hash'):
+                downloader.manifest.record_validators(row['relpath'], source)
+                return BASELINED, ''
+            try:
+                with downloader.metrics.timer('decode'):
+                    image = open_for_processing(fetched.body, fast=downloader.resize_mode == 'fast',
+                                                product_check=downloader.product_check)
+                rendered = downloader.render_image(image)
+            except (ImageRejected, OSError) as e:
+                # Keep the old frame, but remember this version so later refreshes see it as unchanged
+                downloader.manifest.record_validators(row['relpath'], source)
+                return KEPT, f"new version rejected: {e}"
+        finally:
+            fetched.close()
+
+        if downloader.replace_frame(url, filepath, rendered, source):
+            return CHANGED, ''
+        return KEPT, 'new version duplicates another frame'
+
+    def run(self) -> Dict[str, int]:
+        """Revalidate all finished frames of this run's catalog (and shard) and return outcome counts"""
+        downloader = self.downloader
+        wanted = {f"{face_shape}/{frame_type}.jpg" for face_shape, frame_type in downloader.iter_frames()}
+        rows = [row for row in downloader.manifest.done_frames() if row['relpath'] in wanted]
+        print(f"🔄 Revalidating {len(rows)} frames with {self.workers} workers ({self.method.upper()})...")
+
+        started = time.perf_counter()
+        counts: Counter = Counter()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='glasses-refresh') as executor:
+            futures = {executor.submit(self.check, row): row for row in rows}
+            for future in as_completed(futures):
+                relpath = futures[future]['relpath']
+                try:
+                    outcome, detail = future.result()
+                except ImageRejected as e:
+                    outcome, detail = KEPT, f"new version rejected: {e}"
+                except Exception as e:
+                    outcome, detail = FAILED, f"{type(e).__name__}: {e}"
+                counts[outcome] += 1
+                downloader.metrics.incr('refresh', outcome=outcome)
+                if outcome == CHANGED:
+                    print(f"♻️  {relpath}: source changed, frame re-rendered")
+                elif outcome not in (UNCHANGED, BASELINED, LOCAL):
+                    print(f"⚠️  {relpath}: {outcome} ({detail})")
+        elapsed = time.perf_counter() - started
+
+        downloader.hash_index.save()
+        downloader.build_assets()
+
+        summary = ', '.join(f"{count} {outcome}" for outcome, count in sorted(counts.items()))
+        print(f"✅ Refreshed {len(rows)} frames in {elapsed:.1f}s: {summary or 'nothing to do'}")
+        downloader.print_encode_savings()
+        downloader.metrics.print_report()
+        downloader.metrics.close()
+        return dict(counts)
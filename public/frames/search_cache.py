@@ -0,0 +1,156 @@
+"""
+Persistent Custom Search result cache for the glasses downloader.
+
+Results are stored in SQLite keyed by the normalized query and search params,
+including the search engine id (cx) but never the API key. Entries expire after
+a TTL and the table is bounded by LRU eviction on last access. A cached search
+with more results than requested also serves smaller requests.
+
+The engines that filled the cache are remembered, so a --cache-only replay
+without GOOGLE_CSE_ID set can use the most recently used one (last_engine).
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Params that identify the caller rather than the search itself
+IGNORED_PARAMS = {'key', 'num'}
+
+
+class SearchCache:
+    """SQLite-backed search cache with TTL expiry and size-bounded LRU eviction"""
+
+    def __init__(self, path: str, ttl_seconds: float = 7 * 24 * 3600, max_entries: int = 5000):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS search_results (
+                cache_key TEXT PRIMARY KEY,
+                query TEXT NOT NULL,
+                num_results INTEGER NOT NULL,
+                results TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        ''')
+        self.connection.execute(
+            'CREATE INDEX IF NOT EXISTS idx_search_results_last_used ON search_results (last_used)'
+        )
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS search_engines (
+                engine TEXT PRIMARY KEY,
+                last_used REAL NOT NULL
+            )
+        ''')
+        self.connection.commit()
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """Lowercase and collapse whitespace so trivially different queries share an entry"""
+        return ' '.join(query.lower().split())
+
+    @classmethod
+    def make_key(cls, query: str, params: Dict) -> str:
+        """Stable cache key for a query and its search params"""
+        relevant = {k: v for k, v in params.items() if k not in IGNORED_PARAMS and k != 'q'}
+        payload = json.dumps([cls.normalize_query(query), relevant], sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str, num_results: int, allow_stale: bool = False) -> Optional[List[Dict]]:
+        """Return cached results, or None on a miss, expiry or too few stored results"""
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT num_results, results, created_at FROM search_results WHERE cache_key = ?',
+                (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            stored_num, results, created_at = row
+            expired = self.ttl_seconds > 0 and now - created_at > self.ttl_seconds
+            if (expired and not allow_stale) or stored_num < num_results:
+                self.misses += 1
+                return None
+
+            self.connection.execute(
+                'UPDATE search_results SET last_used = ? WHERE cache_key = ?', (now, key)
+            )
+            self.connection.commit()
+            self.hits += 1
+
+        return json.loads(results)[:num_results]
+
+    def contains(self, key: str, num_results: int) -> bool:
+        """True if get() would hit, without counting a lookup or refreshing the entry"""
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT num_results, created_at FROM search_results WHERE cache_key = ?', (key,)
+            ).fetchone()
+        if row is None:
+            return False
+        stored_num, created_at = row
+        expired = self.ttl_seconds > 0 and time.time() - created_at > self.ttl_seconds
+        return not expired and stored_num >= num_results
+
+    def put(self, key: str, query: str, num_results: int, results: List[Dict], engine: Optional[str] = None):
+        """Store results for a key and evict least recently used entries over the size bound"""
+        now = time.time()
+        with self.lock:
+            if engine:
+                self.connection.execute(
+                    'INSERT OR REPLACE INTO search_engines (engine, last_used) VALUES (?, ?)', (engine, now)
+                )
+            self.connection.execute('''
+                INSERT OR REPLACE INTO search_results
+                    (cache_key, query, num_results, results, created_at, last_used)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (key, self.normalize_query(query), num_results, json.dumps(results), now, now))
+            self.connection.execute('''
+                DELETE FROM search_results WHERE cache_key IN (
+                    SELECT cache_key FROM search_results
+                    ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+            ''', (max(self.max_entries, 0),))
+            self.connection.commit()
+
+    def last_engine(self) -> Optional[str]:
+        """The search engine id (cx) that most recently stored results, if any"""
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT engine FROM search_engines ORDER BY last_used DESC LIMIT 1'
+            ).fetchone()
+        return row[0] if row else None
+
+    def purge_expired(self) -> int:
+        """Delete expired entries, returning how many were removed"""
+        if self.ttl_seconds <= 0:
+            return 0
+        with self.lock:
+            cursor = self.connection.execute(
+                'DELETE FROM search_results WHERE created_at < ?', (time.time() - self.ttl_seconds,)
+            )
+            self.connection.commit()
+            return cursor.rowcount
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
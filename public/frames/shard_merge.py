@@ -0,0 +1,85 @@
+"""
+Merge per-shard downloader state back into the main state directory.
+
+A run with --shard i/N keeps its manifest, hash index and search cache in
+.downloader/shards/<i>-of-<N>/ so shards sharing a frames directory never
+write the same files. `glasses_downloader.py merge` folds every shard's
+manifest.sqlite and phash_index.json into .downloader/ (see
+RunManifest.merge_from and PerceptualHashIndex.merge), so later unsharded runs
+resume with everything the shards learned.
+
+Shards deduplicate independently, so two shards can pick visually identical
+images; the merge reports those pairs. Shards run on other machines must have
+their <shape>/*.jpg files and state directories copied over before merging.
+"""
+
+import os
+from typing import Dict, List, Optional, Tuple
+
+from manifest import RunManifest
+from phash_index import PerceptualHashIndex
+
+SHARDS_DIR = 'shards'
+MANIFEST_NAME = 'manifest.sqlite'
+HASH_INDEX_NAME = 'phash_index.json'
+
+
+def shard_state_dir(state_dir: str, shard: Tuple[int, int]) -> str:
+    index, count = shard
+    return os.path.join(state_dir, SHARDS_DIR, f"{index}-of-{count}")
+
+
+def find_shard_dirs(state_dir: str) -> List[str]:
+    """Shard state directories under state_dir that contain a manifest"""
+    shards_path = os.path.join(state_dir, SHARDS_DIR)
+    if not os.path.isdir(shards_path):
+        return []
+    return [
+        os.path.join(shards_path, name) for name in sorted(os.listdir(shards_path))
+        if os.path.exists(os.path.join(shards_path, name, MANIFEST_NAME))
+    ]
+
+
+def merge_shard_state(state_dir: str, shard_dirs: List[str], base_path: Optional[str] = None,
+                      dedup_distance: int = 10) -> Dict:
+    """Merge shard manifests and hash indexes into state_dir and report what changed"""
+    manifest = RunManifest(os.path.join(state_dir, MANIFEST_NAME))
+    hash_index = PerceptualHashIndex(os.path.join(state_dir, HASH_INDEX_NAME), max_distance=dedup_distance)
+    report = {'shards': [], 'duplicates': [], 'missing_files': []}
+    try:
+        for shard_dir in shard_dirs:
+            counts = {'frames': 0, 'urls': 0}
+            manifest_path = os.path.join(shard_dir, MANIFEST_NAME)
+            if os.path.exists(manifest_path):
+                counts = manifest.merge_from(manifest_path)
+            shard_index = PerceptualHashIndex(os.path.join(shard_dir, HASH_INDEX_NAME),
+                                              max_distance=dedup_distance)
+            before = len(hash_index)
+            report['duplicates'].extend(hash_index.merge(shard_index))
+            counts['hashes'] = len(hash_index) - before
+            report['shards'].append({'path': shard_dir, **counts})
+
+        if base_path is not None:
+            report['missing_files'] = sorted(
+                relpath for relpath in hash_index.entries
+                if not os.path.exists(os.path.join(base_path, relpath))
+            )
+        hash_index.save()
+        report['summary'] = manifest.summary()
+    finally:
+        manifest.close()
+    return report
+
+
+def print_merge_report(report: Dict):
+    for shard in report['shards']:
+        print(f"🧩 {shard['path']}: {shard['frames']} frames, {shard['urls']} URLs, "
+              f"{shard['hashes']} new hashes merged")
+    for relpath, existing in report['duplicates']:
+        print(f"⚠️  {relpath} looks like a duplicate of {existing} (picked by different shards)")
+    if report['missing_files']:
+        print(f"⚠️  {len(report['missing_files'])} indexed frames are not in the frames directory yet; "
+              f"copy them over before the next run or they will be dropped from the index")
+    summary = report.get('summary', {})
+    print(f"✅ Merged {len(report['shards'])} shards: {summary.get('done', 0)} frames done, "
+          f"{summary.get('bad_urls', 0)} known-bad URLs")
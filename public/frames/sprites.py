@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Per-face-shape sprite atlases for the frontend.
+
+A face shape's result view shows all of its frames at once, which costs one
+image request per frame. This packs the catalog's frames of each shape
+(public/frames/<shape>/<frame type>.jpg, skipping files the catalog no longer
+lists) into a single grid atlas per shape, as WebP plus a JPEG fallback, in
+sprites/:
+
+    sprites/oval-3f2a9c1d.webp
+    sprites/oval-3f2a9c1d.jpg
+
+and describes them in sprites.json, which components can use as a CSS
+background (background-image + background-position/-size) or an SVG viewBox:
+
+    {
+      "tile": 400,
+      "atlases": {
+        "oval": {
+          "key": "<sha256 of members and settings>",
+          "width": 1200, "height": 800,
+          "webp": {"path": "sprites/oval-3f2a9c1d.webp", "bytes": 61234},
+          "jpeg": {"path": "sprites/oval-3f2a9c1d.jpg", "bytes": 98765},
+          "frames": {
+            "aviator-gold": {"x": 0, "y": 0, "width": 400, "height": 400, "source": "oval/aviator-gold.jpg"},
+            ...
+          }
+        }
+      }
+    }
+
+Atlas file names contain the key, so they can be served with immutable
+caching. Builds are incremental: an atlas is only re-rendered when a member
+image is added, removed or changed (by content hash), the layout or encoder
+settings change, or its files are missing. Stale atlas files (names of the
+form <shape>-<8 hex digits>.webp/.jpg) are removed; nothing else in sprites/
+is touched.
+
+Usage:
+    python3 glasses_downloader.py --export-catalog catalog.json
+    python3 sprites.py --catalog catalog.json
+    python3 sprites.py --catalog catalog.json --tile 300 --columns 3 --workers 2
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from PIL import Image
+
+from catalog import load_catalog
+from derivatives import file_sha256
+
+SPRITES_DIR = 'sprites'
+MANIFEST_NAME = 'sprites.json'
+DEFAULT_TILE = 400
+DEFAULT_COLUMNS = 3
+
+WEBP_OPTIONS = {'quality': 80, 'method': 6}
+JPEG_OPTIONS = {'quality': 85, 'optimize': True, 'progressive': True}
+
+# Files render_atlas writes (and their temporaries); prune() never deletes anything else
+ATLAS_FILE = re.compile(r'^.+-[0-9a-f]{8}\.(webp|jpg)(\.tmp)?$')
+
+
+def atlas_key(members: Dict[str, str], tile: int, columns: int) -> str:
+    """Hash of member paths and contents plus everything that affects the rendered atlas"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([tile, columns, WEBP_OPTIONS, JPEG_OPTIONS], sort_keys=True).encode('utf-8'))
+    for relpath in sorted(members):
+        digest.update(f"{relpath}\0{members[relpath]}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def render_atlas(base_path: str, face_shape: str, relpaths: List[str], key: str,
+                 tile: int, columns: int) -> Dict:
+    """Pack one face shape's frames into a grid and encode it (runs in a worker process)"""
+    columns = max(1, min(columns, len(relpaths)))
+    rows = math.ceil(len(relpaths) / columns)
+    atlas = Image.new('RGB', (columns * tile, rows * tile), 'white')
+    frames = {}
+    for index, relpath in enumerate(relpaths):
+        x, y = (index % columns) * tile, (index // columns) * tile
+        with Image.open(os.path.join(base_path, relpath)) as source:
+            source.draft('RGB', (tile, tile))
+            image = source.convert('RGB')
+        image.thumbnail((tile, tile), Image.Resampling.LANCZOS, reducing_gap=2.0)
+        # Frames are square already; anything else is centered on white like the downloader does
+        atlas.paste(image, (x + (tile - image.width) // 2, y + (tile - image.height) // 2))
+        frame_type = os.path.splitext(relpath.split('/', 1)[1])[0]
+        frames[frame_type] = {'x': x, 'y': y, 'width': tile, 'height': tile, 'source': relpath}
+
+    os.makedirs(os.path.join(base_path, SPRITES_DIR), exist_ok=True)
+    stem = f"{SPRITES_DIR}/{face_shape}-{key[:8]}"
+    entry = {'key': key, 'width': atlas.width, 'height': atlas.height, 'frames': frames}
+    for name, extension, image_format, options in (('webp', 'webp', 'WEBP', WEBP_OPTIONS),
+                                                    ('jpeg', 'jpg', 'JPEG', JPEG_OPTIONS)):
+        relpath = f"{stem}.{extension}"
+        output_path = os.path.join(base_path, relpath)
+        tmp_path = f"{output_path}.tmp"
+        atlas.save(tmp_path, image_format, **options)
+        os.replace(tmp_path, output_path)
+        entry[name] = {'path': relpath, 'bytes': os.path.getsize(output_path)}
+    return entry
+
+
+class SpriteAtlasBuilder:
+    """Incrementally builds one sprite atlas per face shape and the sprites.json map"""
+
+    def __init__(self, base_path: str, catalog: Dict[str, Iterable[str]], tile: int = DEFAULT_TILE,
+                 columns: int = DEFAULT_COLUMNS, workers: Optional[int] = None):
+        """catalog maps each face shape to its frame types, e.g. the downloader's search_queries"""
+        self.base_path = base_path
+        self.frame_types = {face_shape: list(frame_types) for face_shape, frame_types in catalog.items()}
+        self.face_shapes = list(self.frame_types)
+        self.tile = tile
+        self.columns = columns
+        self.workers = workers
+        self.manifest_path = os.path.join(base_path, MANIFEST_NAME)
+        self.atlases: Dict[str, Dict] = {}
+        self.lock = threading.Lock()
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                self.atlases = json.load(f).get('atlases', {})
+
+    def members(self, face_shape: str) -> List[str]:
+        """The shape's catalog frames that exist on disk"""
+        return [f"{face_shape}/{frame_type}.jpg" for frame_type in sorted(self.frame_types.get(face_shape, ()))
+                if os.path.isfile(os.path.join(self.base_path, face_shape, f"{frame_type}.jpg"))]
+
+    def is_current(self, face_shape: str, key: str) -> bool:
+        entry = self.atlases.get(face_shape)
+        if not entry or entry.get('key') != key:
+            return False
+        return all(os.path.exists(os.path.join(self.base_path, entry[name]['path'])) for name in ('webp', 'jpeg'))
+
+    def build(self) -> Dict[str, int]:
+        """Re-render atlases whose members changed, then prune stale files and rewrite the map"""
+        stale = {}
+        for face_shape in self.face_shapes:
+            relpaths = self.members(face_shape)
+            if not relpaths:
+                continue
+            hashes = {relpath: file_sha256(os.path.join(self.base_path, relpath)) for relpath in relpaths}
+            key = atlas_key(hashes, self.tile, self.columns)
+            if not self.is_current(face_shape, key):
+                stale[face_shape] = (relpaths, key)
+
+        if stale:
+            print(f"🧱 Packing sprite atlases for {', '.join(stale)}...")
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                futures = {
+                    face_shape: executor.submit(render_atlas, self.base_path, face_shape, relpaths, key,
+                                                self.tile, self.columns)
+                    for face_shape, (relpaths, key) in stale.items()
+                }
+                for face_shape, future in futures.items():
+                    try:
+                        entry = future.result()
+                    except Exception as e:
+                        print(f"❌ Sprite atlas failed for {face_shape}: {e}")
+                        continue
+                    with self.lock:
+                        self.atlases[face_shape] = entry
+
+        self.prune()
+        self.save()
+        return {'atlases': len(self.atlases), 'rendered': len(stale)}
+
+    def prune(self):
+        """Drop atlases of shapes without frames and delete atlas files no entry points to"""
+        with self.lock:
+            for face_shape in list(self.atlases):
+                if not self.members(face_shape):
+                    del self.atlases[face_shape]
+            current = {entry[name]['path'] for entry in self.atlases.values() for name in ('webp', 'jpeg')}
+        sprites_path = os.path.join(self.base_path, SPRITES_DIR)
+        if not os.path.isdir(sprites_path):
+            return
+        for filename in os.listdir(sprites_path):
+            if ATLAS_FILE.match(filename) and f"{SPRITES_DIR}/{filename}" not in current:
+                os.remove(os.path.join(sprites_path, filename))
+
+    def save(self):
+        with self.lock:
+            payload = json.dumps({'tile': self.tile, 'atlases': self.atlases}, indent=2, sort_keys=True)
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        os.replace(tmp_path, self.manifest_path)
+
+    def print_report(self):
+        for face_shape, entry in sorted(self.atlases.items()):
+            sources = sum(os.path.getsize(os.path.join(self.base_path, frame['source']))
+                          for frame in entry['frames'].values()
+                          if os.path.exists(os.path.join(self.base_path, frame['source'])))
+            print(f"   {face_shape}: {len(entry['frames'])} frames in 1 request, "
+                  f"webp {entry['webp']['bytes'] / 1024:.0f} KB, jpeg {entry['jpeg']['bytes'] / 1024:.0f} KB "
+                  f"(sources {sources / 1024:.0f} KB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pack each face shape\'s frames into a sprite atlas')
+    parser.add_argument('--base-path', default=os.path.dirname(os.path.abspath(__file__)))
+    parser.add_argument('--catalog', required=True, metavar='PATH',
+                        help='JSON catalog whose frames are packed (glasses_downloader.py --export-catalog)')
+    parser.add_argument('--tile', type=int, default=DEFAULT_TILE, help='tile size in pixels per frame')
+    parser.add_argument('--columns', type=int, default=DEFAULT_COLUMNS, help='frames per atlas row')
+    parser.add_argument('--workers', type=int, default=None, help='process pool size (default: CPU count)')
+    args = parser.parse_args()
+
+    try:
+        catalog = load_catalog(args.catalog)
+    except (OSError, ValueError) as e:
+        parser.error(f"could not load catalog {args.catalog}: {e}")
+
+    builder = SpriteAtlasBuilder(args.base_path, catalog, args.tile, args.columns, args.workers)
+    result = builder.build()
+    print(f"✅ Sprite atlases up to date ({result['rendered']} rendered, {result['atlases']} atlases)")
+    builder.print_report()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Streaming image fetch with early rejection for the glasses downloader.
+
+Instead of buffering the whole response and copying it into io.BytesIO, the
+body is read in chunks:
+- Content-Type and Content-Length are checked before any body bytes are read
+- chunks are fed to a Pillow header parser until the format and dimensions are
+  known, so non-images and images that are too small are rejected after a few
+  kilobytes
+- accepted bodies are spooled to a SpooledTemporaryFile that keeps at most
+  memory_limit bytes in RAM per worker and spills the rest to disk
+- bodies larger than max_bytes are aborted mid-stream
+- a set cancelled event (a hedged attempt that lost the race) aborts the
+  download at the next chunk
+- the body's SHA-256 and the response's ETag and Last-Modified are kept as the
+  source validators used by refresh (see refresh.py)
+"""
+
+import hashlib
+import tempfile
+import threading
+from typing import Dict, Optional, Tuple, Union
+
+import requests
+from PIL import ImageFile
+
+from image_processing import ImageRejected
+
+ACCEPTED_CONTENT_TYPES = ['image/jpeg', 'image/jpg', 'image/png', 'image/webp']
+
+CHUNK_SIZE = 16 * 1024
+
+# Give up on bodies whose header still cannot be parsed after this many bytes
+HEADER_LIMIT = 1024 * 1024
+
+
+class FetchRejected(ImageRejected):
+    """Raised when a fetched URL is rejected before or while streaming its body"""
+
+
+class FetchCancelled(Exception):
+    """Raised when a fetch is abandoned because its result is no longer needed"""
+
+
+def source_validators(response: requests.Response, source_hash: str) -> Dict[str, Optional[str]]:
+    """ETag, Last-Modified and body hash identifying the version of a source image"""
+    return {
+        'etag': response.headers.get('etag'),
+        'last_modified': response.headers.get('last-modified'),
+        'source_hash': source_hash,
+    }
+
+
+class FetchedImage:
+    """A streamed image body spooled to a bounded buffer"""
+
+    def __init__(self, body, content_type: str, size: Tuple[int, int], byte_count: int,
+                 source: Optional[Dict[str, Optional[str]]] = None):
+        self.body = body
+        self.content_type = content_type
+        self.size = size
+        self.byte_count = byte_count
+        self.source = source or {}
+
+    def close(self):
+        self.body.close()
+
+
+def fetch_image_streaming(session: requests.Session, url: str, headers: Dict[str, str],
+                          timeout: Union[float, Tuple[float, float]] = 30, min_size: Tuple[int, int] = (200, 200),
+                          max_bytes: int = 25 * 1024 * 1024,
+                          memory_limit: int = 8 * 1024 * 1024,
+                          cancelled: Optional[threading.Event] = None) -> FetchedImage:
+    """Stream an image body, rejecting it as early as possible"""
+    response = session.get(url, timeout=timeout, headers=headers, stream=True)
+    return read_image_response(response, url, min_size, max_bytes, memory_limit, cancelled)
+
+
+def read_image_response(response: requests.Response, url: str, min_size: Tuple[int, int] = (200, 200),
+                        max_bytes: int = 25 * 1024 * 1024, memory_limit: int = 8 * 1024 * 1024,
+                        cancelled: Optional[threading.Event] = None) -> FetchedImage:
+    """Validate and spool an open streamed response, closing it when done"""
+    try:
+        response.raise_for_status()
+
+        content_type = response.headers.get('content-type', '').lower()
+        if not any(img_type in content_type for img_type in ACCEPTED_CONTENT_TYPES):
+            raise FetchRejected(f"content-type {content_type}", f"Not an image file: {content_type}")
+
+        content_length = response.headers.get('content-length')
+        if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+            raise FetchRejected('too large', f"Image too large: {int(content_length)} bytes")
+
+        parser: Optional[ImageFile.Parser] = ImageFile.Parser()
+        size: Optional[Tuple[int, int]] = None
+        byte_count = 0
+        digest = hashlib.sha256()
+        body = tempfile.SpooledTemporaryFile(max_size=memory_limit)
+        try:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                if not chunk:
+                    continue
+                if cancelled is not None and cancelled.is_set():
+                    raise FetchCancelled(url)
+                byte_count += len(chunk)
+                if byte_count > max_bytes:
+                    raise FetchRejected('too large', f"Image too large: over {max_bytes} bytes")
+                body.write(chunk)
+                digest.update(chunk)
+
+                # Feed the header parser only until the dimensions are known
+                if parser is not None:
+                    parser.feed(chunk)
+                    if parser.image is not None:
+                        size = parser.image.size
+                        parser = None
+                        if size[0] < min_size[0] or size[1] < min_size[1]:
+                            raise FetchRejected(f"too small {size[0]}x{size[1]}",
+                                                f"Image too small: {size[0]}x{size[1]}")
+                    elif byte_count > HEADER_LIMIT:
+                        raise FetchRejected('undecodable', 'Could not read image header')
+
+            if size is None:
+                raise FetchRejected('undecodable', 'Could not read image header')
+
+            body.seek(0)
+            return FetchedImage(body, content_type, size, byte_count,
+                                source_validators(response, digest.hexdigest()))
+        except BaseException:
+            body.close()
+            raise
+    finally:
+        response.close()
@@ -0,0 +1,63 @@
+"""
+Batch/scalar parity checks for candidate_scorer.py.
+
+Run from public/frames: python3 -m pytest -q test_candidate_scorer.py
+"""
+
+import random
+
+import pytest
+
+from candidate_scorer import (NEGATIVE_KEYWORDS, POSITIVE_KEYWORDS, CandidateScorer,
+                              registered_domain, score_result_legacy)
+
+WORDS = list(POSITIVE_KEYWORDS + NEGATIVE_KEYWORDS) + [
+    'round', 'tortoise', 'acetate', 'GLASSES', 'Studio', 'white', 'background', 'wearing', 'with', 'x'
+]
+HOSTS = ['www.zennioptical.com', 'media.gettyimages.co.uk', 'example.org', 'shop.oakley.com', '', 'cdn.example.net']
+
+
+def random_results(count: int, seed: int = 11):
+    rng = random.Random(seed)
+    return [{'title': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(0, 6))),
+             'snippet': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(0, 10))),
+             'displayLink': rng.choice(HOSTS)}
+            for _ in range(count)]
+
+
+def test_batch_matches_scalar_scores():
+    scorer = CandidateScorer()
+    results = random_results(500)
+    assert scorer.score_batch(results) == [scorer.score(result) for result in results]
+
+
+def test_keyword_scores_match_the_original_function():
+    scorer = CandidateScorer()
+    results = [dict(result, displayLink='example.org') for result in random_results(500, seed=5)]
+    assert scorer.score_batch(results) == [score_result_legacy(result) for result in results]
+
+
+def test_keywords_never_match_across_results():
+    scorer = CandidateScorer()
+    results = [{'title': 'plain', 'snippet': 'white'}, {'title': 'background', 'snippet': 'x'}]
+    assert scorer.score_batch(results) == [0, 0]
+
+
+def test_overlapping_keywords_count_separately():
+    scorer = CandidateScorer()
+    assert scorer.score({'title': 'Round glasses', 'snippet': 'studio product'}) == 3
+    assert scorer.score({'title': 'Man wearing glasses', 'snippet': ''}) == -2
+
+
+def test_empty_batch():
+    assert CandidateScorer().score_batch([]) == []
+
+
+@pytest.mark.parametrize('display_link, domain', [
+    ('www.zennioptical.com', 'zennioptical'),
+    ('media.gettyimages.co.uk', 'gettyimages'),
+    ('shop.oakley.com:443/path', 'oakley'),
+    ('localhost', 'localhost'),
+])
+def test_registered_domain(display_link, domain):
+    assert registered_domain(display_link) == domain
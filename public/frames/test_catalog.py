@@ -0,0 +1,42 @@
+"""
+Catalog validation and sharding checks for catalog.py.
+
+Run from public/frames: python3 -m pytest -q test_catalog.py
+"""
+
+import pytest
+
+from catalog import shard_frames, validate_catalog
+
+QUERIES = ['round glasses product photography']
+
+
+def test_valid_catalog_is_returned():
+    catalog = {'oval': {'aviator-gold3': QUERIES}, 'round': {'wire-round3': QUERIES}}
+    assert validate_catalog(catalog) is catalog
+
+
+@pytest.mark.parametrize('face_shape', ['..', '.', '../oval', 'oval/../..', 'a\\b', '/etc', '', ' oval'])
+def test_unsafe_face_shape_is_rejected(face_shape):
+    with pytest.raises(ValueError, match='face shape'):
+        validate_catalog({face_shape: {'aviator-gold3': QUERIES}})
+
+
+@pytest.mark.parametrize('frame_type', ['..', '../escape', 'a\\b', 'sub/frame', ''])
+def test_unsafe_frame_type_is_rejected(frame_type):
+    with pytest.raises(ValueError, match='frame type'):
+        validate_catalog({'oval': {frame_type: QUERIES}})
+
+
+def test_frames_need_query_strings():
+    with pytest.raises(ValueError):
+        validate_catalog({'oval': {'aviator-gold3': []}})
+    with pytest.raises(ValueError):
+        validate_catalog({'oval': {'aviator-gold3': ['  ']}})
+
+
+def test_shards_partition_the_catalog():
+    frames = [(face_shape, f"frame-{number}") for face_shape in ('oval', 'round') for number in range(40)]
+    shards = [shard_frames(frames, (index, 3)) for index in range(3)]
+    assert sorted(frame for shard in shards for frame in shard) == sorted(frames)
+    assert all(shards)
@@ -0,0 +1,65 @@
+"""
+Fast-path decode checks for image_processing.py.
+
+Run from public/frames: python3 -m pytest -q test_image_processing.py
+"""
+
+import io
+
+import pytest
+from PIL import Image, ImageDraw
+
+from image_processing import (
+    FRAME_SIZE, ImageRejected, open_for_processing, prepare_frame, prepare_frame_legacy, render_frame
+)
+from product_check import analyze_product_shot
+
+
+def product_photo(size: int, product: tuple) -> bytes:
+    """A white JPEG of size x size with a dark glasses-like box of `product` pixels in the middle"""
+    image = Image.new('RGB', (size, size), 'white')
+    width, height = product
+    left, top = (size - width) // 2, (size - height) // 2
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((left, top, left + width, top + height), fill=(40, 30, 20))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=92)
+    return buffer.getvalue()
+
+
+def product_width(image: Image.Image) -> int:
+    return analyze_product_shot(image, size=FRAME_SIZE).width
+
+
+def render(data: bytes, fast: bool) -> Image.Image:
+    image = open_for_processing(io.BytesIO(data), fast=fast)
+    shot = analyze_product_shot(image)
+    image = image.crop(shot.crop_box())
+    return prepare_frame(image) if fast else prepare_frame_legacy(image)
+
+
+@pytest.mark.parametrize('product', [(1000, 400), (700, 300)])
+def test_small_product_in_large_source_keeps_legacy_size(product):
+    data = product_photo(3200, product)
+    fast, legacy = render(data, fast=True), render(data, fast=False)
+    assert abs(product_width(fast) - product_width(legacy)) <= 16
+    assert product_width(fast) >= 700
+
+
+def test_small_product_in_large_source_is_accepted():
+    data = product_photo(3200, (700, 300))
+    rendered = render_frame(open_for_processing(io.BytesIO(data), fast=True))
+    with Image.open(io.BytesIO(rendered.data)) as frame:
+        assert frame.size == (FRAME_SIZE, FRAME_SIZE)
+
+
+def test_large_product_still_decodes_reduced():
+    data = product_photo(3200, (3000, 1200))
+    image = open_for_processing(io.BytesIO(data), fast=True)
+    assert FRAME_SIZE <= max(image.size) < 3200
+
+
+def test_tiny_product_is_still_rejected():
+    data = product_photo(3200, (120, 50))
+    with pytest.raises(ImageRejected):
+        render_frame(open_for_processing(io.BytesIO(data), fast=True))
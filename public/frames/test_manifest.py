@@ -0,0 +1,85 @@
+"""
+Resume and merge checks for manifest.py.
+
+Run from public/frames: python3 -m pytest -q test_manifest.py
+"""
+
+import os
+
+from manifest import (FRAME_DEFERRED, FRAME_DONE, FRAME_FAILED, URL_BAD, URL_DOWNLOADED,
+                      RunManifest)
+
+SOURCE = {'etag': '"abc"', 'last_modified': 'Mon, 05 Oct 2026 10:00:00 GMT', 'source_hash': 'f' * 64}
+
+
+def open_manifest(tmp_path, name: str = 'manifest.sqlite', **kwargs) -> RunManifest:
+    return RunManifest(os.path.join(str(tmp_path), name), **kwargs)
+
+
+def test_state_survives_a_restart(tmp_path):
+    manifest = open_manifest(tmp_path)
+    manifest.record_attempt('oval/aviator.jpg', 'oval', 'aviator')
+    manifest.record_output('oval/aviator.jpg', 'oval', 'aviator', 'https://a.example/1.jpg', 'hash-1',
+                           source=SOURCE, output_hash='e' * 64)
+    manifest.record_frame_failure('oval/round.jpg', 'oval', 'round', 'no suitable image')
+    manifest.record_url_failure('https://a.example/broken.jpg', 'oval/round.jpg', 'not an image', permanent=True)
+    manifest.close()
+
+    resumed = open_manifest(tmp_path)
+    assert resumed.frame_statuses() == {'oval/aviator.jpg': FRAME_DONE, 'oval/round.jpg': FRAME_FAILED}
+    assert resumed.urls_with_status(URL_DOWNLOADED) == {'https://a.example/1.jpg'}
+    assert resumed.urls_with_status(URL_BAD) == {'https://a.example/broken.jpg'}
+    assert resumed.url_failure_reason('https://a.example/broken.jpg') == 'not an image'
+    assert resumed.output_hashes() == {'oval/aviator.jpg': 'e' * 64}
+
+    record = resumed.frame_record('oval/aviator.jpg')
+    assert record['attempts'] == 1
+    assert (record['etag'], record['source_hash']) == (SOURCE['etag'], SOURCE['source_hash'])
+    resumed.close()
+
+
+def test_transient_failures_become_permanent_after_the_limit(tmp_path):
+    manifest = open_manifest(tmp_path, max_url_failures=3)
+    url = 'https://a.example/flaky.jpg'
+    assert [manifest.record_url_failure(url, None, 'timeout', permanent=False) for _ in range(3)] \
+        == [False, False, True]
+    assert url in manifest.urls_with_status(URL_BAD)
+    manifest.close()
+
+
+def test_deferral_never_hides_a_finished_or_failed_frame(tmp_path):
+    manifest = open_manifest(tmp_path)
+    manifest.record_output('oval/a.jpg', 'oval', 'a', 'https://a.example/a.jpg', 'hash-a')
+    manifest.record_frame_failure('oval/b.jpg', 'oval', 'b', 'no suitable image')
+    for frame_type in ('a', 'b', 'c'):
+        manifest.record_frame_deferred(f"oval/{frame_type}.jpg", 'oval', frame_type, 'quota exhausted')
+    assert manifest.frame_statuses() == {'oval/a.jpg': FRAME_DONE, 'oval/b.jpg': FRAME_FAILED,
+                                         'oval/c.jpg': FRAME_DEFERRED}
+    manifest.close()
+
+
+def test_downloaded_url_clears_an_earlier_failure(tmp_path):
+    manifest = open_manifest(tmp_path)
+    url = 'https://a.example/retry.jpg'
+    manifest.record_url_failure(url, 'oval/a.jpg', 'timeout', permanent=False)
+    manifest.record_output('oval/a.jpg', 'oval', 'a', url, 'hash-a')
+    assert manifest.url_failure_reason(url) is None
+    assert manifest.urls_with_status(URL_DOWNLOADED) == {url}
+    manifest.close()
+
+
+def test_merge_prefers_finished_frames(tmp_path):
+    main = open_manifest(tmp_path, 'main.sqlite')
+    main.record_output('oval/a.jpg', 'oval', 'a', 'https://a.example/a.jpg', 'hash-a')
+    main.record_frame_failure('oval/b.jpg', 'oval', 'b', 'no suitable image')
+
+    shard = open_manifest(tmp_path, 'shard.sqlite')
+    shard.record_frame_failure('oval/a.jpg', 'oval', 'a', 'timeout')
+    shard.record_output('oval/b.jpg', 'oval', 'b', 'https://a.example/b.jpg', 'hash-b')
+    shard.close()
+
+    counts = main.merge_from(shard.path)
+    assert counts['frames'] == 1
+    assert main.frame_statuses() == {'oval/a.jpg': FRAME_DONE, 'oval/b.jpg': FRAME_DONE}
+    assert main.urls_with_status(URL_DOWNLOADED) == {'https://a.example/a.jpg', 'https://a.example/b.jpg'}
+    main.close()
@@ -0,0 +1,105 @@
+"""
+BK-tree and perceptual-hash index checks for phash_index.py.
+
+Run from public/frames: python3 -m pytest -q test_phash_index.py
+"""
+
+import random
+
+from phash_index import BKTree, PerceptualHashIndex, format_hash, hamming_distance
+
+BITS = 256
+
+
+def random_hashes(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    return [rng.getrandbits(BITS) for _ in range(count)]
+
+
+def flip(value: int, bits: int, seed: int = 3) -> int:
+    for bit in random.Random(seed).sample(range(BITS), bits):
+        value ^= 1 << bit
+    return value
+
+
+def test_find_matches_brute_force():
+    hashes = random_hashes(300)
+    tree = BKTree()
+    for number, value in enumerate(hashes):
+        tree.add(value, f"frame-{number}")
+    for query in hashes[:20] + [flip(hashes[0], 6), flip(hashes[1], 40)]:
+        for max_distance in (0, 10, 120):
+            expected = sorted((hamming_distance(query, value), value, f"frame-{number}")
+                              for number, value in enumerate(hashes)
+                              if hamming_distance(query, value) <= max_distance)
+            assert tree.find(query, max_distance) == expected
+
+
+def test_remove_keeps_children_reachable():
+    hashes = random_hashes(200)
+    tree = BKTree()
+    for number, value in enumerate(hashes):
+        tree.add(value, f"frame-{number}")
+    # The root and some inner nodes become tombstones
+    for number in range(0, 200, 2):
+        assert tree.remove(hashes[number], f"frame-{number}")
+    assert len(tree) == 100
+    assert not tree.remove(hashes[0], 'frame-0')
+    for number, value in enumerate(hashes):
+        found = [match[2] for match in tree.find(value, 0)]
+        assert found == ([] if number % 2 == 0 else [f"frame-{number}"])
+
+
+def test_shared_hash_keeps_other_values():
+    tree = BKTree()
+    tree.add(5, 'a')
+    tree.add(5, 'b')
+    tree.remove(5, 'a')
+    assert tree.find(5, 0) == [(0, 5, 'b')]
+
+
+def index(tmp_path) -> PerceptualHashIndex:
+    return PerceptualHashIndex(str(tmp_path / 'phash_index.json'), max_distance=10)
+
+
+def test_replaced_hash_no_longer_matches(tmp_path):
+    old, new = random_hashes(2)
+    hashes = index(tmp_path)
+    hashes.add(old, 'oval/aviator.jpg')
+    assert hashes.find_duplicate(flip(old, 4)) == 'oval/aviator.jpg'
+
+    hashes.add(new, 'oval/aviator.jpg')
+    assert hashes.find_duplicate(flip(old, 4)) is None
+    assert hashes.find_duplicate(flip(new, 4)) == 'oval/aviator.jpg'
+    assert len(hashes.tree) == 1
+
+
+def test_exclude_finds_another_duplicate(tmp_path):
+    value = random_hashes(1)[0]
+    hashes = index(tmp_path)
+    hashes.add(value, 'oval/aviator.jpg')
+    hashes.add(flip(value, 3), 'round/aviator.jpg')
+    assert hashes.find_duplicate(value, exclude='oval/aviator.jpg') == 'round/aviator.jpg'
+
+
+def test_remove_and_persist(tmp_path):
+    first, second = random_hashes(2)
+    hashes = index(tmp_path)
+    hashes.add(first, 'oval/a.jpg')
+    hashes.add(second, 'oval/b.jpg')
+    hashes.remove('oval/a.jpg')
+    assert hashes.find_duplicate(first) is None
+    hashes.save()
+
+    reloaded = index(tmp_path)
+    assert reloaded.entries == {'oval/b.jpg': {'hash': format_hash(second), 'mtime': None, 'size': None}}
+    assert reloaded.find_duplicate(second) == 'oval/b.jpg'
+
+
+def test_tombstones_are_rebuilt_away(tmp_path):
+    hashes = index(tmp_path)
+    for round_number in range(5):
+        for number, value in enumerate(random_hashes(100, seed=round_number)):
+            hashes.add(value, f"oval/frame-{number}.jpg")
+    assert len(hashes.tree) == 100
+    assert hashes.tree.nodes <= 2 * max(len(hashes.tree), 64)
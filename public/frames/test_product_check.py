@@ -0,0 +1,69 @@
+"""
+Product-shot checks for product_check.py, on thin wire and rimless frames.
+
+Run from public/frames: python3 -m pytest -q test_product_check.py
+"""
+
+import io
+
+import pytest
+from PIL import Image, ImageDraw
+
+from image_processing import MIN_SOURCE_SIZE, open_for_processing, render_frame
+from product_check import analyze_product_shot, product_shot_problem
+
+
+def wire_frame(size: tuple, stroke: int, color: tuple = (60, 60, 60)) -> Image.Image:
+    """Two outlined lenses and a bridge, `stroke` pixels wide, on white"""
+    width, height = size
+    image = Image.new('RGB', size, 'white')
+    draw = ImageDraw.Draw(image)
+    lens_width, lens_height = width * 0.3, height * 0.4
+    top = (height - lens_height) / 2
+    for left in (width * 0.15, width * 0.55):
+        draw.ellipse((left, top, left + lens_width, top + lens_height), outline=color, width=stroke)
+    draw.line((width * 0.45, height / 2, width * 0.55, height / 2), fill=color, width=stroke)
+    return image
+
+
+def jpeg(image: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('size', [(1200, 600), (2000, 1000), (3200, 1600)])
+@pytest.mark.parametrize('stroke', [2, 4])
+def test_wire_frame_is_found(size, stroke):
+    shot = analyze_product_shot(wire_frame(size, stroke))
+    assert product_shot_problem(shot, MIN_SOURCE_SIZE) == ('', '')
+    width, height = size
+    left, top, right, bottom = shot.bbox
+    # The box hugs the lenses (15%..85% across, 30%..70% down) to within a check cell
+    assert abs(left - width * 0.15) <= width / 32 and abs(right - width * 0.85) <= width / 32
+    assert abs(top - height * 0.3) <= height / 16 and abs(bottom - height * 0.7) <= height / 16
+
+
+def test_light_gold_wire_frame_is_found():
+    shot = analyze_product_shot(wire_frame((2000, 1000), 3, color=(200, 170, 90)))
+    assert product_shot_problem(shot, MIN_SOURCE_SIZE) == ('', '')
+
+
+@pytest.mark.parametrize('size', [(1200, 600), (3200, 1600)])
+def test_wire_frame_renders_from_jpeg(size):
+    data = jpeg(wire_frame(size, 3))
+    rendered = render_frame(open_for_processing(io.BytesIO(data), fast=True))
+    assert rendered.data
+
+
+def test_speck_is_not_a_product():
+    image = Image.new('RGB', (1600, 800), 'white')
+    ImageDraw.Draw(image).rectangle((790, 390, 800, 400), fill=(40, 40, 40))
+    reason, _ = product_shot_problem(analyze_product_shot(image), MIN_SOURCE_SIZE)
+    assert reason == 'no product'
+
+
+def test_blank_image_is_not_a_product():
+    shot = analyze_product_shot(Image.new('RGB', (1200, 600), 'white'))
+    assert shot.bbox == (0, 0, 0, 0)
+    assert product_shot_problem(shot, MIN_SOURCE_SIZE)[0] == 'no product'
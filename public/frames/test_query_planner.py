@@ -0,0 +1,81 @@
+"""
+Search budget and ranking checks for query_planner.py.
+
+Run from public/frames: python3 -m pytest -q test_query_planner.py
+"""
+
+from query_planner import PAGE_SIZE, QueryPlanner
+
+
+class FakeSearch:
+    """Serves `per_query` results per query, scoring URLs that contain 'good' as suitable"""
+
+    def __init__(self, per_query: int = PAGE_SIZE, good_every: int = 0):
+        self.per_query = per_query
+        self.good_every = good_every
+        self.calls = []
+
+    def __call__(self, query, num_results=PAGE_SIZE, start=1):
+        self.calls.append((query, start))
+        results = []
+        for index in range(start - 1, min(start - 1 + num_results, self.per_query)):
+            good = self.good_every and index % self.good_every == 0
+            results.append({'url': f"https://{query}/{'good' if good else 'bad'}-{index}.jpg"})
+        return results
+
+
+def score_batch(results):
+    return [1.0 if 'good' in result['url'] else 0.0 for result in results]
+
+
+def always(url):
+    return True
+
+
+def test_stops_once_enough_suitable_candidates():
+    search = FakeSearch(good_every=2)
+    planner = QueryPlanner(search, score_batch, max_calls_per_frame=3, target_candidates=3)
+    plan = planner.plan(['q1', 'q2', 'q3'], always)
+    assert plan.search_calls == 1
+    assert search.calls == [('q1', 1)]
+    assert len(plan.suitable) == 5
+
+
+def test_never_exceeds_call_budget():
+    search = FakeSearch(per_query=100)
+    planner = QueryPlanner(search, score_batch, max_calls_per_frame=4, target_candidates=3, max_pages=5)
+    plan = planner.plan(['q1', 'q2', 'q3'], always)
+    assert plan.search_calls == 4 == len(search.calls)
+    # Every query's first page comes before any second page
+    assert search.calls == [('q1', 1), ('q2', 1), ('q3', 1), ('q1', PAGE_SIZE + 1)]
+    # Unsuitable results stay in the ranking as fallbacks
+    assert plan.suitable == [] and len(plan.candidates) == 4 * PAGE_SIZE
+
+
+def test_short_page_is_not_paged_again():
+    search = FakeSearch(per_query=4)
+    planner = QueryPlanner(search, score_batch, max_calls_per_frame=10, target_candidates=3, max_pages=3)
+    plan = planner.plan(['q1', 'q2'], always)
+    assert search.calls == [('q1', 1), ('q2', 1)]
+    assert plan.search_calls == 2
+
+
+def test_unavailable_urls_do_not_count_or_rank():
+    search = FakeSearch(good_every=1)
+    planner = QueryPlanner(search, score_batch, max_calls_per_frame=3, target_candidates=3)
+    plan = planner.plan(['q1', 'q2'], lambda url: not url.startswith('https://q1/'))
+    assert search.calls == [('q1', 1), ('q2', 1)]
+    assert plan.candidates and all(candidate.url.startswith('https://q2/') for candidate in plan.candidates)
+
+
+def test_ranking_prefers_score_then_query_then_position():
+    scores = {'a': 0.5, 'b': 0.9, 'c': 0.9}
+
+    def search(query, num_results=PAGE_SIZE, start=1):
+        return [{'url': url} for url in (['a', 'b'] if query == 'q1' else ['c', 'b', 'a'])]
+
+    planner = QueryPlanner(search, lambda results: [scores[result['url']] for result in results],
+                           max_calls_per_frame=2, target_candidates=5, max_pages=1)
+    plan = planner.plan(['q1', 'q2'], always)
+    assert [candidate.url for candidate in plan.candidates] == ['b', 'c', 'a']
+    assert (plan.candidates[0].query_index, plan.candidates[0].position) == (0, 1)
@@ -0,0 +1,125 @@
+"""
+Admission, daily reset and scheduling checks for quota.py.
+
+Run from public/frames: python3 -m pytest -q test_quota.py
+"""
+
+import os
+import threading
+
+import pytest
+
+import quota
+from quota import (PRIORITY_EXISTS, PRIORITY_MISSING, PRIORITY_RETRY, QuotaLedger, QuotaScheduler,
+                   WorkItem)
+
+
+class Day:
+    def __init__(self, day: str = '2026-10-01'):
+        self.day = day
+
+    def __call__(self) -> str:
+        return self.day
+
+
+@pytest.fixture
+def day():
+    return Day()
+
+
+def open_ledger(tmp_path, day, api_key: str = 'key-a', daily_limit: int = 10) -> QuotaLedger:
+    return QuotaLedger(os.path.join(str(tmp_path), 'quota.sqlite'), api_key, daily_limit=daily_limit, clock=day)
+
+
+def test_admit_until_the_day_is_spent(tmp_path, day):
+    ledger = open_ledger(tmp_path, day)
+    first = ledger.admit(3)
+    assert first is not None and ledger.remaining() == 7
+    for _ in range(2):
+        ledger.record_call()
+    ledger.release(first)
+    assert (ledger.used(), ledger.remaining()) == (2, 8)
+
+    for _ in range(8):
+        ledger.record_call()
+    assert ledger.remaining() == 0
+    assert ledger.admit(1) is None
+    ledger.close()
+
+
+def test_admit_waits_for_a_release(tmp_path, day, monkeypatch):
+    monkeypatch.setattr(quota, 'RESERVATION_POLL', 0.05)
+    ledger = open_ledger(tmp_path, day)
+    held = ledger.admit(8)
+    timer = threading.Timer(0.2, ledger.release, (held,))
+    timer.start()
+    try:
+        assert ledger.admit(5) is not None
+    finally:
+        timer.join()
+    ledger.close()
+
+
+def test_reservations_are_shared_between_ledgers(tmp_path, day):
+    first = open_ledger(tmp_path, day)
+    second = open_ledger(tmp_path, day)
+    first.admit(6)
+    assert second.remaining() == 4
+    first.close()
+    # Closing drops the ledger's own reservations
+    assert second.remaining() == 10
+    second.close()
+
+
+def test_stale_reservations_expire(tmp_path, day, monkeypatch):
+    ledger = open_ledger(tmp_path, day)
+    ledger.admit(10)
+    now = quota.time.time()
+    monkeypatch.setattr(quota.time, 'time', lambda: now + quota.RESERVATION_TTL + 1)
+    assert ledger.remaining() == 10
+    assert ledger.admit(10) is not None
+    ledger.close()
+
+
+def test_daily_reset_and_exhaustion(tmp_path, day):
+    ledger = open_ledger(tmp_path, day)
+    ledger.record_call()
+    ledger.mark_exhausted()
+    assert (ledger.used(), ledger.remaining()) == (10, 0)
+    assert ledger.admit(1) is None
+
+    day.day = '2026-10-02'
+    assert (ledger.used(), ledger.remaining()) == (0, 10)
+    assert ledger.admit(1) is not None
+    ledger.close()
+
+
+def test_keys_are_counted_separately(tmp_path, day):
+    first = open_ledger(tmp_path, day, api_key='key-a')
+    second = open_ledger(tmp_path, day, api_key='key-b')
+    for _ in range(4):
+        first.record_call()
+    assert (first.remaining(), second.remaining()) == (6, 10)
+    first.close()
+    second.close()
+
+
+def test_expected_calls_per_frame_uses_history(tmp_path, day):
+    ledger = open_ledger(tmp_path, day)
+    assert ledger.expected_calls_per_frame(default=3) == 3
+    ledger.record_frame(1)
+    day.day = '2026-10-02'
+    ledger.record_frame(2)
+    assert ledger.expected_calls_per_frame(default=3) == 1.5
+    ledger.close()
+
+
+def test_scheduler_orders_and_estimates(tmp_path, day):
+    ledger = open_ledger(tmp_path, day, daily_limit=5)
+    items = [WorkItem('oval', 'a', PRIORITY_RETRY, 1), WorkItem('oval', 'b', PRIORITY_MISSING, 3),
+             WorkItem('oval', 'c', PRIORITY_EXISTS, 0), WorkItem('oval', 'd', PRIORITY_MISSING, 2)]
+    scheduler = QuotaScheduler(ledger)
+    ordered = scheduler.order(items)
+    assert [item.frame_type for item in ordered] == ['d', 'b', 'a', 'c']
+    assert scheduler.estimate(ordered) == {'remaining': 5, 'pending': 3, 'expected_calls': 6, 'fits': 2}
+    ledger.close()
@@ -0,0 +1,92 @@
+"""
+TTL and LRU eviction checks for search_cache.py.
+
+Run from public/frames: python3 -m pytest -q test_search_cache.py
+"""
+
+import os
+
+import pytest
+
+import search_cache
+from search_cache import SearchCache
+
+
+class Clock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = Clock()
+    monkeypatch.setattr(search_cache.time, 'time', fake)
+    return fake
+
+
+def results(count: int, prefix: str = 'img'):
+    return [{'url': f"https://example.com/{prefix}-{index}.jpg"} for index in range(count)]
+
+
+def open_cache(tmp_path, **kwargs) -> SearchCache:
+    return SearchCache(os.path.join(str(tmp_path), 'search_cache.sqlite'), **kwargs)
+
+
+def test_key_ignores_api_key_and_num_but_not_engine():
+    params = {'q': 'x', 'cx': 'engine-a', 'key': 'secret', 'num': 10, 'searchType': 'image'}
+    key = SearchCache.make_key('Round  Glasses', params)
+    assert key == SearchCache.make_key('round glasses', dict(params, key='other', num=3))
+    assert key != SearchCache.make_key('round glasses', dict(params, cx='engine-b'))
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = open_cache(tmp_path, ttl_seconds=60)
+    cache.put('k', 'q', 10, results(10))
+    clock.now += 59
+    assert cache.get('k', 10) == results(10)
+    clock.now += 2
+    assert cache.get('k', 10) is None
+    assert not cache.contains('k', 10)
+    assert cache.get('k', 10, allow_stale=True) == results(10)
+    assert cache.purge_expired() == 1
+    assert cache.get('k', 10, allow_stale=True) is None
+    assert (cache.hits, cache.misses) == (2, 2)
+    cache.close()
+
+
+def test_larger_entry_serves_smaller_requests(tmp_path, clock):
+    cache = open_cache(tmp_path)
+    cache.put('k', 'q', 5, results(5))
+    assert cache.get('k', 3) == results(3)
+    assert cache.get('k', 10) is None
+    cache.close()
+
+
+def test_lru_eviction_keeps_recently_used(tmp_path, clock):
+    cache = open_cache(tmp_path, max_entries=2)
+    cache.put('a', 'a', 10, results(10, 'a'))
+    clock.now += 1
+    cache.put('b', 'b', 10, results(10, 'b'))
+    clock.now += 1
+    assert cache.get('a', 10) is not None
+    clock.now += 1
+    cache.put('c', 'c', 10, results(10, 'c'))
+
+    assert cache.contains('a', 10)
+    assert not cache.contains('b', 10)
+    assert cache.contains('c', 10)
+    cache.close()
+
+
+def test_entries_and_engine_persist_across_instances(tmp_path, clock):
+    cache = open_cache(tmp_path)
+    cache.put('k', 'q', 10, results(10), engine='engine-a')
+    cache.close()
+
+    reopened = open_cache(tmp_path)
+    assert reopened.get('k', 10) == results(10)
+    assert reopened.last_engine() == 'engine-a'
+    reopened.close()